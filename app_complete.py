@@ -10,15 +10,11 @@ PSM资源管理系统 - Web版
 """
 
 from flask import Flask, render_template, request, send_file, jsonify, redirect, url_for
-import pandas as pd
 import os
-import uuid
 import json
-from resource_manager import (
-    analyze_resource_migration,
-    analyze_recommended_scaling,
-    analyze_migratable_clusters
-)
+from report_export import export_report
+from report_store import get_report_store
+from query_engine import QueryEngine, parse_idc_list
 
 app = Flask(__name__)
 
@@ -30,6 +26,10 @@ OUTPUT_DIR = "outputs"
 # 确保输出目录存在
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
+# 报告文件存储：按查询复用文件，按配额和年龄淘汰旧报告；
+# 清理线程在第一次保存或下载报告时才启动（多进程服务中即fork之后的工作进程），导入时不启动
+REPORT_STORE = get_report_store(OUTPUT_DIR)
+
 # 确保Excel文件存在
 if not os.path.exists(EXCEL_FILE):
     # 尝试使用测试文件
@@ -64,10 +64,12 @@ def migration():
             return render_template("migration.html", error="请输入两个资源池信息")
         
         # 处理机房列表
-        idc_list = [idc.strip() for idc in idc_input.split(",")] if idc_input else None
+        idc_list = parse_idc_list(idc_input)
         
-        # 执行分析
-        result = analyze_resource_migration(EXCEL_FILE, pool1, pool2, idc_list)
+        # 执行分析；报告文件名由查询决定，在分析之前取得查询键
+        engine = QueryEngine(EXCEL_FILE)
+        result_key = engine.result_key("migration", pool1, pool2, idc_list)
+        result = engine.migration(pool1, pool2, idc_list)
         
         if result["status"] == "empty":
             return render_template("migration.html", error=result["message"])
@@ -82,15 +84,14 @@ def migration():
         detail_columns = result["data"]["detail"].columns.tolist()
         summary_columns = result["data"]["summary"].columns.tolist()
         
-        # 生成唯一的输出文件名
-        output_filename = f"migration_{uuid.uuid4().hex}.xlsx"
-        output_path = os.path.join(OUTPUT_DIR, output_filename)
-        
-        # 保存到Excel
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            result["data"]["summary"].to_excel(writer, sheet_name="资源汇总", index=False)
-            result["data"]["detail"].to_excel(writer, sheet_name="详细数据", index=False)
-            result["data"]["stats"].to_excel(writer, sheet_name="统计信息", index=False)
+        # 保存到Excel，文件名由查询决定，相同的查询复用已生成的文件
+        sheets = [
+            ("资源汇总", result["data"]["summary"]),
+            ("详细数据", result["data"]["detail"]),
+            ("统计信息", result["data"]["stats"]),
+        ]
+        output_filename = REPORT_STORE.filename_for("migration", result_key, "xlsx")
+        REPORT_STORE.save(output_filename, lambda path: export_report(path, sheets))
         
         return render_template(
             "results_migration.html",
@@ -125,8 +126,10 @@ def recommend_scaling():
         if not idc or not physical_cluster:
             return render_template("recommend_scaling.html", error="请输入机房和资源池信息")
         
-        # 执行分析
-        result = analyze_recommended_scaling(EXCEL_FILE, idc, physical_cluster)
+        # 执行分析；报告文件名由查询决定，在分析之前取得查询键
+        engine = QueryEngine(EXCEL_FILE)
+        result_key = engine.result_key("recommended_scaling", idc, physical_cluster)
+        result = engine.recommended_scaling(idc, physical_cluster)
         
         if result["status"] == "empty":
             return render_template("recommend_scaling.html", error=result["message"])
@@ -138,14 +141,10 @@ def recommend_scaling():
         stats_data = result["data"]["stats"].to_dict(orient="records")
         detail_columns = result["data"]["detail"].columns.tolist()
         
-        # 生成唯一的输出文件名
-        output_filename = f"recommend_{uuid.uuid4().hex}.xlsx"
-        output_path = os.path.join(OUTPUT_DIR, output_filename)
-        
-        # 保存到Excel
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            result["data"]["detail"].to_excel(writer, sheet_name="推荐缩容列表", index=False)
-            result["data"]["stats"].to_excel(writer, sheet_name="统计信息", index=False)
+        # 保存到Excel，文件名由查询决定，相同的查询复用已生成的文件
+        sheets = [("推荐缩容列表", result["data"]["detail"]), ("统计信息", result["data"]["stats"])]
+        output_filename = REPORT_STORE.filename_for("recommend", result_key, "xlsx")
+        REPORT_STORE.save(output_filename, lambda path: export_report(path, sheets))
         
         return render_template(
             "results_recommend.html",
@@ -177,8 +176,10 @@ def migratable_clusters():
         if not idc or not physical_cluster:
             return render_template("migratable_clusters.html", error="请输入机房和资源池信息")
         
-        # 执行分析
-        result = analyze_migratable_clusters(EXCEL_FILE, idc, physical_cluster)
+        # 执行分析；报告文件名由查询决定，在分析之前取得查询键
+        engine = QueryEngine(EXCEL_FILE)
+        result_key = engine.result_key("migratable_clusters", idc, physical_cluster)
+        result = engine.migratable_clusters(idc, physical_cluster)
         
         if result["status"] == "empty":
             return render_template("migratable_clusters.html", error=result["message"])
@@ -190,14 +191,10 @@ def migratable_clusters():
         stats_data = result["data"]["stats"].to_dict(orient="records")
         detail_columns = result["data"]["detail"].columns.tolist()
         
-        # 生成唯一的输出文件名
-        output_filename = f"migratable_{uuid.uuid4().hex}.xlsx"
-        output_path = os.path.join(OUTPUT_DIR, output_filename)
-        
-        # 保存到Excel
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            result["data"]["detail"].to_excel(writer, sheet_name="可腾挪集群", index=False)
-            result["data"]["stats"].to_excel(writer, sheet_name="统计信息", index=False)
+        # 保存到Excel，文件名由查询决定，相同的查询复用已生成的文件
+        sheets = [("可腾挪集群", result["data"]["detail"]), ("统计信息", result["data"]["stats"])]
+        output_filename = REPORT_STORE.filename_for("migratable", result_key, "xlsx")
+        REPORT_STORE.save(output_filename, lambda path: export_report(path, sheets))
         
         return render_template(
             "results_migratable.html",
@@ -218,11 +215,18 @@ def download_file(filename):
     """下载Excel文件"""
     file_path = os.path.join(OUTPUT_DIR, filename)
     if os.path.exists(file_path):
+        REPORT_STORE.touch(filename)
         return send_file(file_path, as_attachment=True)
     else:
         return render_template("error_complete.html", error="文件不存在")
 
 
+@app.route("/api/report_store_stats", methods=["GET"])
+def api_report_store_stats():
+    """报告目录的文件数、占用空间、复用和淘汰统计"""
+    return jsonify({"status": "success", "stats": REPORT_STORE.stats()})
+
+
 @app.route("/api/migration", methods=["POST"])
 def api_migration():
     """资源腾挪API接口"""
@@ -232,9 +236,9 @@ def api_migration():
         pool1 = data.get("pool1", "").strip()
         pool2 = data.get("pool2", "").strip()
         
-        idc_list = [idc.strip() for idc in idc_input.split(",")] if idc_input else None
+        idc_list = parse_idc_list(idc_input)
         
-        result = analyze_resource_migration(EXCEL_FILE, pool1, pool2, idc_list)
+        result = QueryEngine(EXCEL_FILE).migration(pool1, pool2, idc_list)
         
         if result["status"] == "success":
             return jsonify({
@@ -260,7 +264,7 @@ def api_recommend():
         idc = data.get("idc", "").strip()
         physical_cluster = data.get("physical_cluster", "").strip()
         
-        result = analyze_recommended_scaling(EXCEL_FILE, idc, physical_cluster)
+        result = QueryEngine(EXCEL_FILE).recommended_scaling(idc, physical_cluster)
         
         if result["status"] == "success":
             return jsonify({
@@ -285,7 +289,7 @@ def api_migratable():
         idc = data.get("idc", "").strip()
         physical_cluster = data.get("physical_cluster", "").strip()
         
-        result = analyze_migratable_clusters(EXCEL_FILE, idc, physical_cluster)
+        result = QueryEngine(EXCEL_FILE).migratable_clusters(idc, physical_cluster)
         
         if result["status"] == "success":
             return jsonify({
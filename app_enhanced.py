@@ -1,10 +1,35 @@
-from flask import Flask, render_template, request, redirect, url_for, send_file, jsonify
+from flask import (
+    Flask, Response, before_render_template, g, render_template, request, redirect, template_rendered, url_for,
+    send_file, jsonify
+)
 import pandas as pd
 import numpy as np
 import os
-import uuid
+import tempfile
 import json
+import itertools
+import time
 import resource_manager as rm
+from query_engine import QueryEngine, parse_idc_list
+from pool_affinity import affinity_sheets
+from fleet_scan import fleet_summary
+from migration_planner import DEFAULT_TIME_BUDGET, MAX_TIME_BUDGET
+from snapshot_cache import snapshot_stats
+from request_tracing import (
+    PROFILES, REQUEST_LATENCY, SamplingProfiler, current_trace, end_trace, record_span, render_metrics, span,
+    start_trace, worker_label
+)
+from query_cache import query_cache_stats
+from report_jobs import REPORT_JOBS, FAILED
+from report_store import get_report_store
+from report_export import (
+    MIMETYPES, export_report, frame_from_records, iter_export, normalize_format, report_filename, write_xlsx
+)
+from result_sets import ResultSetStore, MIGRATABLE_SORT_KEYS, parse_page_args
+from time_budget import (
+    TIMEOUT_STATS, BudgetExceeded, current_deadline, reset_budget, route_budget, start_budget, time_budget,
+    timeout_stats
+)
 from datetime import datetime
 
 app = Flask(__name__)
@@ -16,6 +41,86 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# 报告文件存储：按查询复用文件，按配额和年龄淘汰旧报告；
+# 清理线程在第一次保存或下载报告时才启动（多进程服务中即fork之后的工作进程），导入时不启动
+REPORT_STORE = get_report_store(UPLOAD_FOLDER)
+
+# 多进程服务(manage.py serve --workers N)中，后续请求通常落在另一个工作进程上：
+# 结果集游标、报告任务状态和采样结果同时写入上传目录下的共享目录，任何工作进程都能读取
+SHARED_STATE_FOLDER = os.path.join(UPLOAD_FOLDER, '.shared')
+REPORT_JOBS.share(os.path.join(SHARED_STATE_FOLDER, 'report_jobs'))
+PROFILES.share(os.path.join(SHARED_STATE_FOLDER, 'profiles'))
+
+# 下载时等待后台报告生成完成的最长秒数
+DOWNLOAD_WAIT_SECONDS = 30
+
+# 推荐缩容页面默认展示的集群数（按save_cores从大到小）
+RECOMMEND_PAGE_LIMIT = 500
+
+# 全量推荐缩容扫描并行的进程数，数据量很大时再设置
+FLEET_SCAN_WORKERS = int(os.environ.get('FLEET_SCAN_WORKERS', '0'))
+
+@app.before_request
+def start_request_budget():
+    """按路由为本次请求的分析设置时间预算（见time_budget.ROUTE_BUDGETS）"""
+    g.budget_token = start_budget(route_budget(request.endpoint))
+
+@app.teardown_request
+def reset_request_budget(exc):
+    token = g.pop('budget_token', None)
+    if token is not None:
+        reset_budget(token)
+
+# 是否允许按请求开启调用栈采样（请求带profile=1参数或X-Profile: 1请求头时开启）
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING', '1').lower() not in ('0', 'false', 'no')
+
+@app.before_request
+def start_request_trace():
+    """开始记录本次请求各阶段的耗时，按需开启调用栈采样"""
+    g.trace_token = start_trace()
+    if REQUEST_PROFILING and '1' in (request.args.get('profile'), request.headers.get('X-Profile')):
+        g.profiler = SamplingProfiler().start()
+
+@app.after_request
+def add_server_timing(response):
+    """把各阶段耗时写入Server-Timing响应头，采样结果保存后通过X-Profile-Url下载"""
+    trace = current_trace()
+    if trace is not None:
+        REQUEST_LATENCY.observe((request.endpoint or 'unknown', str(response.status_code)), trace.elapsed())
+        response.headers['Server-Timing'] = trace.server_timing()
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profile_id = PROFILES.put(f'{request.method} {request.path}', profiler.stop().collapsed())
+        response.headers['X-Profile-Id'] = profile_id
+        response.headers['X-Profile-Url'] = url_for('api_profile', profile_id=profile_id)
+    return response
+
+@app.teardown_request
+def end_request_trace(exc):
+    # 视图抛出异常时after_request不会执行，在这里停止采样
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+@before_render_template.connect_via(app)
+def start_render_timing(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def record_render_timing(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        record_span(f'render.{template.name}', time.perf_counter() - started)
+
+def record_timeout(e, route=None):
+    """记录一次超时的请求"""
+    route = route or request.endpoint
+    TIMEOUT_STATS.record(route)
+    print(f"{route}: {e}（已用{e.elapsed}秒）")
+
 @app.route('/')
 def index():
     return render_template('index_complete.html')
@@ -49,10 +154,12 @@ def analyze_migration():
         file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
         
         # 构建idc列表
-        idc_list = [idc.strip() for idc in idc_input.split(',')] if idc_input else None
+        idc_list = parse_idc_list(idc_input)
         
-        # 使用resource_manager模块进行分析
-        analysis_result = rm.analyze_resource_migration(file_path, pool1, pool2, idc_list)
+        # 通过查询引擎进行分析；报告文件名由查询决定，在分析之前取得查询键
+        engine = QueryEngine(file_path)
+        result_key = engine.result_key('migration', pool1, pool2, idc_list)
+        analysis_result = engine.migration(pool1, pool2, idc_list)
         
         # 检查分析结果状态
         if analysis_result['status'] != 'success':
@@ -71,15 +178,18 @@ def analyze_migration():
         # 生成统计表格HTML
         stats_table = stats_df.to_html(classes="table table-striped table-bordered", index=False)
         
-        # 生成唯一的输出文件名
-        output_filename = f"resource_migration_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        output_path = os.path.join(UPLOAD_FOLDER, output_filename)
+        # 按查询生成文件名，相同的查询复用同一个文件；导出格式由请求指定（xlsx / csv / csv.gz）
+        export_format = normalize_format(request.form.get('export_format', 'xlsx'))
+        sheets = [("资源汇总", sorted_summary_df), ("详细数据", sorted_df), ("统计信息", stats_df)]
+        output_filename = REPORT_STORE.filename_for("resource_migration", result_key, export_format)
         
-        # 保存到Excel
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            sorted_summary_df.to_excel(writer, sheet_name="资源汇总", index=False)
-            sorted_df.to_excel(writer, sheet_name="详细数据", index=False)
-            stats_df.to_excel(writer, sheet_name="统计信息", index=False)
+        # 在后台任务中逐行写出报告，页面立即返回
+        REPORT_STORE.save(
+            output_filename,
+            lambda path: export_report(path, sheets, export_format, primary=1),
+            submit=REPORT_JOBS.submit
+        )
+        report_job = REPORT_JOBS.find_by_filename(output_filename)
         
         # 将DataFrame转换为字典列表以供模板使用
         detail_data = sorted_df.to_dict(orient="records")
@@ -105,9 +215,13 @@ def analyze_migration():
             summary_columns=summary_columns,
             stats_table=stats_table,
             excel_file=output_filename,
+            report_job=report_job.job_id if report_job else None,
             has_results=True,
             psm_count=psm_count
         )
+    except BudgetExceeded as e:
+        record_timeout(e)
+        return render_template('migration.html', error=str(e), has_results=False)
     except Exception as e:
         import traceback
         error_msg = traceback.format_exc()
@@ -116,6 +230,64 @@ def analyze_migration():
                              error=f'分析过程中出现错误: {str(e)}',
                              has_results=False)
 
+@app.route('/multi_migration')
+def multi_migration():
+    return render_template('index_enhanced.html')
+
+@app.route('/analyze', methods=['POST'])
+def analyze_multi_migration():
+    """多候选资源池腾挪分析：一个目标资源池对多个候选资源池"""
+    try:
+        idc_input = request.form.get('idc', '').strip()
+        target_pool = request.form.get('target_pool', '').strip()
+        candidate_pools = rm.parse_pool_list(request.form.get('candidate_pools', ''))
+        data_file = request.form.get('data_file', 'all.xlsx')
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
+        idc_list = parse_idc_list(idc_input)
+        
+        engine = QueryEngine(file_path)
+        result_key = engine.result_key('batch_migration', target_pool, candidate_pools, idc_list)
+        analysis_result = engine.batch_migration(target_pool, candidate_pools, idc_list)
+        data = analysis_result['data']
+        
+        # 整理每个候选池的展示数据
+        processed_results = {}
+        for pool, entry in data['results'].items():
+            detail_df = entry['data']['detail'] if entry['data'] else pd.DataFrame()
+            summary_df = entry['data']['summary'] if entry['data'] else pd.DataFrame()
+            processed_results[pool] = {
+                'detailed_data': detail_df.to_dict(orient='records'),
+                'summary_data': summary_df.to_dict(orient='records'),
+                'detailed_columns': detail_df.columns.tolist(),
+                'summary_columns': summary_df.columns.tolist(),
+                'stats': {
+                    'matching_psm_count': entry['matching_psm_count'],
+                    'target_pool_resources': entry['target_pool_resources'],
+                    'candidate_pool_resources': entry['candidate_pool_resources'],
+                },
+            }
+        
+        excel_file = generate_batch_migration_excel(analysis_result, result_key, idc_input)
+        
+        return render_template(
+            'results_enhanced.html',
+            idc_list=idc_input,
+            target_pool=target_pool,
+            candidate_pools=data['candidate_pools'],
+            target_stats=data['target_stats'],
+            processed_results=processed_results,
+            ranking=data['ranking'],
+            excel_file=excel_file
+        )
+    except BudgetExceeded as e:
+        record_timeout(e)
+        return render_template('index_enhanced.html', error=str(e))
+    except Exception as e:
+        import traceback
+        error_msg = traceback.format_exc()
+        print(f"分析过程中出现错误: {error_msg}")
+        return render_template('index_enhanced.html', error=f'分析过程中出现错误: {str(e)}')
+
 @app.route('/analyze_recommend', methods=['POST'])
 def analyze_recommend():
     idc = request.form.get('idc', '').strip()
@@ -133,6 +305,10 @@ def analyze_recommend():
     except ValueError:
         min_save_cores = 0
     
+    # 页面只展示save_cores最大的前limit个集群，填0表示全部展示
+    limit = request.form.get('limit', str(RECOMMEND_PAGE_LIMIT))
+    top_k = parse_top(limit) if limit.strip() else RECOMMEND_PAGE_LIMIT
+    
     # 构建数据文件的完整路径
     file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
     
@@ -141,25 +317,71 @@ def analyze_recommend():
         return render_template('recommend.html', error=f'数据文件 {data_file} 不存在', has_results=False)
     
     try:
-        # 使用resource_manager模块进行分析
-        results = rm.analyze_recommended_scaling(file_path, idc, pool, min_save_cores)
+        # 通过查询引擎进行分析
+        engine = QueryEngine(file_path)
+        results = engine.recommended_scaling(idc, pool, min_save_cores, top_k)
         
-        # 计算统计信息
-        total_cpu = sum(row.get('save_cores', 0) for row in results)
-        total_clusters = len(results)
+        # 计算统计信息（按全部符合条件的集群统计，不受展示条数限制）
+        totals = engine.recommended_scaling_totals(idc, pool, min_save_cores)
         
         # 不需要生成Excel文件
         return render_template('recommend.html', results=results, idc=idc, pool=pool,
-                             total_cpu=total_cpu, total_clusters=total_clusters,
-                             has_results=True)
+                             total_cpu=totals['total_cpu'], total_clusters=totals['total_clusters'],
+                             limit=top_k or 0, has_results=True)
+    except BudgetExceeded as e:
+        # 超时时展示已完成的部分结果，统计也只按这部分结果计算
+        record_timeout(e)
+        results = e.partial or []
+        if not results:
+            return render_template('recommend.html', error=str(e), has_results=False)
+        return render_template('recommend.html', results=results, idc=idc, pool=pool,
+                             total_cpu=sum(row['save_cores'] for row in results), total_clusters=len(results),
+                             limit=top_k or 0, has_results=True, truncated=True, timeout_message=str(e))
     except Exception as e:
         import traceback
         print(f"分析过程中出现错误: {traceback.format_exc()}")
         return render_template('recommend.html', error=f'分析过程中出现错误: {str(e)}',
                              has_results=False)
 
-@app.route('/analyze_migratable', methods=['POST'])
+# 可腾挪集群查询结果保存在服务端（同时写入共享目录），翻页和排序时复用
+MIGRATABLE_RESULTS = ResultSetStore(directory=os.path.join(SHARED_STATE_FOLDER, 'result_sets'))
+
+def build_migratable_result_set(file_path, idc, pool):
+    """执行可腾挪集群查询，把完整结果和统计信息保存为服务端结果集；超时时保存已完成的部分结果"""
+    truncated = False
+    try:
+        results = QueryEngine(file_path).migratable_clusters(idc, pool)
+    except BudgetExceeded as e:
+        record_timeout(e)
+        results, truncated = e.partial or [], True
+    
+    # 收集所有可用的其他资源池
+    available_pools = set()
+    for row in results:
+        available_pools.update(row.get('other_pools', []))
+    
+    meta = {
+        'idc': idc,
+        'pool': pool,
+        'total_psm': len(results),
+        'migratable_psm': sum(1 for row in results if row.get('deployment_status') == '多资源池'),
+        'available_pools': sorted(available_pools),
+        'truncated': truncated
+    }
+    return MIGRATABLE_RESULTS.put(results, meta)
+
+@app.route('/analyze_migratable', methods=['GET', 'POST'])
 def analyze_migratable():
+    # GET请求携带cursor时，在已保存的结果集上翻页/排序
+    if request.method == 'GET':
+        cursor = request.args.get('cursor')
+        if not cursor:
+            return render_template('migratable.html')
+        result_set = MIGRATABLE_RESULTS.get(cursor)
+        if result_set is None:
+            return render_template('migratable.html', error='查询结果已过期，请重新查询')
+        return render_migratable_page(result_set)
+    
     print("收到可腾挪集群查询请求...")
     
     # 检查请求参数
@@ -187,41 +409,14 @@ def analyze_migratable():
     try:
         print(f"开始分析数据文件: {file_path}")
         
-        # 使用resource_manager模块进行分析
-        results = rm.analyze_migratable_clusters(file_path, idc, pool)
-        
-        print(f"分析完成，结果数量: {len(results)}")
-        
-        # 计算统计信息
-        total_psm = len(results)
-        migratable_psm = sum(1 for row in results if row.get('deployment_status') == '多资源池')
-        
-        print(f"统计信息: total_psm={total_psm}, migratable_psm={migratable_psm}")
+        # 通过查询引擎进行分析，完整结果保存在服务端
+        result_set = build_migratable_result_set(file_path, idc, pool)
         
-        # 收集所有可用的其他资源池
-        available_pools = set()
-        for row in results:
-            available_pools.update(row.get('other_pools', []))
-        available_pools = sorted(list(available_pools))
+        print(f"分析完成，结果数量: {result_set.meta['total_psm']}")
+        if result_set.meta['truncated'] and not result_set.meta['total_psm']:
+            return render_template('migratable.html', error='分析超过时间预算，没有已完成的结果，请缩小查询范围后重试')
         
-        # 为了避免请求超时，限制结果数量
-        max_results = 500  # 设置一个合理的上限
-        if len(results) > max_results:
-            print(f"结果数量过多({len(results)}), 限制为{max_results}")
-            results = results[:max_results]
-        
-        # 准备响应数据，移除excel_filename相关内容
-        response_data = {
-            'results': results,
-            'idc': idc,
-            'pool': pool,
-            'total_psm': total_psm,
-            'migratable_psm': migratable_psm,
-            'available_pools': available_pools
-        }
-        
-        print("准备渲染模板...")
-        return render_template('migratable.html', **response_data)
+        return render_migratable_page(result_set)
         
     except Exception as e:
         import traceback
@@ -230,133 +425,242 @@ def analyze_migratable():
         print(f"错误详情: {traceback.format_exc()}")
         return render_template('migratable.html', error=error_msg)
 
-def generate_migration_excel(results, idc, pool1, pool2):
-    # 创建文件名
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'migration_{idc}_{pool1}_to_{pool2}_{timestamp}.xlsx'
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    
+def render_migratable_page(result_set):
+    """按请求中的page、page_size、sort渲染结果集的一页"""
+    page = result_set.page(**parse_page_args(request.values, MIGRATABLE_SORT_KEYS))
+    return render_template(
+        'migratable.html',
+        results=page['items'],
+        pagination=page['pagination'],
+        sort_keys=MIGRATABLE_SORT_KEYS,
+        **result_set.meta
+    )
+
+def generate_migration_excel(results, result_key, idc, pool1, pool2, fmt='xlsx'):
     # 创建DataFrame
-    df = pd.DataFrame(results)
+    df = frame_from_records(results)
     
-    # 创建Excel写入器
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        # 写入详细数据
-        df.to_excel(writer, sheet_name='腾挪详情', index=False)
-        
-        # 添加统计信息
-        stats_df = pd.DataFrame({
-            '统计项': ['总可腾挪CPU(核)', '总可腾挪内存(GB)', '可腾挪服务数量'],
-            '数值': [
-                sum(row.get('migratable_cpu', 0) for row in results),
-                sum(row.get('migratable_mem', 0) for row in results),
-                len(results)
-            ]
-        })
-        stats_df.to_excel(writer, sheet_name='统计信息', index=False)
-        
-        # 添加说明
-        info_df = pd.DataFrame({
-            '说明': [
-                f'分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}',
-                f'机房: {idc}',
-                f'源资源池: {pool1}',
-                f'目标资源池: {pool2}',
-                '腾挪建议: 先扩容目标资源池集群，确认服务稳定后缩容源资源池集群'
-            ]
-        })
-        info_df.to_excel(writer, sheet_name='分析说明', index=False)
+    # 添加统计信息
+    stats_df = pd.DataFrame({
+        '统计项': ['总可腾挪CPU(核)', '总可腾挪内存(GB)', '可腾挪服务数量'],
+        '数值': [
+            sum(row.get('migratable_cpu', 0) for row in results),
+            sum(row.get('migratable_mem', 0) for row in results),
+            len(results)
+        ]
+    })
+    
+    # 添加说明
+    info_df = pd.DataFrame({
+        '说明': [
+            f'分析时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+            f'机房: {idc}',
+            f'源资源池: {pool1}',
+            f'目标资源池: {pool2}',
+            '腾挪建议: 先扩容目标资源池集群，确认服务稳定后缩容源资源池集群'
+        ]
+    })
     
+    # 按查询键（QueryEngine.result_key）生成文件名，在后台任务中逐行写出报告
+    sheets = [('腾挪详情', df), ('统计信息', stats_df), ('分析说明', info_df)]
+    filename = REPORT_STORE.filename_for(
+        f'migration_{idc}_{pool1}_to_{pool2}'.replace('/', '-'), result_key, normalize_format(fmt)
+    )
+    REPORT_STORE.save(filename, lambda path: export_report(path, sheets, fmt), submit=REPORT_JOBS.submit)
     return filename
 
-def generate_recommend_excel(results, idc, pool):
-    # 创建文件名
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'recommend_scale_down_{idc}_{pool}_{timestamp}.xlsx'
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    
+def generate_recommend_excel(results, result_key, idc, pool, fmt='xlsx'):
     # 创建DataFrame
-    df = pd.DataFrame(results)
+    df = frame_from_records(results)
     
-    # 创建Excel写入器
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        # 写入详细数据
-        df.to_excel(writer, sheet_name='缩容建议', index=False)
-        
-        # 添加统计信息
-        stats_df = pd.DataFrame({
-            '统计项': ['预计可释放CPU(核)', '符合条件的集群数量', '建议缩容核数大于10的集群数'],
-            '数值': [
-                sum(row.get('save_cores', 0) for row in results),
-                len(results),
-                sum(1 for row in results if row.get('save_cores', 0) > 10)
-            ]
-        })
-        stats_df.to_excel(writer, sheet_name='统计信息', index=False)
-        
-        # 添加说明
-        info_df = pd.DataFrame({
-            '说明': [
-                f'分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}',
-                f'机房: {idc}',
-                f'资源池: {pool}',
-                '缩容建议: 优先考虑缩容建议核数较大的集群，缩容前请确认服务实际运行情况'
-            ]
-        })
-        info_df.to_excel(writer, sheet_name='分析说明', index=False)
+    # 添加统计信息
+    stats_df = pd.DataFrame({
+        '统计项': ['预计可释放CPU(核)', '符合条件的集群数量', '建议缩容核数大于10的集群数'],
+        '数值': [
+            sum(row.get('save_cores', 0) for row in results),
+            len(results),
+            sum(1 for row in results if row.get('save_cores', 0) > 10)
+        ]
+    })
+    
+    # 添加说明
+    info_df = pd.DataFrame({
+        '说明': [
+            f'分析时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+            f'机房: {idc}',
+            f'资源池: {pool}',
+            '缩容建议: 优先考虑缩容建议核数较大的集群，缩容前请确认服务实际运行情况'
+        ]
+    })
     
+    # 按查询键（QueryEngine.result_key）生成文件名，在后台任务中逐行写出报告
+    sheets = [('缩容建议', df), ('统计信息', stats_df), ('分析说明', info_df)]
+    filename = REPORT_STORE.filename_for(
+        f'recommend_scale_down_{idc}_{pool}'.replace('/', '-'), result_key, normalize_format(fmt)
+    )
+    REPORT_STORE.save(filename, lambda path: export_report(path, sheets, fmt), submit=REPORT_JOBS.submit)
     return filename
 
-def generate_migratable_excel(results, idc, pool):
-    # 创建文件名
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'migratable_clusters_{idc}_{pool}_{timestamp}.xlsx'
-    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+def generate_migratable_excel(results, result_key, idc, pool, fmt='xlsx'):
+    # 创建DataFrame，列表类型的字段转换为字符串
+    df = frame_from_records(results)
     
-    # 创建DataFrame，需要处理列表类型的字段
-    df = pd.DataFrame(results)
-    # 将列表字段转换为字符串
-    if 'other_pools' in df.columns:
-        df['other_pools'] = df['other_pools'].apply(lambda x: ', '.join(x) if isinstance(x, list) else x)
+    # 添加统计信息
+    migratable_count = sum(1 for row in results if row.get('deployment_status') == '多资源池')
+    stats_df = pd.DataFrame({
+        '统计项': ['总查询PSM数量', '可跨资源池腾挪的PSM数量', '总集群数量'],
+        '数值': [
+            len(results),
+            migratable_count,
+            sum(row.get('other_pool_cluster_count', 0) for row in results) + len(results)
+        ]
+    })
     
-    # 创建Excel写入器
-    with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-        # 写入详细数据
-        df.to_excel(writer, sheet_name='可腾挪集群', index=False)
-        
-        # 添加统计信息
-        migratable_count = sum(1 for row in results if row.get('deployment_status') == '多资源池')
-        stats_df = pd.DataFrame({
-            '统计项': ['总查询PSM数量', '可跨资源池腾挪的PSM数量', '总集群数量'],
-            '数值': [
-                len(results),
-                migratable_count,
-                sum(row.get('other_pool_cluster_count', 0) for row in results) + len(results)
-            ]
-        })
-        stats_df.to_excel(writer, sheet_name='统计信息', index=False)
-        
-        # 添加说明
-        info_df = pd.DataFrame({
-            '说明': [
-                f'分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}',
-                f'机房: {idc}',
-                f'查询资源池: {pool}',
-                '使用建议: 选择可腾挪状态的PSM，结合其他可用资源池信息进行资源规划'
-            ]
-        })
-        info_df.to_excel(writer, sheet_name='分析说明', index=False)
+    # 添加说明
+    info_df = pd.DataFrame({
+        '说明': [
+            f'分析时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}',
+            f'机房: {idc}',
+            f'查询资源池: {pool}',
+            '使用建议: 选择可腾挪状态的PSM，结合其他可用资源池信息进行资源规划'
+        ]
+    })
     
+    # 按查询键（QueryEngine.result_key）生成文件名，在后台任务中逐行写出报告
+    sheets = [('可腾挪集群', df), ('统计信息', stats_df), ('分析说明', info_df)]
+    filename = REPORT_STORE.filename_for(
+        f'migratable_clusters_{idc}_{pool}'.replace('/', '-'), result_key, normalize_format(fmt)
+    )
+    REPORT_STORE.save(filename, lambda path: export_report(path, sheets, fmt), submit=REPORT_JOBS.submit)
+    return filename
+
+def generate_batch_migration_excel(analysis_result, result_key, idc, fmt='xlsx'):
+    """多候选资源池分析报告：每个候选池一张汇总表和一张详细表，最后是候选池排名"""
+    data = analysis_result['data']
+    sheets = []
+    for i, pool in enumerate(data['candidate_pools'], start=1):
+        entry = data['results'][pool]
+        if entry['data'] is None:
+            continue
+        # 工作表名不能包含'/'且最长31个字符
+        title = f"候选池{i}_{pool.replace('/', '_')}"[:28]
+        sheets.append((f'{title}_汇总', entry['data']['summary']))
+        sheets.append((f'{title}_详细', entry['data']['detail']))
+    sheets.append(('资源池统计', pd.DataFrame(data['ranking'])))
+    
+    filename = REPORT_STORE.filename_for(
+        f"batch_migration_{idc}_{data['target_pool']}".replace('/', '-').replace(',', '-'),
+        result_key, normalize_format(fmt)
+    )
+    REPORT_STORE.save(
+        filename, lambda path: export_report(path, sheets, fmt, primary=len(sheets) - 1),
+        submit=REPORT_JOBS.submit
+    )
     return filename
 
 @app.route('/download/<filename>')
 def download_file(filename):
+    # 报告仍在后台生成时，先等待一段时间，仍未完成则返回202让客户端稍后重试
+    job = REPORT_JOBS.find_by_filename(filename)
+    if job is not None and not job.finished:
+        try:
+            wait = float(request.args.get('wait', DOWNLOAD_WAIT_SECONDS))
+        except ValueError:
+            wait = DOWNLOAD_WAIT_SECONDS
+        if not job.wait(min(wait, DOWNLOAD_WAIT_SECONDS)):
+            response = jsonify({'success': False, 'message': '报告正在生成中，请稍后重试', 'job': job.to_dict()})
+            response.status_code = 202
+            response.headers['Retry-After'] = '2'
+            return response
+    if job is not None and job.status == FAILED:
+        return f"报告生成失败: {job.error}", 500
+    
     filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     if os.path.exists(filepath):
+        REPORT_STORE.touch(filename)
         return send_file(filepath, as_attachment=True)
     else:
         return "文件不存在", 404
 
+@app.route('/api/report_jobs/<job_id>', methods=['GET'])
+def api_report_job(job_id):
+    """查询报告生成任务的状态"""
+    job = REPORT_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+@app.route('/api/export/<kind>', methods=['POST'])
+def api_export(kind):
+    """
+    按请求指定的格式直接导出分析结果（kind: migration / recommend / migratable / affinity / plan / fleet）
+    csv和csv.gz边生成边写入响应，xlsx逐行写入临时文件后发送
+    """
+    try:
+        data = request.get_json()
+        fmt = normalize_format(data.get('format', 'csv'))
+        idc = data.get('idc')
+        data_file = data.get('data_file', 'all.xlsx')
+        
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
+        if not os.path.exists(file_path):
+            return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
+        
+        if kind == 'migration':
+            pool1, pool2 = data.get('pool1'), data.get('pool2')
+            if not all([pool1, pool2]):
+                return jsonify({'error': '缺少必要参数'}), 400
+            idc_list = parse_idc_list(idc)
+            analysis_result = QueryEngine(file_path).migration(pool1, pool2, idc_list)
+            if analysis_result['status'] != 'success':
+                return jsonify({'error': analysis_result.get('message', '分析失败')}), 404
+            df = analysis_result['data']['detail']
+        elif kind == 'recommend':
+            pool = data.get('pool')
+            if not all([idc, pool]):
+                return jsonify({'error': '缺少必要参数'}), 400
+            min_save_cores = int(data.get('min_save_cores', 0) or 0)
+            df = frame_from_records(QueryEngine(file_path).recommended_scaling(idc, pool, min_save_cores))
+        elif kind == 'migratable':
+            pool = data.get('pool')
+            if not all([idc, pool]):
+                return jsonify({'error': '缺少必要参数'}), 400
+            df = frame_from_records(QueryEngine(file_path).migratable_clusters(idc, pool))
+        elif kind == 'plan':
+            if not data.get('source_pool') or not (data.get('targets') or data.get('headroom')):
+                return jsonify({'error': '缺少必要参数'}), 400
+            df = run_migration_plan(data)['data']['plan']
+        elif kind == 'affinity':
+            idc_list = parse_idc_list(idc)
+            df = QueryEngine(file_path).pool_affinity(
+                idc_list, data.get('source_pool'), parse_top(data.get('top'))
+            )
+        elif kind == 'fleet':
+            df = run_fleet_scan(data)
+        else:
+            return jsonify({'error': f'不支持的导出类型: {kind}'}), 404
+        
+        filename = report_filename(f"{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}", fmt)
+        
+        if fmt == 'xlsx':
+            # 亲和矩阵按机房分工作表
+            sheets = affinity_sheets(df) if kind == 'affinity' else [(kind, df)]
+            tmp = tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False)
+            tmp.close()
+            with span('write_xlsx'):
+                write_xlsx(tmp.name, sheets)
+            response = send_file(tmp.name, as_attachment=True, download_name=filename)
+            response.call_on_close(lambda: os.remove(tmp.name))
+            return response
+        
+        return Response(
+            iter_export(df, fmt),
+            mimetype=MIMETYPES[fmt],
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # API接口支持
 @app.route('/api/migration', methods=['POST'])
 def api_migration():
@@ -374,32 +678,145 @@ def api_migration():
         if not os.path.exists(file_path):
             return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
         
-        results = rm.analyze_resource_migration(file_path, idc, pool1, pool2)
-        total_cpu = sum(row.get('migratable_cpu', 0) for row in results)
-        total_memory = sum(row.get('migratable_mem', 0) for row in results)
+        idc_list = parse_idc_list(idc)
+        analysis_result = QueryEngine(file_path).migration(pool1, pool2, idc_list)
+        if analysis_result['status'] != 'success':
+            return jsonify({'error': analysis_result.get('message', '分析失败')}), 404
+        
+        # 可腾挪资源按源资源池中的用量统计
+        summary_df = analysis_result['data']['summary']
+        source_df = summary_df[summary_df['pool_identifier'] == pool1]
+        results = analysis_result['data']['detail'].to_dict(orient='records')
         
         return jsonify({
             'success': True,
             'results': results,
             'summary': {
-                'total_cpu': total_cpu,
-                'total_memory': total_memory,
-                'service_count': len(results),
+                'total_cpu': float(source_df['cpu_limit'].sum()),
+                'total_memory': float(source_df['mem_limit'].sum()),
+                'service_count': int(summary_df['psm'].nunique()),
                 'idc': idc,
                 'source_pool': pool1,
                 'target_pool': pool2
             }
         })
+    except BudgetExceeded as e:
+        record_timeout(e)
+        return jsonify({'error': str(e), 'truncated': True, 'elapsed': e.elapsed}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analyze', methods=['POST'])
+def api_analyze():
+    """多候选资源池腾挪分析API，detail为false时只返回统计和排名"""
+    try:
+        data = request.get_json() or {}
+        target_pool = (data.get('target_pool') or '').strip()
+        candidate_pools = rm.parse_pool_list(data.get('candidate_pools'))
+        data_file = data.get('data_file', 'all.xlsx')
+        include_detail = str(data.get('detail', True)).lower() not in ('false', '0', 'no')
+        
+        if not target_pool or not candidate_pools:
+            return jsonify({'status': 'error', 'message': '缺少必要参数'}), 400
+        
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
+        if not os.path.exists(file_path):
+            return jsonify({'status': 'error', 'message': f'数据文件 {data_file} 不存在'}), 404
+        
+        idc_list = parse_idc_list(data.get('idc'))
+        analysis_result = QueryEngine(file_path).batch_migration(
+            target_pool, candidate_pools, idc_list, include_detail
+        )
+        
+        results = {}
+        for pool, entry in analysis_result['data']['results'].items():
+            result = {
+                'has_matches': entry['matching_psm_count'] > 0,
+                'matching_psm_count': entry['matching_psm_count'],
+                'target_pool_resources': entry['target_pool_resources'],
+                'candidate_pool_resources': entry['candidate_pool_resources'],
+            }
+            if entry['data'] is not None:
+                result['detailed_data'] = entry['data']['detail'].to_dict(orient='records')
+                result['summary_data'] = entry['data']['summary'].to_dict(orient='records')
+            results[pool] = result
+        
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'target_pool': target_pool,
+                'candidate_pools': analysis_result['data']['candidate_pools'],
+                'target_stats': analysis_result['data']['target_stats'],
+                'ranking': analysis_result['data']['ranking'],
+                'results': results,
+            }
+        })
+    except BudgetExceeded as e:
+        record_timeout(e)
+        return jsonify({'status': 'error', 'message': str(e), 'truncated': True, 'elapsed': e.elapsed}), 504
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+def parse_time_budget(value):
+    """解析规划的时间预算（秒），限制在(0, MAX_TIME_BUDGET]之间"""
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_TIME_BUDGET
+    return min(budget, MAX_TIME_BUDGET) if budget > 0 else DEFAULT_TIME_BUDGET
+
+def run_migration_plan(data):
+    """按请求参数执行资源腾挪规划"""
+    idc = data.get('idc') or ''
+    idc_list = parse_idc_list(idc)
+    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data.get('data_file', 'all.xlsx'))
+    return QueryEngine(file_path).plan(
+        (data.get('source_pool') or '').strip(),
+        data.get('targets') or data.get('headroom'),
+        float(data.get('cpu_target') or 0),
+        float(data.get('mem_target') or 0),
+        idc_list,
+        parse_time_budget(data.get('time_budget'))
+    )
+
+@app.route('/api/migration/plan', methods=['POST'])
+def api_migration_plan():
+    """
+    资源腾挪规划：给定源资源池、需要释放的CPU/内存和各目标资源池的剩余容量，
+    给出迁移哪些集群、迁移到哪里的方案
+    参数: source_pool、targets（{资源池: {"cpu": 核数, "mem": 内存}}或资源池列表）、
+          cpu_target、mem_target、idc（可选）、time_budget（秒，可选）
+    """
+    try:
+        data = request.get_json() or {}
+        if not data.get('source_pool') or not (data.get('targets') or data.get('headroom')):
+            return jsonify({'error': '缺少必要参数'}), 400
+        plan_result = run_migration_plan(data)
+        return jsonify({
+            'success': plan_result['status'] != 'empty',
+            'status': plan_result['status'],
+            'message': plan_result['message'],
+            'summary': plan_result['data']['summary'],
+            'targets': plan_result['data']['targets'],
+            'solver': plan_result['data']['solver'],
+            'plan': plan_result['data']['plan'].to_dict(orient='records'),
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
 @app.route('/api/recommend', methods=['POST'])
 def api_recommend():
+    """
+    推荐缩容分析
+    参数: idc、pool、min_save_cores（可选）、top_k/limit（只返回save_cores最大的前N个，可选）、
+          stream（为true时以NDJSON逐行输出记录，可选）
+    """
     try:
         data = request.get_json()
         idc = data.get('idc')
         pool = data.get('pool')
         min_save_cores = data.get('min_save_cores', 0)
+        top_k = parse_top(data.get('top_k', data.get('limit')))
         data_file = data.get('data_file', 'all.xlsx')
         
         if not all([idc, pool]):
@@ -409,16 +826,49 @@ def api_recommend():
         if not os.path.exists(file_path):
             return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
         
-        results = rm.analyze_recommended_scaling(file_path, idc, pool, min_save_cores)
-        total_cpu = sum(row.get('save_cores', 0) for row in results)
-        total_clusters = len(results)
+        if data.get('stream'):
+            records = QueryEngine(file_path).iter_recommended_scaling(idc, pool, min_save_cores, top_k)
+            # 先取第一条，筛选出错时仍返回错误状态码而不是中断的流
+            first = next(records, None)
+            
+            def generate():
+                if first is None:
+                    return
+                yield from stream_ndjson(itertools.chain([first], records), deadline, route)
+            
+            deadline, route = current_deadline(), request.endpoint
+            return Response(generate(), mimetype='application/x-ndjson')
+        
+        engine = QueryEngine(file_path)
+        results = engine.recommended_scaling(idc, pool, min_save_cores, top_k)
+        totals = engine.recommended_scaling_totals(idc, pool, min_save_cores)
         
         return jsonify({
             'success': True,
             'results': results,
             'summary': {
-                'total_cpu': total_cpu,
-                'total_clusters': total_clusters,
+                'total_cpu': totals['total_cpu'],
+                'total_clusters': totals['total_clusters'],
+                'returned': len(results),
+                'top_k': top_k,
+                'idc': idc,
+                'pool': pool
+            }
+        })
+    except BudgetExceeded as e:
+        # 超时时返回已完成的部分结果
+        record_timeout(e)
+        results = e.partial or []
+        return jsonify({
+            'success': True,
+            'truncated': True,
+            'message': str(e),
+            'results': results,
+            'summary': {
+                'total_cpu': sum(row['save_cores'] for row in results),
+                'total_clusters': len(results),
+                'returned': len(results),
+                'top_k': top_k,
                 'idc': idc,
                 'pool': pool
             }
@@ -430,41 +880,204 @@ def api_recommend():
 def api_migratable():
     try:
         data = request.get_json()
-        idc = data.get('idc')
-        pool = data.get('pool')
-        data_file = data.get('data_file', 'all.xlsx')
+        cursor = data.get('cursor')
         
-        if not all([idc, pool]):
-            return jsonify({'error': '缺少必要参数'}), 400
+        if cursor:
+            # 在已保存的结果集上翻页
+            result_set = MIGRATABLE_RESULTS.get(cursor)
+            if result_set is None:
+                return jsonify({'error': '查询结果已过期，请重新查询'}), 404
+        else:
+            idc = data.get('idc')
+            pool = data.get('pool')
+            data_file = data.get('data_file', 'all.xlsx')
+            
+            if not all([idc, pool]):
+                return jsonify({'error': '缺少必要参数'}), 400
+            
+            file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
+            if not os.path.exists(file_path):
+                return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
+            
+            result_set = build_migratable_result_set(file_path, idc, pool)
+        
+        page = result_set.page(**parse_page_args(data, MIGRATABLE_SORT_KEYS))
         
+        return jsonify({
+            'success': True,
+            'results': page['items'],
+            'summary': result_set.meta,
+            'pagination': page['pagination']
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/migratable/stream', methods=['POST'])
+def api_migratable_stream():
+    """可腾挪集群查询的NDJSON流式接口，每行一条记录，边计算边输出"""
+    data = request.get_json()
+    idc = data.get('idc')
+    pool = data.get('pool')
+    data_file = data.get('data_file', 'all.xlsx')
+    
+    if not all([idc, pool]):
+        return jsonify({'error': '缺少必要参数'}), 400
+    
+    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
+    if not os.path.exists(file_path):
+        return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
+    
+    records = QueryEngine(file_path).iter_migratable_clusters(idc, pool)
+    return Response(stream_ndjson(records, current_deadline(), request.endpoint), mimetype='application/x-ndjson')
+
+def stream_ndjson(records, deadline, route):
+    """
+    逐行输出NDJSON记录。响应体在请求处理结束后才生成，需要沿用请求开始时的截止时间；
+    超时时输出一行{"truncated": true, ...}后结束
+    """
+    with time_budget(deadline):
+        try:
+            for record in records:
+                yield json.dumps(record, ensure_ascii=False, default=str) + '\n'
+        except BudgetExceeded as e:
+            record_timeout(e, route)
+            yield json.dumps({'truncated': True, 'message': str(e), 'elapsed': e.elapsed}, ensure_ascii=False) + '\n'
+
+def parse_top(value):
+    """解析top参数，非正数或非法值表示不限制"""
+    try:
+        top = int(value)
+    except (TypeError, ValueError):
+        return None
+    return top if top > 0 else None
+
+@app.route('/api/pool_affinity', methods=['GET', 'POST'])
+def api_pool_affinity():
+    """
+    资源池亲和矩阵：每个机房内资源池两两之间的共同PSM数及两侧资源之和
+    参数: idc（逗号分隔，可选）、source_pool（可选）、top（每个源资源池保留的目标资源池数，可选）
+    """
+    try:
+        data = request.get_json(silent=True) or request.args
+        data_file = data.get('data_file', 'all.xlsx')
         file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
         if not os.path.exists(file_path):
             return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
         
-        results = rm.analyze_migratable_clusters(file_path, idc, pool)
-        total_psm = len(results)
-        migratable_psm = sum(1 for row in results if row.get('deployment_status') == '多资源池')
+        idc = data.get('idc') or ''
+        idc_list = parse_idc_list(idc)
+        affinity = QueryEngine(file_path).pool_affinity(
+            idc_list, data.get('source_pool'), parse_top(data.get('top'))
+        )
+        return jsonify({
+            'success': True,
+            'count': len(affinity),
+            'results': affinity.to_dict(orient='records'),
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def run_fleet_scan(data):
+    """按请求参数执行全量推荐缩容扫描"""
+    file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data.get('data_file', 'all.xlsx'))
+    idc = data.get('idc') or ''
+    idc_list = parse_idc_list(idc)
+    return QueryEngine(file_path).fleet(
+        int(data.get('min_save_cores', 0) or 0),
+        idc_list,
+        parse_top(data.get('top')),
+        FLEET_SCAN_WORKERS
+    )
+
+@app.route('/api/fleet_scan', methods=['GET', 'POST'])
+def api_fleet_scan():
+    """
+    全量推荐缩容扫描：一次统计所有机房、所有资源池的符合条件集群数和可节省的CPU总核数
+    参数: min_save_cores（可选）、idc（逗号分隔，可选）、top（可节省CPU最多的前N个资源池，可选）
+    """
+    try:
+        data = request.get_json(silent=True) or request.args
+        data_file = data.get('data_file', 'all.xlsx')
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
+        if not os.path.exists(file_path):
+            return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
         
-        # 收集所有可用的其他资源池
-        available_pools = set()
-        for row in results:
-            available_pools.update(row.get('other_pools', []))
-        available_pools = sorted(list(available_pools))
+        result = run_fleet_scan(data)
+        return jsonify({
+            'success': True,
+            'summary': fleet_summary(result),
+            'results': result.to_dict(orient='records'),
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/snapshot_stats', methods=['GET'])
+def api_snapshot_stats():
+    """数据快照缓存的命中/未命中/重新加载统计"""
+    return jsonify({'success': True, 'stats': snapshot_stats()})
+
+@app.route('/api/snapshot_changes', methods=['GET'])
+def api_snapshot_changes():
+    """
+    数据文件最近一次更新的变化汇总：新增/删除/修改的行数，以及每个资源池的instance_num、cpu_limit、mem_limit变化量
+    参数: data_file（可选）
+    """
+    try:
+        data_file = request.args.get('data_file', 'all.xlsx')
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), data_file)
+        if not os.path.exists(file_path):
+            return jsonify({'error': f'数据文件 {data_file} 不存在'}), 404
         
+        snapshot = QueryEngine(file_path).snapshot
         return jsonify({
             'success': True,
-            'results': results,
-            'summary': {
-                'total_psm': total_psm,
-                'migratable_psm': migratable_psm,
-                'available_pools': available_pools,
-                'idc': idc,
-                'pool': pool
-            }
+            'version': snapshot.version,
+            'changes': snapshot.changes.to_dict() if snapshot.changes is not None else None,
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/report_store_stats', methods=['GET'])
+def api_report_store_stats():
+    """报告目录的文件数、占用空间、复用和淘汰统计"""
+    return jsonify({'success': True, 'stats': REPORT_STORE.stats()})
+
+@app.route('/api/timeout_stats', methods=['GET'])
+def api_timeout_stats():
+    """各路由的时间预算和超时请求数"""
+    return jsonify({'success': True, 'stats': timeout_stats()})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus格式的各路由、各分析阶段的延迟直方图和超时次数（每个工作进程分别统计，以worker标签区分）"""
+    worker = worker_label()
+    lines = [
+        '# HELP psm_request_timeouts_total 超过时间预算的请求数',
+        '# TYPE psm_request_timeouts_total counter',
+    ] + [
+        f'psm_request_timeouts_total{{route="{route}",{worker}}} {count}'
+        for route, count in sorted(timeout_stats()['by_route'].items())
+    ]
+    return Response(render_metrics(lines), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/profiles/<profile_id>', methods=['GET'])
+def api_profile(profile_id):
+    """下载一次请求的调用栈采样结果（折叠栈格式）"""
+    profile = PROFILES.get(profile_id)
+    if profile is None:
+        return jsonify({'error': '采样结果不存在或已过期'}), 404
+    label, content = profile
+    return Response(
+        content,
+        mimetype='text/plain; charset=utf-8',
+        headers={'Content-Disposition': f'attachment; filename=profile_{profile_id}.txt'}
+    )
+
+@app.route('/api/cache_stats', methods=['GET'])
+def api_cache_stats():
+    """分析结果缓存的命中率、条目数、内存占用和淘汰统计"""
+    return jsonify({'success': True, 'stats': query_cache_stats()})
+
 if __name__ == '__main__':
     # 设置host为0.0.0.0以允许从其他机器访问
     app.run(host='0.0.0.0', port=8888, debug=True)
\ No newline at end of file
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 基准测试
+在合成库存数据上测量数据加载、资源池匹配和三个分析功能的耗时，结果输出为JSON，便于在不同提交之间对比：
+1. 每个规模（行数）生成一份合成数据，写为旁路文件（可选同时写Excel）
+2. 每项测量重复多次，记录最小值、中位数和最大值；分析函数绕过结果缓存，每次都完整计算，
+   另外单独执行一次记录峰值内存（tracemalloc统计的numpy数组和Python对象，不含与快照共享的Arrow字符串缓冲区）
+3. 记录原始数据（逐行保存字符串）和快照（紧凑表示）占用的内存，以及在快照上组合过滤条件的耗时
+4. compare_results()按中位数对比两份结果，耗时增加超过阈值的记为性能回退
+5. benchmark_entry_points()测量命令行和各个Web应用执行同一个资源腾挪分析的耗时，确认都走查询引擎
+
+同一个规模的第一次分析会构建索引，索引构建单独作为一项测量，其余测量都在索引构建之后进行。
+"""
+
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import resource_manager as rm
+from inventory_dtypes import memory_bytes
+from psm_index import PoolMembershipIndex
+from query_cache import QUERY_CACHE
+from query_engine import QueryEngine
+from request_tracing import SPAN_LATENCY
+from snapshot_cache import SNAPSHOT_CACHE, get_snapshot, normalize_dtypes
+from synthetic_inventory import default_path, generate_inventory, pick_queries, write_inventory
+
+# 默认测量的规模（行数），最大支持到500万行
+DEFAULT_SCALES = [10_000, 100_000, 1_000_000]
+
+# 每项测量的重复次数
+DEFAULT_REPEAT = 5
+
+# 对比时耗时增加超过该比例记为性能回退
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# 测量Excel加载耗时的最大行数，更大的Excel读取过慢
+EXCEL_LOAD_MAX_ROWS = 200_000
+
+RESULT_VERSION = 1
+
+
+def measure(func: Callable[[], Any], repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    """
+    重复执行func并统计耗时（秒）
+
+    Returns:
+        min、median、max和每次的耗时runs
+    """
+    runs = []
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - started)
+    return {
+        "min": round(min(runs), 6),
+        "median": round(statistics.median(runs), 6),
+        "max": round(max(runs), 6),
+        "runs": [round(run, 6) for run in runs],
+    }
+
+
+def measure_peak_memory(func: Callable[[], Any]) -> int:
+    """执行一次func，返回执行期间新分配内存的峰值（字节），用于统计每次查询复制数据的开销"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _git_commit() -> Optional[str]:
+    """当前代码的提交号，不在git仓库中时返回None"""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def environment() -> Dict[str, Any]:
+    """运行环境信息，对比结果时用于判断两份结果是否可比"""
+    return {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def benchmark_scale(
+    rows: int,
+    seed: int = 0,
+    repeat: int = DEFAULT_REPEAT,
+    directory: Optional[str] = None,
+    excel: bool = False,
+) -> Dict[str, Any]:
+    """
+    在一个规模上执行全部测量
+
+    Args:
+        rows: 合成数据的行数
+        seed: 随机种子
+        repeat: 每项测量的重复次数
+        directory: 合成数据文件的目录
+        excel: 是否同时写出Excel并测量Excel的加载耗时（只在行数不超过EXCEL_LOAD_MAX_ROWS时测量）
+    """
+    started = time.perf_counter()
+    df = generate_inventory(rows, seed)
+    generate_seconds = time.perf_counter() - started
+
+    excel = excel and rows <= EXCEL_LOAD_MAX_ROWS
+    path = default_path(rows, directory)
+    write_inventory(df, path, excel=excel)
+    queries = pick_queries(df)
+    raw_bytes = memory_bytes(df)
+    del df
+
+    idc, pool1, pool2 = queries["idc"], queries["pool1"], queries["pool2"]
+    pool1_tuple, pool2_tuple = rm.parse_pool_string(pool1), rm.parse_pool_string(pool2)
+
+    def load():
+        SNAPSHOT_CACHE.clear()
+        get_snapshot(path)
+
+    results = {"load": measure(load, repeat)}
+    if excel:
+        results["load_excel"] = measure(lambda: normalize_dtypes(pd.read_excel(path)), 1)
+
+    snapshot = get_snapshot(path)
+    data = snapshot.df
+    results["build_pool_index"] = measure(lambda: PoolMembershipIndex.build(data), repeat)
+    rm.get_pool_index(snapshot)
+
+    # 在快照上组合机房、default集群和资源池条件（分类列上只比较编码）
+    results["filter_rows"] = measure(lambda: len(
+        rm.default_cluster_rows(data, [idc])
+        .equals("physical_cluster", pool1_tuple[0]).equals("iaas_cluster", pool1_tuple[1])
+    ), repeat)
+
+    # 未使用索引的完整流程：按机房过滤、过滤default集群（只物化一次）、匹配两个资源池
+    def scan_both_pools():
+        filtered = rm.default_cluster_rows(data, [idc]).frame()
+        return rm.find_psm_in_both_pools(filtered, pool1_tuple, pool2_tuple)
+
+    # 分析函数绕过结果缓存
+    analyses = {
+        "find_psm_in_both_pools": scan_both_pools,
+        "find_psm_in_both_pools_indexed": lambda: rm.find_psm_in_both_pools_indexed(
+            snapshot, pool1_tuple, pool2_tuple, [idc]
+        ),
+        "analyze_resource_migration": lambda: rm.analyze_resource_migration.__wrapped__(path, pool1, pool2, [idc]),
+        "analyze_recommended_scaling": lambda: rm.analyze_recommended_scaling.__wrapped__(path, idc, pool1),
+        "analyze_migratable_clusters": lambda: rm.analyze_migratable_clusters.__wrapped__(path, idc, pool1),
+    }
+    for name, func in analyses.items():
+        results[name] = measure(func, repeat)
+        results[name]["peak_bytes"] = measure_peak_memory(func)
+
+    return {
+        "rows": rows,
+        "seed": seed,
+        "generate_seconds": round(generate_seconds, 6),
+        "queries": queries,
+        "memory": {"raw_bytes": raw_bytes, "snapshot_bytes": memory_bytes(data)},
+        "results": results,
+    }
+
+
+# 入口基准测试的默认规模
+ENTRY_POINT_ROWS = 100_000
+
+# 查询引擎中资源腾挪分析和资源池匹配的阶段名
+ENGINE_SPAN = "analyze_resource_migration"
+FAST_PATH_SPAN = "find_psm_in_both_pools"
+
+
+def _entry_points(path: str, queries: Dict[str, str], output_dir: str) -> Dict[str, Callable[[], Any]]:
+    """
+    命令行和各个Web应用中资源腾挪分析的入口，每个入口执行一次完整的请求
+
+    Web应用在output_dir中导入，导入时创建的输出目录都在output_dir中
+    """
+    import main
+
+    cwd = os.getcwd()
+    os.chdir(output_dir)
+    try:
+        import app
+        import app_complete
+        import app_enhanced
+    finally:
+        os.chdir(cwd)
+    app.EXCEL_FILE = app_complete.EXCEL_FILE = path
+
+    form = {"idc": queries["idc"], "pool1": queries["pool1"], "pool2": queries["pool2"]}
+    clients = {name: module.app.test_client() for name, module in
+               [("app", app), ("app_complete", app_complete), ("app_enhanced", app_enhanced)]}
+
+    def post(client: str, url: str, **kwargs) -> None:
+        response = clients[client].post(url, **kwargs)
+        if response.status_code != 200:
+            raise RuntimeError(f"{client} {url} 返回{response.status_code}")
+
+    def cli() -> None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.analyze_deployment(path, form["pool1"], form["pool2"], [form["idc"]],
+                                    os.path.join(output_dir, "main.csv"))
+
+    return {
+        "query_engine": lambda: QueryEngine(path).migration(form["pool1"], form["pool2"], [form["idc"]]),
+        "main.analyze_deployment": cli,
+        "app /analyze": lambda: post("app", "/analyze", data=form),
+        "app /api/data": lambda: post("app", "/api/data", json=form),
+        "app_complete /api/migration": lambda: post("app_complete", "/api/migration", json=form),
+        "app_enhanced /api/migration": lambda: post("app_enhanced", "/api/migration", json={**form, "data_file": path}),
+    }
+
+
+def benchmark_entry_points(
+    rows: int = ENTRY_POINT_ROWS,
+    seed: int = 0,
+    repeat: int = DEFAULT_REPEAT,
+    directory: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    测量各个入口执行同一个资源腾挪分析的耗时，确认所有入口都走查询引擎的同一条路径
+
+    每次调用前清空分析结果缓存，分析都完整计算。每个入口记录请求总耗时和其中查询引擎的分析耗时，
+    fast_path表示每次调用都经过了查询引擎的索引匹配阶段。
+
+    Args:
+        rows: 合成数据的行数
+        seed: 随机种子
+        repeat: 每个入口的重复次数
+        directory: 合成数据和报告文件的目录，为空时使用临时目录
+    """
+    with tempfile.TemporaryDirectory(prefix="psm_bench_") as tmp_dir:
+        directory = directory or tmp_dir
+        df = generate_inventory(rows, seed)
+        path = os.path.abspath(default_path(rows, directory))
+        write_inventory(df, path)
+        queries = pick_queries(df)
+        del df
+
+        entry_points = _entry_points(path, queries, directory)
+        results = {}
+        for name, func in entry_points.items():
+            # 预热：加载快照、构建索引，首次请求的模板编译等
+            func()
+            runs, engine_runs, fast_path = [], [], True
+            for _ in range(max(repeat, 1)):
+                QUERY_CACHE.clear()
+                gc.collect()
+                engine_before = SPAN_LATENCY.totals((ENGINE_SPAN,))
+                matched_before = SPAN_LATENCY.totals((FAST_PATH_SPAN,))[0]
+                started = time.perf_counter()
+                func()
+                runs.append(time.perf_counter() - started)
+                engine_after = SPAN_LATENCY.totals((ENGINE_SPAN,))
+                engine_runs.append(engine_after[1] - engine_before[1])
+                fast_path = fast_path and SPAN_LATENCY.totals((FAST_PATH_SPAN,))[0] == matched_before + 1
+            results[name] = {
+                "median": round(statistics.median(runs), 6),
+                "engine_median": round(statistics.median(engine_runs), 6),
+                "fast_path": fast_path,
+            }
+        SNAPSHOT_CACHE.clear()
+
+    return {
+        "rows": rows,
+        "seed": seed,
+        "repeat": repeat,
+        "queries": queries,
+        "environment": environment(),
+        "entry_points": results,
+    }
+
+
+def format_entry_points(result: Dict[str, Any]) -> str:
+    """入口基准测试结果的文本表格（中位数，毫秒）"""
+    lines = [
+        f"{result['rows']}行（{result['queries']['idc']} {result['queries']['pool1']} -> {result['queries']['pool2']}）",
+        f"  {'入口':<30}{'总耗时(ms)':>12}{'引擎(ms)':>12}  共享路径",
+    ]
+    for name, stats in result["entry_points"].items():
+        lines.append(
+            f"  {name:<32}{stats['median'] * 1000:>12.1f}{stats['engine_median'] * 1000:>12.1f}"
+            f"  {'是' if stats['fast_path'] else '否'}"
+        )
+    return "\n".join(lines)
+
+
+def run_benchmarks(
+    scales: Sequence[int] = DEFAULT_SCALES,
+    seed: int = 0,
+    repeat: int = DEFAULT_REPEAT,
+    directory: Optional[str] = None,
+    excel: bool = False,
+    progress: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    依次在各个规模上执行测量
+
+    Args:
+        directory: 合成数据文件的目录，为空时使用临时目录并在结束后删除
+        progress: 进度输出函数
+
+    Returns:
+        可直接保存为JSON的结果
+    """
+    with tempfile.TemporaryDirectory(prefix="psm_bench_") as tmp_dir:
+        runs = []
+        for rows in scales:
+            if progress:
+                progress(f"测量{rows}行...")
+            runs.append(benchmark_scale(rows, seed, repeat, directory or tmp_dir, excel))
+            SNAPSHOT_CACHE.clear()
+    return {
+        "version": RESULT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "repeat": repeat,
+        "environment": environment(),
+        "scales": runs,
+    }
+
+
+def compare_results(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_REGRESSION_THRESHOLD
+) -> List[Dict[str, Any]]:
+    """
+    按中位数对比两份结果中规模和测量项都相同的部分
+
+    Returns:
+        每项测量一行：rows、name、baseline、current（中位数，秒）、ratio（current / baseline）
+        和regression（耗时增加超过threshold）
+    """
+    base_scales = {run["rows"]: run for run in baseline.get("scales", [])}
+    rows = []
+    for run in current.get("scales", []):
+        base = base_scales.get(run["rows"])
+        if base is None:
+            continue
+        for name, result in run["results"].items():
+            if name not in base["results"]:
+                continue
+            before = base["results"][name]["median"]
+            after = result["median"]
+            ratio = after / before if before > 0 else float("inf")
+            rows.append({
+                "rows": run["rows"],
+                "name": name,
+                "baseline": before,
+                "current": after,
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1 + threshold,
+            })
+    return rows
+
+
+def format_results(result: Dict[str, Any]) -> str:
+    """测量结果的文本表格（中位数，毫秒）"""
+    lines = []
+    for run in result["scales"]:
+        lines.append(f"{run['rows']}行（{run['queries']['idc']} {run['queries']['pool1']} -> {run['queries']['pool2']}）")
+        if "memory" in run:
+            lines.append(
+                f"  内存：原始数据{run['memory']['raw_bytes'] / 1e6:.1f} MB，"
+                f"快照{run['memory']['snapshot_bytes'] / 1e6:.1f} MB"
+            )
+        for name, stats in run["results"].items():
+            peak = f"{stats['peak_bytes'] / 1e6:>10.1f} MB" if "peak_bytes" in stats else ""
+            lines.append(f"  {name:<34}{stats['median'] * 1000:>12.1f} ms{peak}")
+    return "\n".join(lines)
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    """对比结果的文本表格"""
+    lines = [f"{'行数':>10}  {'测量项':<34}{'基准(ms)':>12}{'当前(ms)':>12}{'比值':>8}"]
+    for row in rows:
+        flag = "  回退" if row["regression"] else ""
+        lines.append(
+            f"{row['rows']:>10}  {row['name']:<34}{row['baseline'] * 1000:>12.1f}"
+            f"{row['current'] * 1000:>12.1f}{row['ratio']:>8.2f}{flag}"
+        )
+    return "\n".join(lines)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(result: Dict[str, Any], path: str) -> str:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 全量推荐缩容扫描
+一次扫描所有机房、所有资源池的推荐缩容情况，不再对每个(机房, 资源池)分别调用推荐缩容分析：
+1. 快照按(机房, 物理集群, IaaS集群)分组一次，向量化统计每个资源池的集群数、
+   符合条件的集群数和可节省的CPU总核数
+2. 统计口径与recommended_scaling_totals(机房, "物理集群/IaaS集群", min_save_cores)一致
+3. 数据量很大时可以按机房拆分到多个进程并行统计
+
+每个快照、每个min_save_cores只扫描一次；数据文件增量更新后只重新统计有变化的资源池。
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from snapshot_cache import InventorySnapshot, parse_save_cores
+from snapshot_diff import SnapshotChanges, rows_in_pools
+
+GROUP_COLUMNS = ["idc", "physical_cluster", "iaas_cluster"]
+
+FLEET_COLUMNS = ["idc", "pool", "clusters", "eligible_clusters", "total_save_cores", "max_save_cores"]
+
+
+def _save_cores(df: pd.DataFrame) -> pd.Series:
+    """每行的save_cores，缺少save_cores列时用cpu_limit - cpu_request计算"""
+    if "save_cores" in df.columns:
+        return parse_save_cores(df["save_cores"])
+    if all(col in df.columns for col in ["cpu_limit", "cpu_request"]):
+        return parse_save_cores(df["cpu_limit"] - df["cpu_request"])
+    raise ValueError("数据中没有save_cores字段，也无法从其他字段计算")
+
+
+def scan_frame(df: pd.DataFrame, min_save_cores: int = 0) -> pd.DataFrame:
+    """
+    统计一份数据中每个资源池的推荐缩容情况
+
+    Returns:
+        每个(机房, 资源池)一行，按可节省的CPU总核数降序、机房、资源池排列
+    """
+    # 与推荐缩容分析一致：无法解析的值不计入，其余按整数截断后与min_save_cores比较
+    values = _save_cores(df).to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(values)
+    cores = np.trunc(np.where(valid, values, 0)).astype(np.int64)
+    eligible = valid & (cores >= min_save_cores)
+
+    frame = df[GROUP_COLUMNS].assign(
+        clusters=1,
+        eligible_clusters=eligible.astype(np.int64),
+        total_save_cores=np.where(eligible, cores, 0),
+        max_save_cores=np.where(eligible, cores, np.nan),
+    )
+    # 机房、物理集群或IaaS集群为空的行不属于任何可查询的资源池
+    result = frame.groupby(GROUP_COLUMNS, observed=True, sort=False).agg(
+        clusters=("clusters", "sum"),
+        eligible_clusters=("eligible_clusters", "sum"),
+        total_save_cores=("total_save_cores", "sum"),
+        max_save_cores=("max_save_cores", "max"),
+    ).reset_index()
+
+    result["idc"] = result["idc"].astype(str)
+    result["pool"] = result["physical_cluster"].astype(str) + "/" + result["iaas_cluster"].astype(str)
+    # 没有符合条件集群的资源池最大值记为0
+    result["max_save_cores"] = result["max_save_cores"].fillna(0).astype(np.int64)
+    return _sort_fleet(result[FLEET_COLUMNS])
+
+
+def _sort_fleet(result: pd.DataFrame) -> pd.DataFrame:
+    """按可节省的CPU总核数降序排列，相同时按机房、资源池排列"""
+    return result.sort_values(
+        by=["total_save_cores", "idc", "pool"], ascending=[False, True, True], kind="mergesort"
+    ).reset_index(drop=True)
+
+
+def _partition_by_idc(df: pd.DataFrame, parts: int) -> List[pd.DataFrame]:
+    """按机房把数据拆分为行数大致均衡的几份，同一机房的行总在同一份中"""
+    codes, idcs = pd.factorize(df["idc"])
+    counts = np.bincount(codes[codes >= 0], minlength=len(idcs))
+    # 从大到小依次放入当前行数最少的一份
+    buckets = [[] for _ in range(parts)]
+    loads = [0] * parts
+    for idc_code in np.argsort(-counts, kind="stable").tolist():
+        target = loads.index(min(loads))
+        buckets[target].append(idc_code)
+        loads[target] += int(counts[idc_code])
+    columns = GROUP_COLUMNS + [col for col in ["save_cores", "cpu_limit", "cpu_request"] if col in df.columns]
+    return [df.loc[np.isin(codes, bucket), columns] for bucket in buckets if bucket]
+
+
+def scan_fleet(snapshot: InventorySnapshot, min_save_cores: int = 0, workers: Optional[int] = None) -> pd.DataFrame:
+    """
+    扫描快照中所有资源池的推荐缩容情况，每个快照每个min_save_cores只扫描一次（结果只读）
+
+    Args:
+        snapshot: 数据快照
+        min_save_cores: 最小建议缩容核数
+        workers: 并行的进程数，大于1时按机房拆分到进程池统计；数据量不大时单进程更快
+    """
+    def build(df: pd.DataFrame) -> pd.DataFrame:
+        if not workers or workers <= 1:
+            return scan_frame(df, min_save_cores)
+        parts = _partition_by_idc(df, workers)
+        if len(parts) <= 1:
+            return scan_frame(df, min_save_cores)
+        with ProcessPoolExecutor(max_workers=len(parts)) as executor:
+            frames = list(executor.map(scan_frame, parts, [min_save_cores] * len(parts)))
+        return _sort_fleet(pd.concat(frames, ignore_index=True))
+
+    def refresh(result: pd.DataFrame, changes: SnapshotChanges, df: pd.DataFrame) -> pd.DataFrame:
+        # 保留没有变化的资源池，只重新统计有变化的资源池
+        rescanned = scan_frame(df[rows_in_pools(df, changes.touched)], min_save_cores)
+        touched_keys = {(str(idc), f"{physical}/{iaas}") for idc, physical, iaas in changes.touched}
+        kept = ~pd.Series(list(zip(result["idc"], result["pool"]))).isin(touched_keys).to_numpy()
+        return _sort_fleet(pd.concat([result[kept], rescanned], ignore_index=True))
+
+    return snapshot.derive(f"fleet_scan:{min_save_cores}", build, refresh)
+
+
+def query_fleet(
+    snapshot: InventorySnapshot,
+    min_save_cores: int = 0,
+    idc_list: Optional[List[str]] = None,
+    top: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    查询全量推荐缩容扫描结果
+
+    Args:
+        idc_list: 只返回这些机房的资源池，为空时返回所有机房
+        top: 只返回可节省的CPU总核数最多的前top个资源池
+    """
+    result = scan_fleet(snapshot, min_save_cores, workers)
+    if idc_list:
+        result = result[result["idc"].isin(idc_list)]
+    if top:
+        result = result.head(top)
+    return result.reset_index(drop=True)
+
+
+def fleet_summary(result: pd.DataFrame) -> Dict[str, int]:
+    """扫描结果的总体统计"""
+    return {
+        "idcs": int(result["idc"].nunique()),
+        "pools": len(result),
+        "clusters": int(result["clusters"].sum()),
+        "eligible_clusters": int(result["eligible_clusters"].sum()),
+        "total_save_cores": int(result["total_save_cores"].sum()),
+    }
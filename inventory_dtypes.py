@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 库存数据的紧凑表示
+pd.read_excel读出的维度列是逐行保存的Python字符串，占用了快照的大部分内存，过滤时也要逐个比较字符串：
+1. 维度列(psm, idc, 资源池, 集群名, 部门, 机型, 包名)转为分类类型（字典编码），
+   每个不同的值只保存一次，每行只保存一个整数编码（不同值少于128个时为int8，依此类推，最多int32）
+2. 整数列的取值都在int32范围内时转为int32
+3. 浮点列（save_cores、利用率）保持float64，输出的值与原始数据完全一致
+
+转换只改变内存中的表示，不改变任何值；已经是紧凑类型的列（如从旁路文件读取的分类列）不再转换。
+紧凑类型只用于快照本身，分析结果中的DataFrame在返回前由plain_dtypes转回普通类型，
+与调用方自己构造的DataFrame拼接、合并、比较时行为不变。
+"""
+
+import numpy as np
+import pandas as pd
+
+# 转为分类类型的维度列
+DIMENSION_COLUMNS = [
+    "psm", "idc", "physical_cluster", "iaas_cluster", "cluster_name",
+    "dept_level1", "dept_level2", "host_type", "package",
+]
+
+# 取值在int32范围内时转为int32的整数列
+INTEGER_COLUMNS = ["cluster_id", "instance_num", "cpu_limit", "mem_limit"]
+
+_INT32 = np.iinfo(np.int32)
+
+
+def encode_dimensions(df: pd.DataFrame) -> pd.DataFrame:
+    """维度列转为分类类型（字典编码），原地修改并返回df"""
+    for col in DIMENSION_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def downcast_integers(df: pd.DataFrame) -> pd.DataFrame:
+    """取值在int32范围内的整数列转为int32，原地修改并返回df"""
+    for col in INTEGER_COLUMNS:
+        if col not in df.columns:
+            continue
+        dtype = df[col].dtype
+        if not isinstance(dtype, np.dtype) or dtype.kind not in "iu" or dtype.itemsize <= 4:
+            continue
+        values = df[col].to_numpy()
+        if len(values) == 0 or (values.min() >= _INT32.min and values.max() <= _INT32.max):
+            df[col] = values.astype(np.int32)
+    return df
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """把库存数据转为紧凑表示（维度列字典编码、整数列int32），原地修改并返回df"""
+    return downcast_integers(encode_dimensions(df))
+
+
+def plain_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    把紧凑表示转回普通类型，返回新的DataFrame（没有需要转换的列时返回df本身）：
+    分类列转为类别值本身的类型（整数类别含空值时为float64），int32等窄整数列转为int64
+    """
+    conversions = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            target = dtype.categories.dtype
+            if target.kind in "iub" and df[col].isna().any():
+                target = np.dtype(np.float64) if target.kind in "iu" else np.dtype(object)
+            conversions[col] = target
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iu" and dtype.itemsize < 8:
+            conversions[col] = np.dtype(np.int64)
+    return df.astype(conversions) if conversions else df
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    """DataFrame占用的内存（字节），包括字符串等对象本身"""
+    return int(df.memory_usage(deep=True).sum())
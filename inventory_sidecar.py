@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 库存数据列式旁路文件
+把all.xlsx一次性转换为带类型的Feather(Arrow IPC)文件，后续加载时优先读取：
+1. 维度列(psm、idc、资源池、集群名、部门、机型、包名)存为分类类型（Arrow字典编码）
+2. 数值列(instance_num, cpu_limit, mem_limit, save_cores)存为数值类型，整数列取值在int32范围内时存为int32
+3. 文件不压缩、只有一个记录批次，浮点列的NaN按值保存而不是记为空值，
+   内存映射加载时数值列和分类编码直接引用映射的页面（零拷贝），
+   多个进程读取同一文件时共享同一份页缓存，不再各自复制一份到堆上
+
+旁路文件与Excel放在同一目录，文件名为<Excel文件名>.feather，
+只有当旁路文件比Excel新时才会被使用。
+"""
+
+import os
+from typing import Optional
+
+import pandas as pd
+
+from inventory_dtypes import DIMENSION_COLUMNS, downcast_integers
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pragma: no cover - pyarrow为可选依赖
+    pa = None
+    feather = None
+
+
+SIDECAR_SUFFIX = ".feather"
+
+# 存为分类类型的列
+CATEGORICAL_COLUMNS = DIMENSION_COLUMNS
+
+# 存为数值类型的列
+NUMERIC_COLUMNS = ["instance_num", "cpu_limit", "mem_limit", "save_cores"]
+
+
+def sidecar_available() -> bool:
+    """是否安装了读写旁路文件所需的pyarrow"""
+    return feather is not None
+
+
+def sidecar_path(xlsx_path: str) -> str:
+    """返回Excel文件对应的旁路文件路径"""
+    base, _ = os.path.splitext(xlsx_path)
+    return base + SIDECAR_SUFFIX
+
+
+def find_fresh_sidecar(xlsx_path: str) -> Optional[str]:
+    """如果存在比Excel更新的旁路文件则返回其路径，否则返回None"""
+    if not sidecar_available():
+        return None
+    path = sidecar_path(xlsx_path)
+    try:
+        sidecar_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    try:
+        xlsx_mtime = os.stat(xlsx_path).st_mtime_ns
+    except OSError:
+        # Excel已被移走时，只要旁路文件存在就使用
+        return path
+    return path if sidecar_mtime >= xlsx_mtime else None
+
+
+def _stringify_mixed(series: pd.Series) -> pd.Series:
+    """把混合类型的object列中的非空值统一转换为字符串，便于写入Arrow"""
+    if series.dtype != object:
+        return series
+    if not pd.api.types.infer_dtype(series, skipna=True).startswith("mixed"):
+        return series
+    return series.where(series.isna(), series.astype(str))
+
+
+def to_sidecar_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """把原始Excel数据转换为旁路文件使用的类型"""
+    df = df.copy()
+    for col in df.columns:
+        df[col] = _stringify_mixed(df[col])
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col].astype(str).str.strip(), errors="coerce")
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+
+    return downcast_integers(df).reset_index(drop=True)
+
+
+def ingest(xlsx_path: str, output_path: Optional[str] = None) -> str:
+    """
+    把Excel库存数据转换为旁路文件
+
+    Args:
+        xlsx_path: Excel数据文件路径
+        output_path: 旁路文件路径，默认与Excel同目录
+
+    Returns:
+        旁路文件路径
+    """
+    if not sidecar_available():
+        raise Exception("生成旁路文件需要安装pyarrow: pip install pyarrow")
+
+    return write_sidecar(pd.read_excel(xlsx_path), output_path or sidecar_path(xlsx_path))
+
+
+def write_sidecar(df: pd.DataFrame, output_path: str) -> str:
+    """把原始数据转换类型后写入旁路文件，返回旁路文件路径"""
+    if not sidecar_available():
+        raise Exception("生成旁路文件需要安装pyarrow: pip install pyarrow")
+
+    frame = to_sidecar_frame(df)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # 浮点列按值保存NaN（Table.from_pandas会把NaN记为空值，读取时只能复制后再填回NaN）
+    for i, name in enumerate(table.column_names):
+        if frame[name].dtype.kind == "f":
+            table = table.set_column(i, name, pa.array(frame[name].to_numpy()))
+
+    # 先写临时文件再替换，避免其他进程读到写了一半的文件；
+    # 整个文件写成一个记录批次，读取时每列是连续的缓冲区，可以零拷贝
+    tmp_path = f"{output_path}.tmp.{os.getpid()}"
+    feather.write_feather(table, tmp_path, compression="uncompressed", chunksize=max(len(frame), 1))
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def read_sidecar(path: str, memory_map: bool = True) -> pd.DataFrame:
+    """
+    读取旁路文件
+
+    Args:
+        path: 旁路文件路径
+        memory_map: 是否内存映射文件；映射时数值列和分类编码直接引用映射的页面（只读），
+            多个进程读取同一文件时共享页缓存
+    """
+    if not sidecar_available():
+        raise Exception("读取旁路文件需要安装pyarrow: pip install pyarrow")
+    table = feather.read_table(path, memory_map=memory_map)
+    columns = {name: _column_to_pandas(table.column(name)) for name in table.column_names}
+    return pd.DataFrame(columns, index=pd.RangeIndex(table.num_rows), copy=False)
+
+
+def _column_to_pandas(column: "pa.ChunkedArray"):
+    """
+    把Arrow列转换为pandas列，能零拷贝时直接引用Arrow缓冲区：
+    没有空值的数值列转为只读的NumPy视图，分类列的编码没有空值时同样直接引用；
+    多个记录批次（旧版旁路文件）或含空值的列退回到复制转换
+    """
+    if column.num_chunks != 1:
+        return column.to_pandas()
+    array = column.chunk(0)
+    if pa.types.is_dictionary(array.type):
+        if array.null_count:
+            codes = array.indices.fill_null(-1).to_numpy()
+        else:
+            codes = array.indices.to_numpy(zero_copy_only=True)
+        categories = pd.Index(array.dictionary.to_pandas())
+        return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories), validate=False)
+    if array.null_count == 0 and (pa.types.is_integer(array.type) or pa.types.is_floating(array.type)):
+        return array.to_numpy(zero_copy_only=True)
+    return column.to_pandas()
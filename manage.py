@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 命令行管理工具
+用法:
+    python manage.py ingest all.xlsx        把Excel转换为列式旁路文件
+    python manage.py fleet all.xlsx         扫描所有机房、所有资源池的推荐缩容情况
+    python manage.py serve --workers 4      以多进程方式启动Web服务
+    python manage.py generate --rows 100000 生成合成库存数据
+    python manage.py bench -o bench.json    在合成数据上执行基准测试
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from fleet_scan import fleet_summary
+from inventory_sidecar import ingest
+from query_engine import QueryEngine, parse_idc_list
+from report_export import write_xlsx
+
+
+def cmd_ingest(args: argparse.Namespace) -> int:
+    """把Excel库存数据转换为列式旁路文件"""
+    output_path = ingest(args.file, args.output)
+    print(f"旁路文件已生成: {output_path}")
+    return 0
+
+
+def cmd_fleet(args: argparse.Namespace) -> int:
+    """扫描所有机房、所有资源池的推荐缩容情况"""
+    idc_list = parse_idc_list(args.idc)
+    result = QueryEngine(args.file).fleet(args.min_save_cores, idc_list, args.top, args.workers)
+    if args.output:
+        if args.output.endswith(".xlsx"):
+            write_xlsx(args.output, [("推荐缩容汇总", result)])
+        else:
+            result.to_csv(args.output, index=False)
+        print(f"扫描结果已保存到: {args.output}")
+    else:
+        print(result.to_string(index=False))
+    summary = fleet_summary(result)
+    print(
+        f"共{summary['idcs']}个机房、{summary['pools']}个资源池，"
+        f"符合条件的集群{summary['eligible_clusters']}个，可节省CPU {summary['total_save_cores']}核"
+    )
+    return 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    """以多进程方式启动Web服务，数据快照在父进程中加载一次，所有工作进程共享"""
+    from app_enhanced import app
+    from prefork_server import serve
+
+    data_files = args.data or [os.path.join(os.path.dirname(os.path.abspath(__file__)), "all.xlsx")]
+    serve(
+        app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        data_files=[path for path in data_files if os.path.exists(path)],
+        threaded=not args.no_threads,
+        reload_interval=args.reload_interval,
+        build_sidecar=not args.no_sidecar,
+    )
+    return 0
+
+
+def cmd_generate(args: argparse.Namespace) -> int:
+    """生成合成库存数据"""
+    from synthetic_inventory import default_path, generate_inventory, write_inventory
+
+    df = generate_inventory(args.rows, args.seed)
+    for path in write_inventory(df, args.output or default_path(args.rows), excel=args.excel):
+        print(f"已生成: {path}")
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    """在合成数据上执行基准测试，可与之前保存的结果对比"""
+    import benchmark
+
+    if args.entry_points:
+        rows = int(args.rows.split(",")[0]) if args.rows else benchmark.ENTRY_POINT_ROWS
+        result = benchmark.benchmark_entry_points(rows, args.seed, args.repeat, args.data_dir)
+        if args.output:
+            print(f"结果已保存到: {benchmark.save_results(result, args.output)}")
+        print(benchmark.format_entry_points(result))
+        return 0 if all(stats["fast_path"] for stats in result["entry_points"].values()) else 1
+
+    scales = [int(item) for item in args.rows.split(",") if item.strip()] if args.rows else benchmark.DEFAULT_SCALES
+    result = benchmark.run_benchmarks(scales, args.seed, args.repeat, args.data_dir, args.excel, progress=print)
+    if args.output:
+        print(f"结果已保存到: {benchmark.save_results(result, args.output)}")
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(benchmark.format_results(result))
+
+    if args.compare:
+        comparison = benchmark.compare_results(benchmark.load_results(args.compare), result, args.threshold)
+        print(benchmark.format_comparison(comparison))
+        regressions = [row for row in comparison if row["regression"]]
+        if regressions:
+            print(f"{len(regressions)}项测量耗时增加超过{args.threshold:.0%}")
+            return 2
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(description="PSM资源管理系统 - 命令行管理工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="把Excel转换为列式旁路文件")
+    ingest_parser.add_argument("file", nargs="?", default="all.xlsx", help="Excel数据文件路径")
+    ingest_parser.add_argument("-o", "--output", help="旁路文件路径，默认与Excel同目录")
+    ingest_parser.set_defaults(func=cmd_ingest)
+
+    fleet_parser = subparsers.add_parser("fleet", help="扫描所有机房、所有资源池的推荐缩容情况")
+    fleet_parser.add_argument("file", nargs="?", default="all.xlsx", help="Excel数据文件路径")
+    fleet_parser.add_argument("--min-save-cores", type=int, default=0, help="最小建议缩容核数")
+    fleet_parser.add_argument("--idc", help="只扫描这些机房（逗号分隔）")
+    fleet_parser.add_argument("--top", type=int, help="只输出可节省CPU最多的前N个资源池")
+    fleet_parser.add_argument("--workers", type=int, help="并行的进程数，数据量很大时使用")
+    fleet_parser.add_argument("-o", "--output", help="保存为csv或xlsx文件，默认输出到终端")
+    fleet_parser.set_defaults(func=cmd_fleet)
+
+    serve_parser = subparsers.add_parser("serve", help="以多进程方式启动Web服务")
+    serve_parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    serve_parser.add_argument("--port", type=int, default=8888, help="监听端口")
+    serve_parser.add_argument("--workers", type=int, help="工作进程数，默认为CPU核数")
+    serve_parser.add_argument("--data", action="append", help="预先加载的数据文件，可指定多次，默认为all.xlsx")
+    serve_parser.add_argument("--reload-interval", type=float, default=10.0, help="检查数据文件变化的间隔（秒），0表示不检查")
+    serve_parser.add_argument("--no-threads", action="store_true", help="工作进程内单线程处理请求")
+    serve_parser.add_argument("--no-sidecar", action="store_true", help="启动时不自动生成旁路文件")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    generate_parser = subparsers.add_parser("generate", help="生成合成库存数据")
+    generate_parser.add_argument("--rows", type=int, default=100_000, help="行数")
+    generate_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    generate_parser.add_argument("--excel", action="store_true", help="同时写出完整的Excel（不超过1048575行）")
+    generate_parser.add_argument("-o", "--output", help="Excel文件路径，旁路文件写在同一目录，默认为synthetic_<行数>.xlsx")
+    generate_parser.set_defaults(func=cmd_generate)
+
+    bench_parser = subparsers.add_parser("bench", help="在合成数据上执行基准测试")
+    bench_parser.add_argument("--rows", help="测量的规模（逗号分隔的行数），默认为10000,100000,1000000")
+    bench_parser.add_argument("--repeat", type=int, default=5, help="每项测量的重复次数")
+    bench_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    bench_parser.add_argument("--excel", action="store_true", help="同时测量Excel的加载耗时（只在不超过20万行时测量）")
+    bench_parser.add_argument("--data-dir", help="合成数据文件的目录，默认使用临时目录")
+    bench_parser.add_argument("-o", "--output", help="把结果保存为JSON文件，默认输出到终端")
+    bench_parser.add_argument("--compare", help="与之前保存的JSON结果对比，有性能回退时退出码为2")
+    bench_parser.add_argument("--threshold", type=float, default=0.1, help="对比时判定为回退的耗时增加比例")
+    bench_parser.add_argument(
+        "--entry-points", action="store_true",
+        help="测量命令行和各个Web应用执行资源腾挪分析的耗时（默认10万行），确认都走查询引擎"
+    )
+    bench_parser.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """主函数"""
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"执行失败: {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
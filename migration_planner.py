@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 资源腾挪规划
+在源资源池中选出一组集群迁移到目标资源池，使源资源池释放的CPU/内存达到目标值：
+1. 每个候选集群只能迁移到一个目标资源池，且该PSM必须已部署在目标资源池
+2. 迁移到每个目标资源池的CPU/内存之和不能超过该资源池的剩余容量(headroom)
+3. 在满足目标的前提下，尽量减少迁移的实例数（影响面），其次尽量减少超出目标的量
+
+这是一个多维覆盖型背包问题，使用贪心求解：按多种排序各贪心一遍并删除多余的迁移，
+在时间预算内再做随机扰动的多轮贪心，取最好的方案。几万个候选集群在一秒内完成。
+"""
+
+import time
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# 默认时间预算（秒）
+DEFAULT_TIME_BUDGET = 0.5
+
+# 随机扰动贪心的最大轮数
+MAX_RANDOM_PASSES = 32
+
+# API允许的最大时间预算（秒）
+MAX_TIME_BUDGET = 5.0
+
+# 判断是否达成目标时允许的浮点误差
+TOLERANCE = 1e-6
+
+
+def _greedy_pass(
+    order: np.ndarray,
+    cpu: List[float],
+    mem: List[float],
+    allowed: List[List[int]],
+    headroom_cpu: List[float],
+    headroom_mem: List[float],
+    cpu_target: float,
+    mem_target: float,
+) -> np.ndarray:
+    """
+    按order的顺序贪心选择迁移，目标达成后按相反顺序删除多余的迁移
+    逐个候选判断的循环使用Python标量，避免对很小的数组反复调用numpy的开销
+
+    Returns:
+        每个候选集群迁移到的目标资源池下标，不迁移为-1
+    """
+    assignment = np.full(len(cpu), -1, dtype=np.int64)
+    remaining_cpu = list(headroom_cpu)
+    remaining_mem = list(headroom_mem)
+    need_cpu, need_mem = cpu_target - TOLERANCE, mem_target - TOLERANCE
+    accepted = []
+
+    for i in order.tolist():
+        if need_cpu <= 0 and need_mem <= 0:
+            break
+        c, m = cpu[i], mem[i]
+        if not ((need_cpu > 0 and c > 0) or (need_mem > 0 and m > 0)):
+            continue
+        # 放到剩余CPU容量最多、且放得下的目标资源池，尽量保留其他资源池的容量
+        target, best = -1, -1.0
+        for t in allowed[i]:
+            if remaining_cpu[t] >= c and remaining_mem[t] >= m and remaining_cpu[t] > best:
+                target, best = t, remaining_cpu[t]
+        if target < 0:
+            continue
+        assignment[i] = target
+        remaining_cpu[target] -= c
+        remaining_mem[target] -= m
+        need_cpu -= c
+        need_mem -= m
+        accepted.append(i)
+
+    # 目标已达成时，删除去掉后仍能达成目标的迁移（从贪心顺序靠后的开始）
+    if need_cpu <= 0 and need_mem <= 0:
+        for i in reversed(accepted):
+            if need_cpu + cpu[i] <= 0 and need_mem + mem[i] <= 0:
+                assignment[i] = -1
+                need_cpu += cpu[i]
+                need_mem += mem[i]
+    return assignment
+
+
+def _plan_key(
+    assignment: np.ndarray,
+    cpu: np.ndarray,
+    mem: np.ndarray,
+    instances: np.ndarray,
+    cpu_target: float,
+    mem_target: float,
+) -> tuple:
+    """方案的比较键，越小越好：先比是否达成目标，未达成时比完成比例，再比迁移实例数和超出量"""
+    moved = assignment >= 0
+    achieved_cpu = float(cpu[moved].sum())
+    achieved_mem = float(mem[moved].sum())
+    met = achieved_cpu >= cpu_target - TOLERANCE and achieved_mem >= mem_target - TOLERANCE
+    coverage = 0.0
+    if cpu_target > 0:
+        coverage += min(achieved_cpu / cpu_target, 1.0)
+    if mem_target > 0:
+        coverage += min(achieved_mem / mem_target, 1.0)
+    overshoot = 0.0
+    if cpu_target > 0:
+        overshoot += (achieved_cpu - cpu_target) / cpu_target
+    if mem_target > 0:
+        overshoot += (achieved_mem - mem_target) / mem_target
+    return (not met, -coverage, int(instances[moved].sum()), overshoot, int(moved.sum()))
+
+
+def solve_migration_plan(
+    cpu: np.ndarray,
+    mem: np.ndarray,
+    instances: np.ndarray,
+    allowed: Sequence[np.ndarray],
+    headroom_cpu: np.ndarray,
+    headroom_mem: np.ndarray,
+    cpu_target: float = 0,
+    mem_target: float = 0,
+    time_budget: float = DEFAULT_TIME_BUDGET,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    求解资源腾挪方案
+
+    Args:
+        cpu / mem / instances: 每个候选集群的CPU、内存和实例数
+        allowed: 每个候选集群可以迁移到的目标资源池下标
+        headroom_cpu / headroom_mem: 每个目标资源池的剩余CPU、内存容量（np.inf表示不限）
+        cpu_target / mem_target: 需要释放的CPU、内存，为0表示不要求
+        time_budget: 时间预算（秒），至少会完成按性价比排序的一轮贪心
+        seed: 随机扰动的种子，相同输入和种子得到相同方案
+
+    Returns:
+        assignment（每个候选集群迁移到的目标资源池下标，不迁移为-1）以及求解过程的统计
+    """
+    start = time.perf_counter()
+    cpu = np.asarray(cpu, dtype=float)
+    mem = np.asarray(mem, dtype=float)
+    instances = np.asarray(instances, dtype=np.int64)
+    allowed = [np.asarray(a, dtype=np.int64) for a in allowed]
+    cpu_target = max(float(cpu_target or 0), 0.0)
+    mem_target = max(float(mem_target or 0), 0.0)
+
+    # 单位实例数能释放的资源（按目标归一化），作为贪心的性价比
+    gain = np.zeros(len(cpu))
+    if cpu_target > 0:
+        gain += cpu / cpu_target
+    if mem_target > 0:
+        gain += mem / mem_target
+    density = gain / np.maximum(instances, 1)
+
+    # 确定性的几种排序：性价比、CPU、内存、资源总量，相同时保持候选顺序
+    strategies = [("density", np.argsort(-density, kind="stable"))]
+    if cpu_target > 0:
+        strategies.append(("cpu", np.argsort(-cpu, kind="stable")))
+    if mem_target > 0:
+        strategies.append(("mem", np.argsort(-mem, kind="stable")))
+    strategies.append(("gain", np.argsort(-gain, kind="stable")))
+
+    cpu_list, mem_list = cpu.tolist(), mem.tolist()
+    allowed_list = [a.tolist() for a in allowed]
+    headroom_cpu_list = np.asarray(headroom_cpu, dtype=float).tolist()
+    headroom_mem_list = np.asarray(headroom_mem, dtype=float).tolist()
+
+    def solve(order):
+        return _greedy_pass(
+            order, cpu_list, mem_list, allowed_list, headroom_cpu_list, headroom_mem_list, cpu_target, mem_target
+        )
+
+    best, best_key, best_strategy = None, None, None
+    passes = 0
+    timed_out = False
+    for name, order in strategies:
+        # 第一种排序总会执行，其余的在时间预算内执行
+        if passes and time.perf_counter() - start >= time_budget:
+            timed_out = True
+            break
+        assignment = solve(order)
+        key = _plan_key(assignment, cpu, mem, instances, cpu_target, mem_target)
+        passes += 1
+        if best_key is None or key < best_key:
+            best, best_key, best_strategy = assignment, key, name
+
+    # 在剩余的时间预算内，对性价比加随机扰动后再贪心
+    rng = np.random.default_rng(seed)
+    for _ in range(0 if timed_out else MAX_RANDOM_PASSES):
+        if time.perf_counter() - start >= time_budget:
+            timed_out = True
+            break
+        noise = rng.lognormal(0.0, 0.3, len(density))
+        assignment = solve(np.argsort(-density * noise, kind="stable"))
+        key = _plan_key(assignment, cpu, mem, instances, cpu_target, mem_target)
+        passes += 1
+        if key < best_key:
+            best, best_key, best_strategy = assignment, key, "randomized"
+
+    return {
+        "assignment": best,
+        "met": not best_key[0],
+        "strategy": best_strategy,
+        "passes": passes,
+        "timed_out": timed_out,
+        "elapsed_seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def parse_headroom(headroom: Any) -> Dict[str, Dict[str, float]]:
+    """
+    规整目标资源池的剩余容量
+
+    支持 {资源池: {"cpu": 核数, "mem": 内存}}、{资源池: 核数}、资源池列表（不限容量）
+    或逗号分隔的资源池字符串；缺少的维度视为不限
+    """
+    if isinstance(headroom, str):
+        headroom = [p.strip() for p in headroom.split(",") if p.strip()]
+    if isinstance(headroom, (list, tuple)):
+        headroom = {pool: {} for pool in headroom}
+    result = {}
+    for pool, value in (headroom or {}).items():
+        if isinstance(value, dict):
+            cpu = value.get("cpu", value.get("cpu_limit"))
+            mem = value.get("mem", value.get("mem_limit"))
+        else:
+            cpu, mem = value, None
+        result[str(pool).strip()] = {
+            "cpu": float(cpu) if cpu is not None else float("inf"),
+            "mem": float(mem) if mem is not None else float("inf"),
+        }
+    return result
+
+
+def headroom_key(headroom: Dict[str, Dict[str, float]]) -> tuple:
+    """剩余容量规整为缓存键"""
+    return tuple(sorted((pool, value["cpu"], value["mem"]) for pool, value in headroom.items()))
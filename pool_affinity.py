@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 资源池亲和矩阵
+对每个机房预先计算所有资源池两两之间的亲和关系，回答"对每个源资源池，
+哪些目标资源池共享的PSM最多、能腾挪多少资源"，不再逐对调用资源腾挪分析。
+
+每一对(源资源池, 目标资源池)包含：
+1. 共同PSM数（同时部署在两个资源池的default集群的PSM）
+2. 这些PSM在源资源池、目标资源池中的instance_num、cpu_limit、mem_limit之和
+
+与analyze_resource_migration(源资源池, 目标资源池, [机房])的统计口径一致。
+矩阵在PSM×资源池索引上用稀疏矩阵乘法得到，每个快照每个机房只计算一次；
+数据文件增量更新后，没有变化的机房直接沿用上一份快照的结果。
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from psm_index import PoolMembershipIndex
+from snapshot_cache import InventorySnapshot
+from snapshot_diff import SnapshotChanges
+
+VALUE_COLUMNS = ["instance_num", "cpu_limit", "mem_limit"]
+
+# Excel单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+AFFINITY_COLUMNS = (
+    ["idc", "source_pool", "target_pool", "shared_psm_count"]
+    + [f"source_{col}" for col in VALUE_COLUMNS]
+    + [f"target_{col}" for col in VALUE_COLUMNS]
+)
+
+
+def build_affinity(index: PoolMembershipIndex, df: pd.DataFrame, idc: Optional[str]) -> pd.DataFrame:
+    """
+    计算一个机房的资源池亲和表，每行是一对不同的资源池，只包含有共同PSM的资源池对
+
+    结果按源资源池、共同PSM数降序、源资源池一侧CPU降序、目标资源池排列
+    """
+    weights = {
+        col: pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy(dtype=float)
+        for col in VALUE_COLUMNS
+    }
+    shared, sides = index.pool_affinity(idc, weights)
+
+    # 只保留不同资源池之间的关系
+    off_diagonal = shared.row != shared.col
+    source, target = shared.row[off_diagonal], shared.col[off_diagonal]
+    pool_keys = np.asarray(index.pool_keys, dtype=object)
+
+    result = pd.DataFrame({
+        "idc": idc,
+        "source_pool": pool_keys[source],
+        "target_pool": pool_keys[target],
+        "shared_psm_count": shared.data[off_diagonal].astype(int),
+    })
+    # 源资源池一侧取W^T·B的(源, 目标)，目标资源池一侧取其转置即(目标, 源)
+    for col in VALUE_COLUMNS:
+        # 资源池×资源池矩阵规模很小（几百个资源池也只有几十万个单元），转为稠密数组后按下标取值
+        side = sides[col].toarray()
+        result[f"source_{col}"] = side[source, target]
+        result[f"target_{col}"] = side[target, source]
+    result["source_instance_num"] = result["source_instance_num"].astype(int)
+    result["target_instance_num"] = result["target_instance_num"].astype(int)
+
+    return result.sort_values(
+        by=["source_pool", "shared_psm_count", "source_cpu_limit", "target_pool"],
+        ascending=[True, False, False, True],
+        kind="mergesort",
+    ).reset_index(drop=True)[AFFINITY_COLUMNS]
+
+
+def get_pool_affinity(snapshot: InventorySnapshot, idc: Optional[str]) -> pd.DataFrame:
+    """获取快照中一个机房的资源池亲和表，每个快照每个机房只计算一次（结果只读）"""
+    index = snapshot.derive("pool_index", PoolMembershipIndex.build)
+
+    def refresh(affinity: pd.DataFrame, changes: SnapshotChanges, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        # 亲和表只取决于本机房的行，本机房没有变化时沿用
+        return None if idc in changes.touched_idcs else affinity
+
+    return snapshot.derive(f"pool_affinity:{idc}", lambda df: build_affinity(index, df, idc), refresh)
+
+
+def query_pool_affinity(
+    snapshot: InventorySnapshot,
+    idc_list: Optional[List[str]] = None,
+    source_pool: Optional[str] = None,
+    top: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    查询资源池亲和表
+
+    Args:
+        snapshot: 数据快照
+        idc_list: 机房列表，为空时返回所有机房
+        source_pool: 只返回该源资源池的行
+        top: 每个机房、每个源资源池只保留共同PSM最多的前top个目标资源池
+    """
+    index = snapshot.derive("pool_index", PoolMembershipIndex.build)
+    idcs = [idc for idc in index.idc_values if idc is not None]
+    if idc_list:
+        idcs = [idc for idc in idcs if idc in set(idc_list)]
+
+    frames = [get_pool_affinity(snapshot, idc) for idc in idcs]
+    if not frames:
+        return pd.DataFrame(columns=AFFINITY_COLUMNS)
+    result = pd.concat(frames, ignore_index=True)
+    if source_pool:
+        result = result[result["source_pool"] == source_pool]
+    if top:
+        result = result.groupby(["idc", "source_pool"], sort=False).head(top)
+    return result.reset_index(drop=True)
+
+
+def affinity_sheets(affinity: pd.DataFrame) -> List[Tuple[str, pd.DataFrame]]:
+    """按机房拆分为Excel工作表，单个机房超过Excel行数上限时报错"""
+    sheets = []
+    for idc, frame in affinity.groupby("idc", sort=True):
+        if len(frame) >= EXCEL_MAX_ROWS:
+            raise ValueError(f"机房{idc}的资源池对数量超过Excel行数上限，请使用csv格式导出或设置top")
+        sheets.append((f"亲和矩阵_{idc}"[:31], frame.reset_index(drop=True)))
+    return sheets or [("亲和矩阵", affinity)]
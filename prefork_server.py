@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 多进程服务
+Flask开发服务器只有一个进程，CPU密集的分析无法利用多核。这里提供一个pre-fork的WSGI服务：
+1. 父进程先加载数据快照并构建索引，再fork出多个工作进程共用同一个监听端口
+2. 快照的数据都在NumPy/Arrow缓冲区中，工作进程通过写时复制共享父进程的内存，
+   增加工作进程时常驻内存基本不变（只增加每个进程自己的解释器和查询临时内存）；
+   从旁路文件加载的列直接引用内存映射的页面，这部分本身就是进程间共享的页缓存
+3. 父进程定期检查数据文件，文件变化后重新加载快照，再逐个替换工作进程
+4. 工作进程异常退出时自动重新拉起
+
+为了让快照全部落在NumPy/Arrow缓冲区中，启动时会为缺少或过期旁路文件的Excel生成旁路文件。
+仅支持提供fork的平台（Linux/macOS）。
+"""
+
+import gc
+import os
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from werkzeug.serving import make_server
+
+from inventory_sidecar import find_fresh_sidecar, ingest, sidecar_available
+from psm_index import PoolMembershipIndex
+from snapshot_cache import file_signature, get_snapshot
+
+# 检查数据文件是否变化的间隔（秒）
+DEFAULT_RELOAD_INTERVAL = 10.0
+
+# 停止工作进程时等待其退出的最长秒数
+WORKER_STOP_TIMEOUT = 10.0
+
+
+def preload_snapshot(file_path: str, build_sidecar: bool = True) -> None:
+    """
+    在父进程中加载数据快照并构建索引，之后fork的工作进程直接共享
+
+    Args:
+        file_path: 数据文件路径
+        build_sidecar: 缺少或过期旁路文件时是否先生成旁路文件
+    """
+    if build_sidecar and sidecar_available() and file_path.endswith(".xlsx") and not find_fresh_sidecar(file_path):
+        print(f"生成旁路文件: {ingest(file_path)}")
+    snapshot = get_snapshot(file_path)
+    snapshot.derive("pool_index", PoolMembershipIndex.build)
+    print(f"已加载数据快照: {snapshot.file_path}（{len(snapshot.df)}行，版本{snapshot.version}）")
+
+
+class PreforkServer:
+    """
+    pre-fork的WSGI服务：父进程持有监听端口和数据快照，工作进程处理请求
+
+    Args:
+        app: WSGI应用
+        host / port: 监听地址
+        workers: 工作进程数，默认为CPU核数
+        data_files: 启动时预先加载、并监视变化的数据文件
+        threaded: 工作进程内是否用多线程处理请求
+        reload_interval: 检查数据文件是否变化的间隔（秒），0表示不检查
+    """
+
+    def __init__(
+        self,
+        app,
+        host: str = "0.0.0.0",
+        port: int = 8888,
+        workers: Optional[int] = None,
+        data_files: Iterable[str] = (),
+        threaded: bool = True,
+        reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+        build_sidecar: bool = True,
+    ):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(int(workers or os.cpu_count() or 1), 1)
+        self.data_files = [os.path.abspath(path) for path in data_files]
+        self.threaded = threaded
+        self.reload_interval = reload_interval
+        self.build_sidecar = build_sidecar
+        self._socket: Optional[socket.socket] = None
+        self._children: Dict[int, int] = {}  # pid -> 代数
+        self._generation = 0
+        self._signatures: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._stopping = False
+
+    # ---- 父进程 ----
+
+    def _load(self) -> bool:
+        """
+        加载所有数据文件的快照，并冻结当前对象避免垃圾回收触发写时复制
+
+        Returns:
+            是否全部加载成功（文件正在写入等原因加载失败时，下次检查会重试）
+        """
+        loaded = True
+        for path in self.data_files:
+            try:
+                preload_snapshot(path, self.build_sidecar)
+                self._signatures[path] = file_signature(path)
+            except Exception as e:
+                print(f"预加载数据文件失败 {path}: {e}")
+                self._signatures[path] = None
+                loaded = False
+        gc.collect()
+        gc.freeze()
+        return loaded
+
+    def _changed_files(self) -> List[str]:
+        """返回自上次加载后发生变化的数据文件"""
+        changed = []
+        for path in self.data_files:
+            try:
+                signature = file_signature(path)
+            except OSError:
+                continue
+            if signature != self._signatures.get(path):
+                changed.append(path)
+        return changed
+
+    def _spawn(self) -> int:
+        """fork一个工作进程"""
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException as e:  # 工作进程中的任何异常都不能回到父进程的循环
+                print(f"工作进程{os.getpid()}异常退出: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = self._generation
+        return pid
+
+    def _stop_workers(self, pids: Iterable[int]) -> None:
+        """通知工作进程退出并等待，超时后强制结束"""
+        pids = [pid for pid in pids if pid in self._children]
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        for pid in pids:
+            while True:
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    break
+                if done:
+                    break
+                if time.monotonic() >= deadline:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                    break
+                time.sleep(0.05)
+            self._children.pop(pid, None)
+
+    def _reload(self, changed: List[str]) -> None:
+        """数据文件变化后重新加载快照，然后逐个用新的工作进程替换旧的工作进程"""
+        print(f"数据文件已变化，重新加载: {', '.join(changed)}")
+        gc.unfreeze()
+        if not self._load():
+            return
+        self._generation += 1
+        for pid in [pid for pid, generation in self._children.items() if generation < self._generation]:
+            self._spawn()
+            self._stop_workers([pid])
+
+    def _handle_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+    def serve_forever(self) -> None:
+        """启动服务，直到收到SIGINT/SIGTERM"""
+        self._socket = socket.create_server((self.host, self.port), backlog=128)
+        self._load()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        for _ in range(self.workers):
+            self._spawn()
+        print(f"服务已启动: http://{self.host}:{self.port}，{self.workers}个工作进程（父进程{os.getpid()}）")
+
+        last_check = time.monotonic()
+        try:
+            while not self._stopping:
+                # 回收退出的工作进程并重新拉起
+                try:
+                    pid, _ = os.waitpid(-1, os.WNOHANG)
+                except ChildProcessError:
+                    pid = 0
+                if pid and self._children.pop(pid, None) is not None and not self._stopping:
+                    print(f"工作进程{pid}已退出，重新拉起")
+                    self._spawn()
+
+                if self.reload_interval and time.monotonic() - last_check >= self.reload_interval:
+                    last_check = time.monotonic()
+                    changed = self._changed_files()
+                    if changed:
+                        self._reload(changed)
+                time.sleep(0.2)
+        finally:
+            self._stop_workers(list(self._children))
+            self._socket.close()
+            print("服务已停止")
+
+    # ---- 工作进程 ----
+
+    def _run_worker(self) -> None:
+        """工作进程：在继承的监听端口上处理请求，收到SIGTERM后处理完当前请求再退出"""
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        server = make_server(
+            self.host, self.port, self.app, threaded=self.threaded, fd=self._socket.fileno()
+        )
+
+        def stop(signum, frame):
+            # shutdown会等待serve_forever退出，不能在运行serve_forever的线程中直接调用
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+        server.server_close()
+
+
+def serve(
+    app,
+    host: str = "0.0.0.0",
+    port: int = 8888,
+    workers: Optional[int] = None,
+    data_files: Iterable[str] = (),
+    threaded: bool = True,
+    reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+    build_sidecar: bool = True,
+) -> None:
+    """以多进程方式启动WSGI应用"""
+    PreforkServer(app, host, port, workers, data_files, threaded, reload_interval, build_sidecar).serve_forever()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - PSM×资源池成员索引
+基于快照中的default集群，按机房(idc)分区构建PSM×资源池的稀疏关联矩阵(CSR)，
+每个快照只构建一次，之后"哪些PSM在资源池X"、"PSM Y分布在哪些资源池"
+这类查询都直接在索引上求交集/并集，不再扫描整张表。
+
+资源池用'physical_cluster/iaas_cluster'字符串标识，与find_psm_in_both_pools中的pool_key一致；
+索引内部和encode_pools()把资源池编码为整数，分类类型的列上直接由两列的编码组合，不逐行拼接字符串。
+返回的行位置(positions)是快照DataFrame中的位置下标，可直接用于df.iloc。
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+Pool = Union[str, Tuple[str, str]]
+
+
+def pool_key(pool: Pool) -> str:
+    """把资源池统一转换为'physical_cluster/iaas_cluster'格式的字符串"""
+    if isinstance(pool, str):
+        return pool
+    return f"{pool[0]}/{pool[1]}"
+
+
+def _factorize(values) -> Tuple[np.ndarray, list]:
+    """编码为整数，空值单独编码为最后一个值(None)"""
+    codes, uniques = pd.factorize(values)
+    uniques = list(uniques)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(uniques), codes)
+        uniques.append(None)
+    return codes, uniques
+
+
+def encode_pools(df: pd.DataFrame) -> Tuple[np.ndarray, list]:
+    """
+    把每行所属的资源池编码为整数，编码按首次出现的顺序分配
+
+    字符串形式相同的资源池编码相同（与按pool_key字符串编码一致），
+    physical_cluster或iaas_cluster为空的行单独编码为最后一个值(None)。
+
+    Returns:
+        (每行的资源池编码, 编码 -> 资源池标识字符串)
+    """
+    physical, iaas = df["physical_cluster"], df["iaas_cluster"]
+    if not (isinstance(physical.dtype, pd.CategoricalDtype) and isinstance(iaas.dtype, pd.CategoricalDtype)):
+        return _factorize(physical.astype(str) + "/" + iaas.astype(str))
+
+    # 两列的编码组合为一个整数，只为出现过的组合拼接一次字符串
+    physical_codes = physical.cat.codes.to_numpy().astype(np.int64)
+    iaas_codes = iaas.cat.codes.to_numpy().astype(np.int64)
+    missing = (physical_codes < 0) | (iaas_codes < 0)
+    combined = np.where(missing, -1, physical_codes * len(iaas.cat.categories) + iaas_codes)
+    pair_codes, pairs = pd.factorize(combined)
+    physical_names = physical.cat.categories.astype(str)
+    iaas_names = iaas.cat.categories.astype(str)
+    pair_keys = pd.Series(
+        [None if pair < 0 else f"{physical_names[pair // len(iaas_names)]}/{iaas_names[pair % len(iaas_names)]}"
+         for pair in pairs],
+        dtype=object,
+    )
+    key_codes, keys = _factorize(pair_keys)
+    return key_codes[pair_codes], keys
+
+
+def _group_positions(positions: np.ndarray, *keys: np.ndarray) -> Dict[tuple, np.ndarray]:
+    """按整数键分组，返回 键 -> 升序排列的行位置"""
+    if len(positions) == 0:
+        return {}
+    order = np.lexsort(tuple(reversed(keys)))
+    stacked = np.stack([k[order] for k in keys], axis=1)
+    boundaries = np.flatnonzero((np.diff(stacked, axis=0) != 0).any(axis=1)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(order)]))
+    return {
+        tuple(int(v) for v in stacked[start]): positions[order[start:end]]
+        for start, end in zip(starts, ends)
+    }
+
+
+class PoolMembershipIndex:
+    """
+    PSM×资源池成员索引（仅包含cluster_name为default的集群）
+
+    对每个机房分区保存一个稀疏矩阵，行是PSM，列是资源池，值为该PSM在该资源池的集群数。
+    """
+
+    def __init__(
+        self,
+        psm_names: list,
+        pool_keys: list,
+        pool_physical: list,
+        idc_values: list,
+        incidence: Dict[int, sparse.csr_matrix],
+        cell_rows: Dict[tuple, np.ndarray],
+        psm_rows: Dict[tuple, np.ndarray],
+        positions: np.ndarray,
+        row_pool: np.ndarray,
+        row_psm: np.ndarray,
+        row_idc: np.ndarray,
+    ):
+        self.psm_names = psm_names
+        self.pool_keys = pool_keys
+        self.pool_physical = pool_physical
+        self.idc_values = idc_values
+        self.incidence = incidence
+        self._incidence_csc = {i: m.tocsc() for i, m in incidence.items()}
+        self._cell_rows = cell_rows
+        self._psm_rows = psm_rows
+        self._positions = positions
+        self._row_pool = row_pool
+        self._row_psm = row_psm
+        self._row_idc = row_idc
+        self._psm_code = {name: i for i, name in enumerate(psm_names)}
+        self._pool_code = {key: i for i, key in enumerate(pool_keys)}
+        self._idc_code = {value: i for i, value in enumerate(idc_values)}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "PoolMembershipIndex":
+        """从快照DataFrame构建索引"""
+        is_default = (df["cluster_name"] == "default").to_numpy(dtype=bool, na_value=False)
+        positions = np.flatnonzero(is_default)
+        default_df = df.iloc[positions]
+
+        psm_code, psm_names = pd.factorize(default_df["psm"])
+        psm_names = list(psm_names)
+        physical = default_df["physical_cluster"]
+        pool_code, pool_keys = encode_pools(default_df)
+        idc_code, idc_values = _factorize(default_df["idc"])
+
+        # 每个资源池对应的物理集群（取该资源池第一行的原始值）
+        _, first_rows = np.unique(pool_code, return_index=True)
+        pool_physical = list(physical.to_numpy()[first_rows])
+
+        has_psm = psm_code >= 0
+        # 资源池为空的行不属于任何资源池，不计入成员矩阵
+        in_pool = np.array([key is not None for key in pool_keys], dtype=bool)[pool_code]
+        incidence = {}
+        for i in range(len(idc_values)):
+            selected = has_psm & in_pool & (idc_code == i)
+            incidence[i] = sparse.csr_matrix(
+                (
+                    np.ones(int(selected.sum()), dtype=np.int32),
+                    (psm_code[selected], pool_code[selected]),
+                ),
+                shape=(len(psm_names), len(pool_keys)),
+            )
+
+        cell_rows = _group_positions(positions, idc_code, pool_code)
+        psm_rows = _group_positions(positions[has_psm], idc_code[has_psm], psm_code[has_psm])
+
+        return cls(
+            psm_names=psm_names,
+            pool_keys=pool_keys,
+            pool_physical=pool_physical,
+            idc_values=idc_values,
+            incidence=incidence,
+            cell_rows=cell_rows,
+            psm_rows=psm_rows,
+            positions=positions,
+            row_pool=pool_code,
+            row_psm=psm_code,
+            row_idc=idc_code,
+        )
+
+    # ---- 内部编码查询 ----
+
+    def _idc_codes(self, idcs: Optional[Iterable[str]]) -> List[int]:
+        """机房列表转换为分区编码，为空时表示所有机房"""
+        if not idcs:
+            return list(self.incidence.keys())
+        return [self._idc_code[idc] for idc in idcs if idc in self._idc_code]
+
+    def _psm_codes_in(self, pool_code: int, idc_codes: Sequence[int]) -> np.ndarray:
+        """资源池中PSM的编码（升序、去重）"""
+        parts = []
+        for i in idc_codes:
+            m = self._incidence_csc[i]
+            parts.append(m.indices[m.indptr[pool_code]:m.indptr[pool_code + 1]])
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def _membership(self, idc_codes: Sequence[int]) -> sparse.csr_matrix:
+        """指定机房分区合并后的PSM×资源池0/1矩阵"""
+        merged = sparse.csr_matrix((len(self.psm_names), len(self.pool_keys)), dtype=np.int32)
+        for i in idc_codes:
+            merged = merged + self.incidence[i]
+        merged.data = np.ones_like(merged.data)
+        return merged
+
+    def _weighted_incidence(self, idc_code: int, weights: np.ndarray) -> sparse.csr_matrix:
+        """机房分区的PSM×资源池矩阵，值为该PSM在该资源池各行weights之和"""
+        selected = (self._row_idc == idc_code) & (self._row_psm >= 0)
+        return sparse.csr_matrix(
+            (weights[selected], (self._row_psm[selected], self._row_pool[selected])),
+            shape=(len(self.psm_names), len(self.pool_keys)),
+        )
+
+    def _concat_rows(self, groups: Dict[tuple, np.ndarray], keys: Iterable[tuple]) -> np.ndarray:
+        """合并多个分组的行位置并升序排列"""
+        parts = [groups[k] for k in keys if k in groups]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    # ---- 对外查询接口 ----
+
+    def psms_in(self, pool: Pool, idcs: Optional[Iterable[str]] = None) -> pd.Index:
+        """部署在指定资源池中的PSM"""
+        code = self._pool_code.get(pool_key(pool))
+        if code is None:
+            return pd.Index([])
+        codes = self._psm_codes_in(code, self._idc_codes(idcs))
+        return pd.Index([self.psm_names[c] for c in codes])
+
+    def pools_of(self, psm: str, idcs: Optional[Iterable[str]] = None) -> List[str]:
+        """PSM部署的所有资源池"""
+        code = self._psm_code.get(psm)
+        if code is None:
+            return []
+        parts = []
+        for i in self._idc_codes(idcs):
+            m = self.incidence[i]
+            parts.append(m.indices[m.indptr[code]:m.indptr[code + 1]])
+        if not parts:
+            return []
+        return [self.pool_keys[c] for c in np.unique(np.concatenate(parts))]
+
+    def intersect(
+        self, pool_a: Pool, pool_b: Pool, idcs: Optional[Iterable[str]] = None
+    ) -> pd.Index:
+        """同时部署在两个资源池中的PSM"""
+        code_a = self._pool_code.get(pool_key(pool_a))
+        code_b = self._pool_code.get(pool_key(pool_b))
+        if code_a is None or code_b is None:
+            return pd.Index([])
+        idc_codes = self._idc_codes(idcs)
+        codes = np.intersect1d(
+            self._psm_codes_in(code_a, idc_codes),
+            self._psm_codes_in(code_b, idc_codes),
+            assume_unique=True,
+        )
+        return pd.Index([self.psm_names[c] for c in codes])
+
+    def both_pools_rows(
+        self, pool_a: Pool, pool_b: Pool, idcs: Optional[Iterable[str]] = None
+    ) -> np.ndarray:
+        """两个资源池中、且PSM同时部署在这两个资源池的行位置"""
+        code_a = self._pool_code.get(pool_key(pool_a))
+        code_b = self._pool_code.get(pool_key(pool_b))
+        if code_a is None or code_b is None:
+            return np.empty(0, dtype=np.int64)
+        idc_codes = self._idc_codes(idcs)
+        valid = np.intersect1d(
+            self._psm_codes_in(code_a, idc_codes),
+            self._psm_codes_in(code_b, idc_codes),
+            assume_unique=True,
+        )
+        psm_keys = [(i, int(c)) for i in idc_codes for c in valid]
+        candidate = self._concat_rows(self._psm_rows, psm_keys)
+        pools = self.pool_codes_of(candidate)
+        return candidate[(pools == code_a) | (pools == code_b)]
+
+    def pool_rows(self, pool: Pool, idcs: Optional[Iterable[str]] = None) -> np.ndarray:
+        """资源池中的所有行位置"""
+        code = self._pool_code.get(pool_key(pool))
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return self._concat_rows(self._cell_rows, [(i, code) for i in self._idc_codes(idcs)])
+
+    def physical_rows(self, physical: str, idcs: Optional[Iterable[str]] = None) -> np.ndarray:
+        """物理集群下所有资源池中的行位置"""
+        pool_codes = [c for c, p in enumerate(self.pool_physical) if p == physical]
+        keys = [(i, c) for i in self._idc_codes(idcs) for c in pool_codes]
+        return self._concat_rows(self._cell_rows, keys)
+
+    def psm_rows(self, psms: Iterable[str], idcs: Optional[Iterable[str]] = None) -> np.ndarray:
+        """指定PSM在所有资源池中的行位置"""
+        codes = [self._psm_code[p] for p in psms if p in self._psm_code]
+        keys = [(i, c) for i in self._idc_codes(idcs) for c in codes]
+        return self._concat_rows(self._psm_rows, keys)
+
+    def pool_code(self, pool: Pool) -> int:
+        """资源池的整数编码，索引中没有该资源池时返回-1"""
+        return self._pool_code.get(pool_key(pool), -1)
+
+    def pool_codes_of(self, positions: np.ndarray) -> np.ndarray:
+        """行位置对应的资源池编码"""
+        return self._row_pool[np.searchsorted(self._positions, positions)]
+
+    def pool_keys_of(self, positions: np.ndarray) -> np.ndarray:
+        """行位置对应的资源池标识字符串"""
+        keys = np.asarray(self.pool_keys, dtype=object)
+        return keys[self.pool_codes_of(positions)]
+
+    def match_candidates(
+        self, target: Pool, candidates: Sequence[Pool], idcs: Optional[Iterable[str]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        一次计算目标资源池与多个候选资源池的匹配行
+
+        对每个候选资源池j，匹配行是目标资源池和候选资源池j中、PSM同时部署在这两个资源池的行，
+        与both_pools_rows(target, candidates[j], idcs)相同。candidates中不能有重复的资源池。
+        所有候选池共用一次PSM×资源池成员矩阵的切片，不再逐个候选池求交集。
+
+        Returns:
+            (positions, candidate)：按(候选池下标, 行位置)升序排列的行位置及其所属候选池下标
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        target_code = self._pool_code.get(pool_key(target))
+        # 已知的候选池：资源池编码及其在candidates中的下标
+        known = [(j, self._pool_code.get(pool_key(c))) for j, c in enumerate(candidates)]
+        known = [(j, code) for j, code in known if code is not None]
+        if target_code is None or not known:
+            return empty
+        idc_codes = self._idc_codes(idcs)
+        cand_index = np.array([j for j, _ in known], dtype=np.int64)
+        cand_codes = np.array([code for _, code in known], dtype=np.int64)
+
+        # 每个PSM是否部署在各候选池 (PSM × 已知候选池)
+        in_candidate = self._membership(idc_codes)[:, cand_codes].tocsr()
+        in_target = np.zeros(len(self.psm_names), dtype=bool)
+        in_target[self._psm_codes_in(target_code, idc_codes)] = True
+
+        # 目标池中的行：PSM部署在候选池j时属于候选池j的结果
+        target_rows = self._concat_rows(self._cell_rows, [(i, target_code) for i in idc_codes])
+        target_psm = self._row_psm[np.searchsorted(self._positions, target_rows)]
+        has_psm = target_psm >= 0
+        target_rows, target_psm = target_rows[has_psm], target_psm[has_psm]
+        pairs = in_candidate[target_psm].tocoo()
+        rows_a, cand_a = target_rows[pairs.row], cand_index[pairs.col]
+
+        # 候选池中的行：PSM同时部署在目标池时属于该候选池的结果
+        cand_rows = self._concat_rows(
+            self._cell_rows, [(i, int(code)) for i in idc_codes for code in cand_codes]
+        )
+        cand_psm = self._row_psm[np.searchsorted(self._positions, cand_rows)]
+        keep = (cand_psm >= 0) & in_target[np.maximum(cand_psm, 0)]
+        cand_rows = cand_rows[keep]
+        column_of_pool = np.full(len(self.pool_keys), -1, dtype=np.int64)
+        column_of_pool[cand_codes] = cand_index
+        cand_b = column_of_pool[self.pool_codes_of(cand_rows)]
+
+        rows = np.concatenate((rows_a, cand_rows))
+        cand = np.concatenate((cand_a, cand_b))
+        if len(rows) == 0:
+            return empty
+        # 目标池与候选池相同时行会重复，去重后按(候选池, 行位置)排序
+        order = np.lexsort((rows, cand))
+        rows, cand = rows[order], cand[order]
+        unique = np.concatenate(([True], (np.diff(rows) != 0) | (np.diff(cand) != 0)))
+        return rows[unique], cand[unique]
+
+    def pool_affinity(
+        self, idc: Optional[str], weights: Dict[str, np.ndarray]
+    ) -> Tuple[sparse.coo_matrix, Dict[str, sparse.csr_matrix]]:
+        """
+        计算一个机房内资源池×资源池的亲和矩阵
+
+        设B为PSM×资源池的0/1矩阵、W为按weights加权的PSM×资源池矩阵，则
+        B^T·B 的(a, b)为同时部署在资源池a和b的PSM数，
+        W^T·B 的(a, b)为这些PSM在资源池a中的weights之和。
+
+        Args:
+            idc: 机房
+            weights: 列名 -> 与快照DataFrame行对齐的数值数组（如instance_num、cpu_limit）
+
+        Returns:
+            (共同PSM数矩阵(COO), 列名 -> 源资源池一侧的加权矩阵)，矩阵的行列都是资源池编码
+        """
+        shape = (len(self.pool_keys), len(self.pool_keys))
+        if idc not in self._idc_code:
+            return sparse.coo_matrix(shape, dtype=np.int64), {
+                name: sparse.csr_matrix(shape) for name in weights
+            }
+        code = self._idc_code[idc]
+        membership = self.incidence[code].copy()
+        membership.data = np.ones_like(membership.data, dtype=np.int64)
+        shared = (membership.T @ membership).tocoo()
+        sides = {
+            name: (self._weighted_incidence(code, np.asarray(values, dtype=float)[self._positions]).T
+                   @ membership).tocsr()
+            for name, values in weights.items()
+        }
+        return shared, sides
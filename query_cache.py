@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 分析结果缓存
+在resource_manager的分析函数前增加一层结果缓存：
+1. 缓存键 = 函数名 + 规整后的查询参数 + 数据文件 + 快照版本号
+2. 按条目数和估算内存占用做LRU淘汰，并按TTL过期
+3. 数据文件变化后快照版本号改变，旧版本的结果自动失效并被清理
+4. 统计命中率、条目数、内存占用和淘汰次数
+5. 被装饰函数的query_key给出跨进程稳定的查询键（数据文件+文件签名+规整后的查询参数），
+   不运行分析即可标识一次查询的结果，用于报告文件名
+
+注意：缓存的结果由所有请求共享，调用方只能读取，不能原地修改。
+"""
+
+import functools
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import pandas as pd
+
+from snapshot_cache import get_snapshot
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算对象占用的内存字节数"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class QueryCache:
+    """按LRU+TTL淘汰的查询结果缓存，线程安全"""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 512 * 1024 * 1024, ttl_seconds: int = 600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # 键 -> (写入时间, 占用字节数, 结果)
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._latest_version: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"lru": 0, "ttl": 0, "stale": 0}
+
+    def get_or_compute(self, file_path: str, version: int, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        取缓存结果，未命中时调用compute计算并写入缓存（异常不缓存）
+
+        Args:
+            file_path: 数据文件路径
+            version: 数据快照版本号
+            key: 规整后的查询键
+            compute: 计算结果的函数
+        """
+        full_key = (file_path, version, key)
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(full_key)
+            if entry is not None:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = compute()
+        size = estimate_size(value)
+
+        with self._lock:
+            self._drop_stale(file_path, version)
+            if size <= self.max_bytes and full_key not in self._entries:
+                self._entries[full_key] = (time.monotonic(), size, value)
+                self._bytes += size
+                self._evict_lru()
+        return value
+
+    def _remove(self, key: Hashable, reason: str) -> None:
+        """删除一个条目并记录淘汰原因"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        self.evictions[reason] += 1
+
+    def _expire(self) -> None:
+        """清理超过TTL的条目"""
+        deadline = time.monotonic() - self.ttl_seconds
+        for key in [k for k, (created, _, _) in self._entries.items() if created < deadline]:
+            self._remove(key, "ttl")
+
+    def _drop_stale(self, file_path: str, version: int) -> None:
+        """数据文件出现新版本时，清理该文件旧版本的结果"""
+        if self._latest_version.get(file_path, 0) >= version:
+            return
+        self._latest_version[file_path] = version
+        for key in [k for k in self._entries if k[0] == file_path and k[1] < version]:
+            self._remove(key, "stale")
+
+    def _evict_lru(self) -> None:
+        """超出条目数或内存上限时淘汰最久未使用的条目"""
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)), "lru")
+
+    def clear(self) -> None:
+        """清空缓存和统计计数"""
+        with self._lock:
+            self._entries.clear()
+            self._latest_version.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+            self.evictions = {"lru": 0, "ttl": 0, "stale": 0}
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            self._expire()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": dict(self.evictions),
+            }
+
+
+# 进程级共享的默认缓存，可通过环境变量调整容量和过期时间
+QUERY_CACHE = QueryCache(
+    max_entries=int(os.environ.get("QUERY_CACHE_MAX_ENTRIES", 256)),
+    max_bytes=int(os.environ.get("QUERY_CACHE_MAX_MB", 512)) * 1024 * 1024,
+    ttl_seconds=int(os.environ.get("QUERY_CACHE_TTL", 600)),
+)
+
+
+def memoize_query(normalize: Callable[..., Hashable]) -> Callable:
+    """
+    分析函数的结果缓存装饰器，被装饰函数的第一个参数必须是数据文件路径
+
+    Args:
+        normalize: 把其余参数规整为缓存键的函数，参数与被装饰函数相同（不含file_path）
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(file_path: str, *args, **kwargs):
+            try:
+                snapshot = get_snapshot(file_path)
+            except Exception:
+                # 加载失败时交给分析函数自己报错
+                return func(file_path, *args, **kwargs)
+            key = (func.__name__, normalize(*args, **kwargs))
+            return QUERY_CACHE.get_or_compute(
+                snapshot.file_path, snapshot.version, key,
+                lambda: func(file_path, *args, **kwargs)
+            )
+
+        def query_key(file_path: str, *args, **kwargs) -> Hashable:
+            """
+            查询结果的标识，参数等价的查询在同一份数据上得到相同的键；
+            快照版本号只在进程内递增，这里用文件签名(mtime_ns, size)，多个进程和重启后都保持一致
+            """
+            snapshot = get_snapshot(file_path)
+            return (snapshot.file_path, snapshot.signature, func.__name__, normalize(*args, **kwargs))
+
+        wrapper.query_key = query_key
+        return wrapper
+    return decorator
+
+
+def query_cache_stats() -> Dict[str, Any]:
+    """返回默认缓存的统计信息"""
+    return QUERY_CACHE.stats()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 查询引擎
+命令行(main.py、manage.py)和各个Web应用(app.py、app_complete.py、app_enhanced.py)统一通过查询引擎执行分析：
+1. 引擎绑定一个数据文件，通过进程内快照缓存取得数据快照和基于快照的索引
+2. 所有分析都走resource_manager中基于索引的实现，并共用同一份分析结果缓存
+3. 入口只负责解析参数和展示结果，加载 → 按机房过滤 → 过滤default集群 → 匹配 → 排序 → 汇总
+   的流程只在引擎中实现一次，优化一处即对所有入口生效
+
+引擎本身不保存数据，创建的开销可以忽略；数据文件变化后自动使用新的快照。
+"""
+
+from typing import Any, Dict, Hashable, Iterator, List, Optional
+
+import pandas as pd
+
+import resource_manager as rm
+from fleet_scan import query_fleet
+from migration_planner import DEFAULT_TIME_BUDGET
+from pool_affinity import query_pool_affinity
+from psm_index import PoolMembershipIndex
+from snapshot_cache import InventorySnapshot
+
+
+def parse_idc_list(value: Any) -> Optional[List[str]]:
+    """解析逗号分隔的机房字符串或机房列表，去掉空值，为空时返回None（不过滤）"""
+    if isinstance(value, str):
+        value = value.split(",")
+    idc_list = [str(item).strip() for item in value or [] if str(item).strip()]
+    return idc_list or None
+
+
+# 引擎方法名 -> 对应的分析函数（参数顺序与引擎方法相同，另加第一个参数file_path）
+ANALYSES = {
+    "migration": rm.analyze_resource_migration,
+    "batch_migration": rm.analyze_batch_migration,
+    "plan": rm.plan_resource_migration,
+    "recommended_scaling": rm.analyze_recommended_scaling,
+    "migratable_clusters": rm.analyze_migratable_clusters,
+}
+
+
+class QueryEngine:
+    """
+    绑定一个数据文件的查询引擎
+
+    Args:
+        file_path: 数据文件路径
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    @property
+    def snapshot(self) -> InventorySnapshot:
+        """当前数据快照，数据文件变化后自动重新加载"""
+        return rm.load_snapshot(self.file_path)
+
+    @property
+    def index(self) -> PoolMembershipIndex:
+        """当前快照的PSM×资源池成员索引"""
+        return rm.get_pool_index(self.snapshot)
+
+    def result_key(self, analysis: str, *args, **kwargs) -> Hashable:
+        """
+        分析结果的标识，不运行分析：参数与引擎方法analysis相同，
+        同一份数据上参数等价的查询得到相同的键，用于报告文件名
+        """
+        return ANALYSES[analysis].query_key(self.file_path, *args, **kwargs)
+
+    # ---- 资源腾挪 ----
+
+    def both_pools(self, pool1: str, pool2: str, idc_list: Optional[List[str]] = None) -> pd.DataFrame:
+        """同时部署在两个资源池的default集群，带pool_key和pool_identifier列"""
+        return rm.find_psm_in_both_pools_indexed(
+            self.snapshot, rm.parse_pool_string(pool1), rm.parse_pool_string(pool2), idc_list
+        )
+
+    def migration(self, pool1: str, pool2: str, idc_list: Optional[List[str]] = None) -> Dict[str, Any]:
+        """资源腾挪分析，结果（详细数据、汇总、统计）只读"""
+        return rm.analyze_resource_migration(self.file_path, pool1, pool2, idc_list)
+
+    def batch_migration(
+        self,
+        target_pool: str,
+        candidate_pools: Any,
+        idc_list: Optional[List[str]] = None,
+        include_detail: bool = True,
+    ) -> Dict[str, Any]:
+        """一个目标资源池对多个候选资源池的资源腾挪分析"""
+        return rm.analyze_batch_migration(self.file_path, target_pool, candidate_pools, idc_list, include_detail)
+
+    def plan(
+        self,
+        source_pool: str,
+        headroom: Any,
+        cpu_target: float = 0,
+        mem_target: float = 0,
+        idc_list: Optional[List[str]] = None,
+        time_budget: float = DEFAULT_TIME_BUDGET,
+    ) -> Dict[str, Any]:
+        """资源腾挪规划"""
+        return rm.plan_resource_migration(
+            self.file_path, source_pool, headroom, cpu_target, mem_target, idc_list, time_budget
+        )
+
+    # ---- 推荐缩容 ----
+
+    def recommended_scaling(
+        self, idc: str, pool: str, min_save_cores: int = 0, top_k: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """推荐缩容分析，按save_cores降序"""
+        return rm.analyze_recommended_scaling(self.file_path, idc, pool, min_save_cores, top_k)
+
+    def iter_recommended_scaling(
+        self, idc: str, pool: str, min_save_cores: int = 0, top_k: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """推荐缩容分析的流式版本"""
+        return rm.iter_recommended_scaling(self.file_path, idc, pool, min_save_cores, top_k)
+
+    def recommended_scaling_totals(self, idc: str, pool: str, min_save_cores: int = 0) -> Dict[str, int]:
+        """符合推荐缩容条件的集群总数和可节省的CPU总核数"""
+        return rm.recommended_scaling_totals(self.file_path, idc, pool, min_save_cores)
+
+    def fleet(
+        self,
+        min_save_cores: int = 0,
+        idc_list: Optional[List[str]] = None,
+        top: Optional[int] = None,
+        workers: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """所有机房、所有资源池的推荐缩容扫描"""
+        return query_fleet(self.snapshot, min_save_cores, idc_list, top, workers)
+
+    # ---- 可腾挪集群 ----
+
+    def migratable_clusters(self, idc: str, pool: str) -> List[Dict[str, Any]]:
+        """可腾挪集群查询"""
+        return rm.analyze_migratable_clusters(self.file_path, idc, pool)
+
+    def iter_migratable_clusters(self, idc: str, pool: str) -> Iterator[Dict[str, Any]]:
+        """可腾挪集群查询的流式版本"""
+        return rm.iter_migratable_clusters(self.file_path, idc, pool)
+
+    def pool_affinity(
+        self,
+        idc_list: Optional[List[str]] = None,
+        source_pool: Optional[str] = None,
+        top: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """资源池亲和表"""
+        return query_pool_affinity(self.snapshot, idc_list, source_pool, top)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 报告导出
+分块把结果逐行写出，导出时的内存占用与结果大小无关：
+1. xlsx: 使用openpyxl的write-only模式，逐行追加，不在内存中构建整个工作簿
+2. csv / csv.gz: 按块生成CSV文本，可以直接写入文件，也可以直接作为HTTP响应体输出
+
+一个报告由多个(工作表名, DataFrame)组成；CSV只有一张表，只导出主表。
+"""
+
+import gzip
+import zlib
+from typing import Iterator, List, Sequence, Tuple
+
+import pandas as pd
+from openpyxl import Workbook
+
+from request_tracing import traced
+
+EXPORT_FORMATS = ["xlsx", "csv", "csv.gz"]
+
+MIMETYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+}
+
+# 每次处理的行数
+CHUNK_ROWS = 5000
+
+Sheet = Tuple[str, pd.DataFrame]
+
+
+def normalize_format(fmt: str) -> str:
+    """规整导出格式，不支持的格式使用xlsx"""
+    fmt = (fmt or "").lower().lstrip(".")
+    return fmt if fmt in EXPORT_FORMATS else "xlsx"
+
+
+def _iter_rows(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[tuple]:
+    """按块遍历DataFrame的行，空值转换为None"""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+
+def _cell_value(value):
+    """转换为openpyxl可以写入的值，列表等复杂类型转为字符串"""
+    if isinstance(value, (list, tuple, set)):
+        return ", ".join(str(v) for v in value)
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        return value.item()
+    return value
+
+
+def write_xlsx(path: str, sheets: Sequence[Sheet]) -> str:
+    """以write-only模式逐行写入xlsx文件"""
+    workbook = Workbook(write_only=True)
+    for name, df in sheets:
+        worksheet = workbook.create_sheet(title=name)
+        worksheet.append([str(col) for col in df.columns])
+        for row in _iter_rows(df):
+            worksheet.append([_cell_value(v) for v in row])
+    workbook.save(path)
+    return path
+
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """按块生成CSV内容（UTF-8，带BOM以便Excel正确识别中文）"""
+    yield "\ufeff".encode("utf-8")
+    yield df.iloc[0:0].to_csv(index=False).encode("utf-8")
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=False).encode("utf-8")
+
+
+def iter_gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """把字节流逐块压缩为gzip格式"""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(df: pd.DataFrame, fmt: str) -> Iterator[bytes]:
+    """生成CSV或CSV.gz格式的字节流，用于直接写入HTTP响应"""
+    chunks = iter_csv(df)
+    return iter_gzip(chunks) if normalize_format(fmt) == "csv.gz" else chunks
+
+
+def write_csv(path: str, df: pd.DataFrame, compress: bool = False) -> str:
+    """逐块写入CSV文件，compress为True时写入gzip压缩的CSV"""
+    opener = gzip.open if compress else open
+    with opener(path, "wb") as f:
+        for chunk in iter_csv(df):
+            f.write(chunk)
+    return path
+
+
+@traced()
+def export_report(path: str, sheets: Sequence[Sheet], fmt: str = "xlsx", primary: int = 0) -> str:
+    """
+    按指定格式导出报告
+
+    Args:
+        path: 输出文件路径
+        sheets: (工作表名, DataFrame)列表
+        fmt: 导出格式，xlsx / csv / csv.gz
+        primary: CSV格式时导出的主表下标
+    """
+    fmt = normalize_format(fmt)
+    if fmt == "xlsx":
+        return write_xlsx(path, sheets)
+    return write_csv(path, sheets[primary][1], compress=(fmt == "csv.gz"))
+
+
+def report_filename(base: str, fmt: str) -> str:
+    """按导出格式拼接文件名"""
+    return f"{base}.{normalize_format(fmt)}"
+
+
+def frame_from_records(records: List[dict]) -> pd.DataFrame:
+    """把分析结果记录转换为DataFrame，列表字段转为逗号分隔的字符串"""
+    df = pd.DataFrame(records)
+    for col in df.columns:
+        if df[col].map(lambda v: isinstance(v, list)).any():
+            df[col] = df[col].map(lambda v: ", ".join(v) if isinstance(v, list) else v)
+    return df
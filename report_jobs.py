@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 后台报告生成任务
+Excel报告的写入放到后台线程池中执行，请求线程只提交任务并立即返回：
+1. 每个任务有唯一的job_id，可按job_id或输出文件名查询状态
+2. 先写临时文件，完成后再原子替换为目标文件，下载时不会读到写了一半的文件
+3. 下载接口可以等待任务完成后再发送文件
+4. 指定共享目录时任务状态同时写入目录，多进程服务中其他工作进程也能按job_id或文件名查询和等待；
+   执行任务的进程已退出而任务未结束时，视为失败
+"""
+
+import hashlib
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from shared_records import SharedRecordStore
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# 等待其他进程中的任务时，重新读取任务状态的间隔（秒）
+JOB_POLL_INTERVAL = 0.2
+
+
+class ReportJob:
+    """一个报告生成任务"""
+
+    def __init__(self, job_id: str, output_path: str):
+        self.job_id = job_id
+        self.output_path = output_path
+        self.filename = os.path.basename(output_path)
+        self.status = PENDING
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.pid = os.getpid()
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待任务结束，返回任务是否已结束"""
+        return self._done.wait(timeout)
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _process_alive(pid: int) -> bool:
+    """进程是否仍在运行"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _filename_key(filename: str) -> str:
+    """文件名可能包含任意字符，共享目录中按文件名的哈希保存"""
+    return hashlib.sha1(filename.encode("utf-8")).hexdigest()
+
+
+class SharedReportJob(ReportJob):
+    """由其他进程执行的任务，状态从共享目录读取"""
+
+    def __init__(self, record: Dict[str, Any], store: SharedRecordStore):
+        super().__init__(record["job_id"], record["output_path"])
+        self._store = store
+        self._apply(record)
+
+    def _apply(self, record: Optional[Dict[str, Any]]) -> None:
+        """更新为共享目录中的状态；记录已被淘汰或执行任务的进程已退出时视为失败"""
+        if record is None:
+            self.status, self.error = FAILED, "任务记录已过期"
+        else:
+            self.status = record["status"]
+            self.error = record["error"]
+            self.created_at = record["created_at"]
+            self.finished_at = record["finished_at"]
+            self.pid = record["pid"]
+            if self.status in (PENDING, RUNNING) and not _process_alive(self.pid):
+                self.status, self.error = FAILED, "生成报告的进程已退出"
+        if self.status in (DONE, FAILED):
+            self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """定期重新读取任务状态，直到任务结束或超时"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._done.is_set():
+            remaining = JOB_POLL_INTERVAL if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(JOB_POLL_INTERVAL, remaining))
+            self._apply(self._store.get(self.job_id))
+        return True
+
+
+class ReportJobQueue:
+    """
+    报告生成任务队列，使用线程池执行写入
+
+    Args:
+        max_workers: 写入报告的线程数
+        max_jobs: 最多保留的任务记录数
+        directory: 共享目录，为空时任务状态只保存在当前进程中
+    """
+
+    def __init__(self, max_workers: int = 2, max_jobs: int = 1000, directory: Optional[str] = None):
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="report")
+        self._jobs: Dict[str, ReportJob] = {}
+        self._by_filename: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._shared: Optional[SharedRecordStore] = None
+        self._shared_filenames: Optional[SharedRecordStore] = None
+        if directory:
+            self.share(directory)
+
+    def share(self, directory: str) -> None:
+        """把任务状态同时写入共享目录，供其他进程查询"""
+        self._shared = SharedRecordStore(os.path.join(directory, "jobs"), self.max_jobs)
+        self._shared_filenames = SharedRecordStore(os.path.join(directory, "by_filename"), self.max_jobs)
+
+    def _publish(self, job: ReportJob) -> None:
+        """把任务的当前状态写入共享目录"""
+        if self._shared is None:
+            return
+        try:
+            self._shared.put(job.job_id, dict(job.to_dict(), output_path=job.output_path, pid=job.pid))
+        except OSError as e:
+            print(f"写入任务状态失败 {job.job_id}: {e}")
+
+    def submit(self, output_path: str, writer: Callable[[str], None]) -> ReportJob:
+        """
+        提交一个报告生成任务
+
+        Args:
+            output_path: 报告的最终路径
+            writer: 写入函数，参数为要写入的临时文件路径
+        """
+        job = ReportJob(uuid.uuid4().hex, output_path)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._by_filename[job.filename] = job.job_id
+            self._trim()
+        self._publish(job)
+        if self._shared_filenames is not None:
+            self._shared_filenames.put(_filename_key(job.filename), {"job_id": job.job_id})
+        self._executor.submit(self._run, job, writer)
+        return job
+
+    def _run(self, job: ReportJob, writer: Callable[[str], None]) -> None:
+        """在工作线程中执行写入"""
+        job.status = RUNNING
+        self._publish(job)
+        base, ext = os.path.splitext(job.output_path)
+        tmp_path = f"{base}.{job.job_id}.tmp{ext}"
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, job.output_path)
+            job.status = DONE
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            print(f"报告生成失败 {job.filename}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            job.finished_at = time.time()
+            self._publish(job)
+            job._done.set()
+
+    def _trim(self) -> None:
+        """只保留最近的max_jobs个已结束任务的记录"""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job.finished][: len(self._jobs) - self.max_jobs]:
+            job = self._jobs.pop(job_id)
+            if self._by_filename.get(job.filename) == job_id:
+                del self._by_filename[job.filename]
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        """按job_id查询任务，当前进程中没有时从共享目录读取"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None or self._shared is None:
+            return job
+        record = self._shared.get(job_id)
+        return SharedReportJob(record, self._shared) if record is not None else None
+
+    def find_by_filename(self, filename: str) -> Optional[ReportJob]:
+        """按输出文件名查询最近一次的任务，当前进程中没有时从共享目录读取"""
+        with self._lock:
+            job_id = self._by_filename.get(filename)
+            job = self._jobs.get(job_id) if job_id else None
+        if job is not None or self._shared_filenames is None:
+            return job
+        entry = self._shared_filenames.get(_filename_key(filename))
+        return self.get(entry["job_id"]) if entry is not None else None
+
+
+# 进程级共享的默认任务队列
+REPORT_JOBS = ReportJobQueue(max_workers=int(os.environ.get("REPORT_WORKERS", 2)))
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 报告文件存储
+管理uploads/、outputs/目录中生成的报告文件：
+1. 文件名由查询键（数据文件、文件签名和规整后的查询参数）的哈希决定，相同的查询复用同一个文件，
+   不再重复写入；文件名在分析之前就能确定，不需要在请求线程中对报告内容做哈希
+2. 按总大小和文件年龄设置配额，超出时按最近访问时间(LRU)淘汰；访问时间记在文件的atime上，
+   多个进程（如多进程服务的各个工作进程）共用同一目录时，任何进程的下载都会被清理看到
+3. 后台清理线程在第一次保存或访问报告时才启动，即在实际处理请求的进程中（多进程服务中为fork之后的工作进程），
+   模块导入时不启动线程，fork时父进程中没有可能持有锁的线程
+4. 统计文件数、占用空间、复用和淘汰次数
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+# 正在写入的临时文件的标记，按配额淘汰时跳过临时文件
+TMP_MARKER = ".tmp"
+
+
+def report_key(key: Hashable, fmt: str) -> str:
+    """根据报告格式和查询键（由str、数值、None组成的元组，repr跨进程稳定）计算哈希"""
+    return hashlib.sha256(repr((fmt, key)).encode("utf-8")).hexdigest()[:24]
+
+
+class ReportStore:
+    """带配额和LRU淘汰的报告文件目录"""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 1024 * 1024 * 1024,
+        max_age_seconds: int = 72 * 3600,
+        sweep_interval: int = 300,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sweep_interval = sweep_interval
+        self._pending: Set[str] = set()
+        self._lock = threading.Lock()
+        self._sweeper: Optional[threading.Thread] = None
+        self._sweeper_pid: Optional[int] = None
+        self.reused = 0
+        self.written = 0
+        self.evictions = {"age": 0, "quota": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, filename: str) -> str:
+        """文件在存储目录中的路径"""
+        return os.path.join(self.directory, filename)
+
+    def filename_for(self, prefix: str, key: Hashable, fmt: str) -> str:
+        """
+        按查询生成报告文件名：<prefix>_<查询键哈希>.<格式>
+
+        Args:
+            prefix: 文件名前缀，同一查询生成不同内容的报告时用前缀区分
+            key: 查询键，通常由QueryEngine.result_key生成
+            fmt: 报告格式
+        """
+        return f"{prefix}_{report_key(key, fmt)}.{fmt}"
+
+    def touch(self, filename: str) -> None:
+        """记录文件被访问：把当前时间写入文件的atime（保留mtime），用于LRU淘汰"""
+        path = self.path(filename)
+        try:
+            os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+        # 先记录访问再启动清理线程，首次清理不会淘汰刚被访问的文件
+        self.start_sweeper()
+
+    def save(
+        self,
+        filename: str,
+        writer: Callable[[str], Any],
+        submit: Optional[Callable[[str, Callable[[str], Any]], Any]] = None,
+    ) -> bool:
+        """
+        保存报告，文件已存在时直接复用
+
+        Args:
+            filename: 报告文件名（通常由filename_for生成）
+            writer: 写入函数，参数为要写入的文件路径
+            submit: 可选的后台任务提交函数(output_path, writer)，为空时同步写入
+
+        Returns:
+            是否复用了已存在的文件
+        """
+        self.start_sweeper()
+        path = self.path(filename)
+        with self._lock:
+            # 文件已存在或正在后台生成时直接复用
+            reuse = os.path.exists(path) or filename in self._pending
+            if reuse:
+                self.reused += 1
+            else:
+                self.written += 1
+                if submit is not None:
+                    self._pending.add(filename)
+        if reuse:
+            self.touch(filename)
+            return True
+
+        if submit is not None:
+            def write_and_release(target: str) -> Any:
+                try:
+                    return writer(target)
+                finally:
+                    with self._lock:
+                        self._pending.discard(filename)
+
+            submit(path, write_and_release)
+        else:
+            base, ext = os.path.splitext(path)
+            tmp_path = f"{base}.{os.getpid()}.{threading.get_ident()}{TMP_MARKER}{ext}"
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        return False
+
+    def _files(self) -> Dict[str, os.stat_result]:
+        """列出目录中的文件"""
+        files = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    files[entry.name] = entry.stat()
+        return files
+
+    def sweep(self) -> Dict[str, int]:
+        """执行一次清理：先删除过期文件，再按LRU淘汰到配额以内"""
+        now = time.time()
+        files = self._files()
+        removed = {"age": 0, "quota": 0}
+
+        def remove(name: str, reason: str) -> None:
+            try:
+                os.remove(self.path(name))
+            except OSError:
+                return
+            files.pop(name, None)
+            with self._lock:
+                self.evictions[reason] += 1
+            removed[reason] += 1
+
+        for name, stat in list(files.items()):
+            if now - stat.st_mtime > self.max_age_seconds:
+                remove(name, "age")
+
+        total = sum(stat.st_size for stat in files.values())
+        if total > self.max_bytes:
+            # 最近访问时间取atime（touch写入）和mtime（生成时间）中较晚的一个
+            candidates = sorted(
+                (name for name in files if TMP_MARKER not in name),
+                key=lambda name: max(files[name].st_atime, files[name].st_mtime),
+            )
+            for name in candidates:
+                if total <= self.max_bytes:
+                    break
+                total -= files[name].st_size
+                remove(name, "quota")
+        return removed
+
+    def start_sweeper(self) -> None:
+        """
+        启动后台清理线程，每个进程只启动一次；save和touch会自动调用
+        fork出的子进程不会继承父进程的线程，按进程号判断本进程是否已经启动
+        """
+        if self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_loop, name="report-sweeper", daemon=True)
+            self._sweeper.start()
+            self._sweeper_pid = os.getpid()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"报告目录清理失败: {e}")
+            time.sleep(self.sweep_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回存储使用情况"""
+        files = self._files()
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "files": len(files),
+                "bytes": sum(stat.st_size for stat in files.values()),
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age_seconds,
+                "reused": self.reused,
+                "written": self.written,
+                "evictions": dict(self.evictions),
+            }
+
+
+_STORES: Dict[str, ReportStore] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_report_store(directory: str) -> ReportStore:
+    """获取目录对应的报告存储（按目录共享），配额可通过环境变量调整"""
+    directory = os.path.abspath(directory)
+    with _STORES_LOCK:
+        if directory not in _STORES:
+            _STORES[directory] = ReportStore(
+                directory,
+                max_bytes=int(os.environ.get("REPORT_STORE_MAX_MB", 1024)) * 1024 * 1024,
+                max_age_seconds=int(float(os.environ.get("REPORT_STORE_MAX_AGE_HOURS", 72)) * 3600),
+                sweep_interval=int(os.environ.get("REPORT_STORE_SWEEP_SECONDS", 300)),
+            )
+        return _STORES[directory]
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 请求耗时追踪
+记录每个请求、每个分析函数和各阶段的耗时，定位慢查询的时间花在哪里：
+1. span()/traced()记录一个阶段的耗时，写入当前请求的追踪记录和进程级的延迟直方图
+2. 请求结束时把追踪记录输出为Server-Timing响应头，浏览器开发者工具中可以直接查看
+3. render_metrics()按Prometheus文本格式输出各阶段、各路由的延迟直方图；直方图是进程级的，
+   每个序列带worker="<进程号>"标签，多进程部署时不同工作进程的计数是不同的序列
+4. SamplingProfiler在后台线程中定时采样请求线程的调用栈，输出折叠栈格式的采样结果
+
+不在请求中（后台任务、命令行）时只写入延迟直方图。
+"""
+
+import contextvars
+import functools
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from shared_records import SharedRecordStore
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 采样调用栈的间隔（秒）
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+# 最多保存的采样结果数，超出时淘汰最早的
+MAX_PROFILES = 32
+
+# Server-Timing中的名称只能包含token字符
+_INVALID_TOKEN_CHARS = re.compile(r"[^A-Za-z0-9!#$%&'*+\-.^_`|~]")
+
+
+class Trace:
+    """一个请求内记录的各阶段耗时，按结束顺序排列"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float]] = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Server-Timing响应头的值，耗时单位为毫秒，最后一项为请求总耗时"""
+        entries = [(name, duration) for name, duration in self.spans] + [("total", self.elapsed())]
+        return ", ".join(
+            f"{_INVALID_TOKEN_CHARS.sub('_', name)};dur={duration * 1000:.1f}" for name, duration in entries
+        )
+
+
+_CURRENT: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("request_trace", default=None)
+
+
+def start_trace() -> contextvars.Token:
+    """为当前上下文开始一个追踪记录，返回的token交给end_trace()恢复"""
+    return _CURRENT.set(Trace())
+
+
+def end_trace(token: contextvars.Token) -> None:
+    _CURRENT.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    """当前上下文的追踪记录"""
+    return _CURRENT.get()
+
+
+class LatencyHistogram:
+    """按标签分组的延迟直方图，线程安全"""
+
+    def __init__(
+        self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # 标签值 -> [各桶计数（不累计）..., +Inf桶计数, 总耗时]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, labels: Tuple[str, ...], seconds: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def totals(self, labels: Tuple[str, ...]) -> Tuple[int, float]:
+        """标签对应的(观测次数, 总耗时)"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                return 0, 0.0
+            return int(sum(series[:-1])), series[-1]
+
+    def render(self) -> List[str]:
+        """Prometheus文本格式的指标行，每个序列带当前进程的worker标签"""
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        worker = worker_label()
+        for labels, series in items:
+            label_text = ",".join(
+                [f'{key}="{_escape(value)}"' for key, value in zip(self.label_names, labels)] + [worker]
+            )
+            cumulative = 0
+            for bound, count in zip(list(self.buckets) + ["+Inf"], series[:-1]):
+                cumulative += count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {int(cumulative)}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {int(cumulative)}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def worker_label() -> str:
+    """当前工作进程的标签，在fork之后的工作进程中取到的是它自己的进程号"""
+    return f'worker="{os.getpid()}"'
+
+
+# 进程级共享的延迟直方图：分析函数和各阶段、各路由
+SPAN_LATENCY = LatencyHistogram("psm_span_seconds", "分析函数和各阶段的耗时（秒）", ["span"])
+REQUEST_LATENCY = LatencyHistogram("psm_request_seconds", "各路由的请求耗时（秒）", ["route", "status"])
+
+
+def record_span(name: str, duration: float) -> None:
+    """记录一个阶段的耗时（秒），用于开始和结束不在同一个代码块中的阶段"""
+    SPAN_LATENCY.observe((name,), duration)
+    trace = _CURRENT.get()
+    if trace is not None:
+        trace.spans.append((name, duration))
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """记录with块的耗时，块内抛出异常时同样记录"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+def traced(name: Optional[str] = None) -> Callable[[Callable], Callable]:
+    """记录函数每次调用的耗时，名称默认为函数名（不能用于生成器函数）"""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def render_metrics(extra: Sequence[str] = ()) -> str:
+    """Prometheus文本格式的全部指标，extra为调用方追加的指标行"""
+    lines = REQUEST_LATENCY.render() + SPAN_LATENCY.render() + list(extra)
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    采样分析器：在后台线程中按固定间隔读取目标线程的调用栈并计数
+
+    结果为折叠栈格式（每行"外层函数;...;内层函数 采样数"），可以直接用flamegraph.pl或speedscope查看。
+    采样线程只读取调用栈，不影响被采样线程的执行。
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = max(interval, 0.001)
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """折叠栈格式的采样结果，按采样数降序"""
+        header = (
+            f"# 采样间隔{self.interval * 1000:g}ms，耗时{self.duration:.3f}秒，"
+            f"共{sum(self.samples.values())}个样本\n"
+        )
+        return header + "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileStore:
+    """
+    保存最近的采样结果供下载，超出数量时淘汰最早的，线程安全
+
+    Args:
+        max_profiles: 最多保存的采样结果数
+        directory: 共享目录，为空时采样结果只保存在当前进程中
+    """
+
+    def __init__(self, max_profiles: int = MAX_PROFILES, directory: Optional[str] = None):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared: Optional[SharedRecordStore] = None
+        if directory:
+            self.share(directory)
+
+    def share(self, directory: str) -> None:
+        """把采样结果同时写入共享目录，多进程服务中其他工作进程也能下载"""
+        self._shared = SharedRecordStore(directory, self.max_profiles)
+
+    def put(self, label: str, content: str) -> str:
+        profile_id = uuid.uuid4().hex[:16]
+        with self._lock:
+            self._profiles[profile_id] = (label, content)
+            while len(self._profiles) > self.max_profiles:
+                self._profiles.popitem(last=False)
+        if self._shared is not None:
+            self._shared.put(profile_id, {"label": label, "content": content})
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[Tuple[str, str]]:
+        """返回(标签, 采样结果)，不存在或已淘汰时返回None；当前进程中没有时从共享目录读取"""
+        with self._lock:
+            profile = self._profiles.get(profile_id)
+        if profile is not None or self._shared is None:
+            return profile
+        stored = self._shared.get(profile_id)
+        return (stored["label"], stored["content"]) if stored is not None else None
+
+
+# 进程级共享的采样结果
+PROFILES = ProfileStore()
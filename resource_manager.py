@@ -9,29 +9,68 @@ PSM资源管理系统 - 核心逻辑模块
 3. 可腾挪集群查询：查询包含特定资源池的PSM及其在其他资源池的分布
 """
 
+import numpy as np
 import pandas as pd
-from typing import Tuple, List, Optional, Dict, Any
+from typing import Tuple, List, Optional, Dict, Any, Iterable, Iterator
 
+from inventory_dtypes import plain_dtypes
+from migration_planner import DEFAULT_TIME_BUDGET, headroom_key, parse_headroom, solve_migration_plan
+from psm_index import PoolMembershipIndex, encode_pools
+from query_cache import memoize_query
+from request_tracing import span, traced
+from row_filter import RowFilter, isin_mask, take
+from snapshot_cache import InventorySnapshot, get_snapshot, parse_save_cores
+from time_budget import BudgetExceeded, checkpoint, with_checkpoints
 
-def load_excel_data(file_path: str) -> pd.DataFrame:
-    """加载Excel数据"""
+
+def load_snapshot(file_path: str) -> InventorySnapshot:
+    """加载Excel数据快照（通过进程内快照缓存）"""
     try:
-        df = pd.read_excel(file_path)
-        return df
+        return get_snapshot(file_path)
     except Exception as e:
         raise Exception(f"加载Excel文件失败: {e}")
 
 
+def load_excel_data(file_path: str) -> pd.DataFrame:
+    """加载Excel数据（通过进程内快照缓存，返回的DataFrame只读）"""
+    return load_snapshot(file_path).df
+
+
+def get_pool_index(snapshot: InventorySnapshot) -> PoolMembershipIndex:
+    """获取快照的PSM×资源池成员索引，每个快照只构建一次"""
+    return snapshot.derive("pool_index", PoolMembershipIndex.build)
+
+
+def _collect(records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """收集流式生成的记录，超过时间预算时把已收集的记录作为部分结果附在异常上"""
+    collected = []
+    try:
+        for record in records:
+            collected.append(record)
+    except BudgetExceeded as e:
+        e.partial = collected
+        raise
+    return collected
+
+
 def filter_by_idc(df: pd.DataFrame, idc_list: Optional[List[str]]) -> pd.DataFrame:
-    """按机房过滤数据"""
-    if not idc_list:
-        return df.copy()
-    return df[df["idc"].isin(idc_list)].copy()
+    """按机房过滤数据（需要同时过滤多个条件时使用default_cluster_rows，只物化一次）"""
+    return RowFilter(df).isin("idc", idc_list).frame()
 
 
 def filter_default_clusters(df: pd.DataFrame) -> pd.DataFrame:
     """过滤出cluster_name为default的数据"""
-    return df[df["cluster_name"] == "default"].copy()
+    return RowFilter(df).equals("cluster_name", "default").frame()
+
+
+def default_cluster_rows(df: pd.DataFrame, idc_list: Optional[List[str]] = None) -> RowFilter:
+    """指定机房中的default集群，与依次执行filter_by_idc、filter_default_clusters选中的行相同，但不复制数据"""
+    return RowFilter(df).isin("idc", idc_list).equals("cluster_name", "default")
+
+
+def _pool_mask(df: pd.DataFrame, pool: Tuple[str, str]) -> np.ndarray:
+    """返回属于指定资源池(physical_cluster, iaas_cluster)的行的布尔掩码（按字符串形式比较）"""
+    return RowFilter(df).text_equals("physical_cluster", str(pool[0])).text_equals("iaas_cluster", str(pool[1])).mask
 
 
 def find_psm_in_both_pools(
@@ -41,44 +80,68 @@ def find_psm_in_both_pools(
     找到同时部署在两个资源池中的psm服务
     
     Args:
-        df: 过滤后的DataFrame
+        df: 过滤后的DataFrame（不会被修改）
         pool1: (physical_cluster, iaas_cluster) 第一个资源池（需要借出资源的集群）
         pool2: (physical_cluster, iaas_cluster) 第二个资源池（可以补充资源的集群）
     
     Returns:
-        包含同时部署在两个资源池的psm的DataFrame
+        包含同时部署在两个资源池的psm的DataFrame，附带pool_key和pool_identifier列
     """
-    # 创建资源池标识符
-    def create_pool_key(row):
-        return f"{row['physical_cluster']}/{row['iaas_cluster']}"
+    # 分别标记两个资源池中的行
+    in_pool1 = _pool_mask(df, pool1)
+    in_pool2 = _pool_mask(df, pool2)
     
-    df["pool_key"] = df.apply(create_pool_key, axis=1)
+    # 两个资源池中psm集合的交集即为同时部署的psm
+    psms_in_pool1 = pd.Index(df.loc[in_pool1, "psm"].dropna().unique())
+    psms_in_pool2 = pd.Index(df.loc[in_pool2, "psm"].dropna().unique())
+    valid_psms = psms_in_pool1.intersection(psms_in_pool2)
     
-    # 定义两个资源池的key
-    pool1_key = f"{pool1[0]}/{pool1[1]}"
-    pool2_key = f"{pool2[0]}/{pool2[1]}"
+    # 只保留在指定两个资源池中的数据，物化一次
+    result_df = RowFilter(df, in_pool1 | in_pool2).where(isin_mask(df["psm"], valid_psms)).frame()
     
-    # 按psm分组，检查每个psm是否同时存在于两个资源池
-    psm_groups = df.groupby("psm")
+    # 添加资源池标识列：先编码资源池，只为每个资源池拼接一次字符串
+    pool_codes, pool_keys = encode_pools(result_df)
+    result_df["pool_key"] = np.asarray(pool_keys, dtype=object)[pool_codes]
+    result_df["pool_identifier"] = result_df["pool_key"]
     
-    valid_psms = []
-    for psm, group in psm_groups:
-        pools = set(group["pool_key"].unique())
-        if pool1_key in pools and pool2_key in pools:
-            valid_psms.append(psm)
+    return result_df
+
+
+def find_psm_in_both_pools_indexed(
+    snapshot: InventorySnapshot,
+    pool1: Tuple[str, str],
+    pool2: Tuple[str, str],
+    idc_list: Optional[List[str]] = None,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    基于快照索引查找同时部署在两个资源池中的psm服务
+    结果与依次执行filter_by_idc、filter_default_clusters、find_psm_in_both_pools相同
     
-    # 只保留在指定两个资源池中的数据
-    result_df = df[
-        df["psm"].isin(valid_psms)
-        & ((df["pool_key"] == pool1_key) | (df["pool_key"] == pool2_key))
-    ].copy()
+    Args:
+        snapshot: 数据快照
+        pool1: (physical_cluster, iaas_cluster) 第一个资源池
+        pool2: (physical_cluster, iaas_cluster) 第二个资源池
+        idc_list: 机房列表，为空时不过滤
+        columns: 只取出这些列（另加pool_key和pool_identifier列），为空时取全部列
+    """
+    index = get_pool_index(snapshot)
+    positions = index.both_pools_rows(pool1, pool2, idc_list)
     
-    # 添加资源池标识列
+    result_df = take(snapshot.df, positions, columns)
+    result_df["pool_key"] = index.pool_keys_of(positions)
     result_df["pool_identifier"] = result_df["pool_key"]
     
     return result_df
 
 
+def _idc_key(idc_list: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    """机房列表规整为缓存键：去重排序，空列表视为不过滤"""
+    return tuple(sorted(set(idc_list))) if idc_list else None
+
+
+@memoize_query(lambda pool1, pool2, idc_list=None: (pool1, pool2, _idc_key(idc_list)))
+@traced()
 def analyze_resource_migration(
     file_path: str,
     pool1: str,
@@ -90,27 +153,79 @@ def analyze_resource_migration(
     查找可从第一个资源池腾挪到第二个资源池的服务
     """
     # 1. 加载数据
-    df = load_excel_data(file_path)
+    snapshot = load_snapshot(file_path)
     
-    # 2. 按机房过滤
-    if idc_list:
-        df = filter_by_idc(df, idc_list)
+    # 2. 解析资源池
+    pool1_tuple = _parse_pool(pool1)
+    pool2_tuple = _parse_pool(pool2)
     
-    # 3. 过滤default集群
-    filtered_df = filter_default_clusters(df)
+    # 3. 在索引上按机房查找同时部署在两个资源池的default集群
+    checkpoint()
+    with span("find_psm_in_both_pools"):
+        result_df = find_psm_in_both_pools_indexed(
+            snapshot, pool1_tuple, pool2_tuple, idc_list, MIGRATION_OUTPUT_COLUMNS + ["package"]
+        )
     
-    # 4. 解析资源池
+    return _build_migration_result(result_df, pool1, pool2)
+
+
+# 资源腾挪详细数据的输出列，package列有值时插入在第3列
+MIGRATION_OUTPUT_COLUMNS = [
+    "psm", "pool_identifier", "physical_cluster", "iaas_cluster",
+    "instance_num", "cpu_limit", "mem_limit", "cluster_name",
+    "dept_level1", "dept_level2", "host_type", "idc"
+]
+
+
+def _parse_pool(pool: str) -> Tuple[str, str]:
+    """解析'Physical Cluster/IaaS Cluster'格式的资源池"""
     try:
-        pool1_physical, pool1_iaas = pool1.split("/")
-        pool2_physical, pool2_iaas = pool2.split("/")
+        physical, iaas = pool.split("/")
     except ValueError:
         raise Exception("资源池格式错误，请使用'Physical Cluster/IaaS Cluster'格式")
+    return physical, iaas
+
+
+def _source_pool_instances(pool_df: pd.DataFrame) -> pd.Series:
+    """
+    源资源池中每个psm的instance_num，索引为psm
+    同一psm有多行时取最后一行，无法转换为整数的按0计
+    """
+    instance_num = pool_df["instance_num"]
+    if not pd.api.types.is_integer_dtype(instance_num):
+        values = pd.to_numeric(instance_num, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        instance_num = pd.Series(np.where(np.isfinite(values), values, 0).astype(int), index=pool_df.index)
+    last = ~pool_df["psm"].duplicated(keep="last").to_numpy()
+    return pd.Series(
+        instance_num.to_numpy()[last], index=pd.Index(pool_df["psm"].to_numpy(dtype=object)[last])
+    )
+
+
+def _sort_by_source_pool(df: pd.DataFrame, psm_to_instance: pd.Series) -> pd.DataFrame:
+    """
+    按psm在源资源池的instance_num降序、psm和pool_identifier升序排序，同一服务在两个资源池的数据相邻
+    排序键由psm_to_instance按psm一次查出（不在源资源池的psm按0计），只做一次多列稳定排序
+    """
+    positions = psm_to_instance.index.get_indexer(df["psm"].to_numpy(dtype=object))
+    if len(psm_to_instance):
+        sort_key = np.where(positions >= 0, psm_to_instance.to_numpy()[positions], 0)
+    else:
+        sort_key = np.zeros(len(df), dtype=int)
+    return df.assign(sort_key=sort_key).sort_values(
+        by=["sort_key", "psm", "pool_identifier"], ascending=[False, True, True]
+    ).drop(columns=["sort_key"])
+
+
+def _build_migration_result(result_df: pd.DataFrame, pool1: str, pool2: str) -> Dict[str, Any]:
+    """
+    由匹配到的行生成资源腾挪结果（详细数据、汇总、统计）
     
-    pool1_tuple = (pool1_physical, pool1_iaas)
-    pool2_tuple = (pool2_physical, pool2_iaas)
-    
-    # 5. 查找同时部署的psm
-    result_df = find_psm_in_both_pools(filtered_df, pool1_tuple, pool2_tuple)
+    Args:
+        result_df: 同时部署在两个资源池的行，带pool_identifier列
+        pool1: 第一个资源池（需要借出资源的集群）
+        pool2: 第二个资源池（可以补充资源的集群）
+    """
+    pool1_tuple = _parse_pool(pool1)
     
     if len(result_df) == 0:
         return {
@@ -120,11 +235,7 @@ def analyze_resource_migration(
         }
     
     # 准备输出数据
-    output_columns = [
-        "psm", "pool_identifier", "physical_cluster", "iaas_cluster",
-        "instance_num", "cpu_limit", "mem_limit", "cluster_name",
-        "dept_level1", "dept_level2", "host_type", "idc"
-    ]
+    output_columns = list(MIGRATION_OUTPUT_COLUMNS)
     
     # 检查是否有package字段，且不为空
     if (
@@ -134,79 +245,60 @@ def analyze_resource_migration(
     ):
         output_columns.insert(2, "package")
     
-    # 确保所有需要的列都存在
+    # 确保所有需要的列都存在；只投影需要的列，写时复制下不复制数据
     available_columns = [col for col in output_columns if col in result_df.columns]
-    output_df = result_df[available_columns].copy()
+    output_df = result_df[available_columns]
     
     # 确保instance_num是数值类型
     try:
-        output_df["instance_num"] = pd.to_numeric(
-            output_df["instance_num"], errors="coerce"
+        output_df = output_df.assign(
+            instance_num=pd.to_numeric(output_df["instance_num"], errors="coerce").fillna(0).astype(int)
         )
-        output_df["instance_num"] = output_df["instance_num"].fillna(0).astype(int)
     except Exception as e:
         print(f"警告: 转换instance_num为数值类型时出错: {e}")
     
-    # 按照第一个资源池的instance_num排序并将同一服务在两个资源池的数据相邻排列
-    pool1_key = f"{pool1_tuple[0]}/{pool1_tuple[1]}"
-    pool1_df = output_df[output_df["pool_identifier"] == pool1_key].copy()
-    
-    # 创建一个psm到instance_num的映射
-    psm_to_instance = {}
-    for _, row in pool1_df.iterrows():
-        try:
-            instance_num = int(row["instance_num"])
-        except (ValueError, TypeError):
-            instance_num = 0
-        psm_to_instance[row["psm"]] = instance_num
-    
-    # 为所有行添加排序列
-    def get_sort_key(row):
-        return psm_to_instance.get(row["psm"], 0)
-    
-    output_df["sort_key"] = output_df.apply(get_sort_key, axis=1)
-    
-    # 排序
-    sorted_df = output_df.sort_values(
-        by=["sort_key", "psm", "pool_identifier"], ascending=[False, True, True]
-    ).drop(columns=["sort_key"])
+    with span("sort"):
+        # 按照第一个资源池的instance_num排序并将同一服务在两个资源池的数据相邻排列
+        pool1_key = f"{pool1_tuple[0]}/{pool1_tuple[1]}"
+        pool1_df = output_df[output_df["pool_identifier"] == pool1_key]
+        
+        # psm到其在第一个资源池的instance_num的映射，详细数据和汇总共用
+        psm_to_instance = _source_pool_instances(pool1_df)
+        
+        checkpoint()
+        sorted_df = _sort_by_source_pool(output_df, psm_to_instance)
     
     # 生成汇总信息
-    summary_columns = ["instance_num", "cpu_limit", "mem_limit"]
-    result_df_for_summary = result_df.copy()
-    
-    for col in summary_columns:
-        if col in result_df_for_summary.columns:
+    checkpoint()
+    with span("summary"):
+        summary_columns = ["instance_num", "cpu_limit", "mem_limit"]
+        
+        # 定义汇总列
+        group_columns = ["psm", "pool_identifier"]
+        if (
+            "package" in result_df.columns
+            and result_df["package"].notna().any()
+            and (result_df["package"] != "").any()
+        ):
+            group_columns.append("package")
+        
+        # 只取出分组和汇总用到的列
+        result_df_for_summary = result_df[group_columns + summary_columns]
+        for col in summary_columns:
             try:
-                result_df_for_summary[col] = pd.to_numeric(
-                    result_df_for_summary[col], errors="coerce"
+                result_df_for_summary = result_df_for_summary.assign(
+                    **{col: pd.to_numeric(result_df_for_summary[col], errors="coerce").fillna(0)}
                 )
-                result_df_for_summary[col] = result_df_for_summary[col].fillna(0)
             except Exception:
                 print(f"警告: 转换{col}为数值类型时出错")
-    
-    # 定义汇总列
-    group_columns = ["psm", "pool_identifier"]
-    if (
-        "package" in result_df_for_summary.columns
-        and result_df_for_summary["package"].notna().any()
-        and (result_df_for_summary["package"] != "").any()
-    ):
-        group_columns.append("package")
-    
-    agg_dict = {"instance_num": "sum", "cpu_limit": "sum", "mem_limit": "sum"}
-    summary_df = (
-        result_df_for_summary.groupby(group_columns).agg(agg_dict).reset_index()
-    )
-    
-    # 对汇总信息排序
-    summary_df["sort_key"] = summary_df.apply(
-        lambda row: psm_to_instance.get(row["psm"], 0), axis=1
-    )
-    
-    sorted_summary_df = summary_df.sort_values(
-        by=["sort_key", "psm", "pool_identifier"], ascending=[False, True, True]
-    ).drop(columns=["sort_key"])
+        
+        agg_dict = {"instance_num": "sum", "cpu_limit": "sum", "mem_limit": "sum"}
+        summary_df = (
+            result_df_for_summary.groupby(group_columns, observed=True).agg(agg_dict).reset_index()
+        )
+        
+        # 对汇总信息排序
+        sorted_summary_df = _sort_by_source_pool(summary_df, psm_to_instance)
     
     # 统计信息
     stats_data = {
@@ -219,30 +311,419 @@ def analyze_resource_migration(
     return {
         "status": "success",
         "data": {
-            "detail": sorted_df,
-            "summary": sorted_summary_df,
+            "detail": plain_dtypes(sorted_df),
+            "summary": plain_dtypes(sorted_summary_df),
             "stats": stats_df
         }
     }
 
 
-def analyze_recommended_scaling(
+def _build_batch_migration_data(
+    result_df: pd.DataFrame,
+    candidate: np.ndarray,
+    in_target: np.ndarray,
+    target_pool: str,
+    candidates: List[str]
+) -> List[Optional[Dict[str, pd.DataFrame]]]:
+    """
+    一次生成所有候选池的资源腾挪结果，每个候选池的结果与_build_migration_result相同
+    
+    Args:
+        result_df: 所有候选池匹配到的行，带pool_identifier列，按(候选池, 行位置)排序
+        candidate: 每一行所属候选池的下标
+        in_target: 每一行是否属于目标资源池
+        target_pool: 目标资源池
+        candidates: 候选资源池列表
+    
+    Returns:
+        每个候选池的data（detail、summary、stats），没有匹配时为None
+    """
+    n = len(candidates)
+    frame = result_df.assign(_candidate=candidate)
+    
+    # 每个候选池是否输出package列
+    if "package" in frame.columns:
+        package = frame["package"]
+        has_value = package.notna() & (package != "")
+        with_package = np.bincount(candidate[has_value.to_numpy(dtype=bool)], minlength=n) > 0
+    else:
+        with_package = np.zeros(n, dtype=bool)
+    
+    # 每个候选池中psm在目标资源池的instance_num（同一psm有多行时取最后一行）
+    instance_num = pd.to_numeric(frame["instance_num"], errors="coerce").fillna(0).astype(int)
+    psm_instance = (
+        pd.DataFrame({"_candidate": candidate[in_target], "psm": frame["psm"].to_numpy()[in_target],
+                      "sort_key": instance_num.to_numpy()[in_target]})
+        .drop_duplicates(["_candidate", "psm"], keep="last")
+    )
+    
+    def with_sort_key(df: pd.DataFrame) -> pd.DataFrame:
+        keys = df[["_candidate", "psm"]].astype({"psm": object}).merge(
+            psm_instance.astype({"psm": object}), how="left", on=["_candidate", "psm"]
+        )["sort_key"]
+        return df.assign(sort_key=keys.fillna(0).astype(int).to_numpy())
+    
+    sort_by = ["_candidate", "sort_key", "psm", "pool_identifier"]
+    ascending = [True, False, True, True]
+    
+    # 详细数据：所有候选池一起排序，再按候选池切分
+    output_columns = [col for col in MIGRATION_OUTPUT_COLUMNS if col in frame.columns]
+    if "package" in frame.columns:
+        output_columns.insert(2, "package")
+    detail = frame[output_columns + ["_candidate"]].assign(instance_num=instance_num)
+    detail = plain_dtypes(with_sort_key(detail).sort_values(by=sort_by, ascending=ascending))
+    detail_bounds = np.searchsorted(detail["_candidate"].to_numpy(), np.arange(n + 1))
+    
+    # 汇总：按是否输出package列分别分组
+    summary_frame = frame.copy()
+    for col in ["instance_num", "cpu_limit", "mem_limit"]:
+        if col in summary_frame.columns:
+            summary_frame[col] = pd.to_numeric(summary_frame[col], errors="coerce").fillna(0)
+    agg_dict = {"instance_num": "sum", "cpu_limit": "sum", "mem_limit": "sum"}
+    summaries: Dict[int, pd.DataFrame] = {}
+    for flag in (False, True):
+        selected = with_package[candidate] == flag
+        if not selected.any():
+            continue
+        group_columns = ["_candidate", "psm", "pool_identifier"] + (["package"] if flag else [])
+        grouped = (
+            summary_frame[selected].groupby(group_columns, observed=True).agg(agg_dict).reset_index()
+        )
+        # 每个候选池的汇总各自从0开始编号，与单独分析时的索引一致
+        grouped.index = grouped.groupby("_candidate").cumcount().to_numpy()
+        grouped = plain_dtypes(with_sort_key(grouped).sort_values(by=sort_by, ascending=ascending))
+        bounds = np.searchsorted(grouped["_candidate"].to_numpy(), np.arange(n + 1))
+        for j in np.flatnonzero(with_package == flag):
+            summaries[j] = grouped.iloc[bounds[j]:bounds[j + 1]].drop(columns=["_candidate", "sort_key"])
+    
+    # 每个候选池的匹配psm数
+    psm_counts = (
+        pd.DataFrame({"_candidate": candidate, "psm": frame["psm"].to_numpy()})
+        .dropna().drop_duplicates()["_candidate"].to_numpy()
+    )
+    psm_counts = np.bincount(psm_counts, minlength=n)
+    
+    results: List[Optional[Dict[str, pd.DataFrame]]] = []
+    for j, pool in enumerate(candidates):
+        if detail_bounds[j] == detail_bounds[j + 1]:
+            results.append(None)
+            continue
+        drop_columns = ["_candidate", "sort_key"] + ([] if with_package[j] else ["package"])
+        results.append({
+            "detail": detail.iloc[detail_bounds[j]:detail_bounds[j + 1]].drop(columns=drop_columns),
+            "summary": summaries[j],
+            "stats": pd.DataFrame({
+                "资源池1(需借出)": [target_pool],
+                "资源池2(可补充)": [pool],
+                "PSM数量": [int(psm_counts[j])],
+            }),
+        })
+    return results
+
+
+def _resource_totals(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """instance_num、cpu_limit、mem_limit三列转为数值数组，非数值按0计"""
+    return {
+        col: pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy(dtype=float)
+        for col in ["instance_num", "cpu_limit", "mem_limit"]
+    }
+
+
+def _resource_summary(instances: float, cpu: float, memory: float) -> Dict[str, Any]:
+    return {
+        "total_instances": int(instances),
+        "total_cpu": round(float(cpu), 2),
+        "total_memory": round(float(memory), 2),
+    }
+
+
+def parse_pool_list(pools: Any) -> List[str]:
+    """解析逗号分隔的资源池字符串或列表，去掉空值并按首次出现的顺序去重"""
+    if isinstance(pools, str):
+        pools = pools.replace("\n", ",").split(",")
+    result = []
+    for pool in pools or []:
+        pool = str(pool).strip()
+        if pool and pool not in result:
+            result.append(pool)
+    return result
+
+
+@memoize_query(
+    lambda target_pool, candidate_pools, idc_list=None, include_detail=True: (
+        target_pool, tuple(parse_pool_list(candidate_pools)), _idc_key(idc_list), include_detail
+    )
+)
+@traced()
+def analyze_batch_migration(
     file_path: str,
-    idc: str,
-    physical_cluster: str,
-    min_save_cores: int = 0
-) -> List[Dict[str, Any]]:
+    target_pool: str,
+    candidate_pools: Any,
+    idc_list: Optional[List[str]] = None,
+    include_detail: bool = True
+) -> Dict[str, Any]:
     """
-    功能2: 推荐缩容分析
-    查找指定机房和资源池中可缩容的default集群
+    批量资源腾挪分析：一个目标资源池对多个候选资源池
+    所有候选池在索引上一次完成匹配和资源汇总，耗时基本不随候选池数量增长；
+    每个候选池的详细结果与analyze_resource_migration(target_pool, 候选池)相同。
+    
+    Args:
+        file_path: 数据文件路径
+        target_pool: 目标资源池（需要借出资源的集群）
+        candidate_pools: 候选资源池，逗号分隔的字符串或列表
+        idc_list: 机房列表，为空时不过滤
+        include_detail: 是否生成每个候选池的详细数据和汇总，为False时只返回统计和排名
+    
+    Returns:
+        data中包含目标池统计(target_stats)、每个候选池的结果(results)和候选池排名(ranking)
     """
-    # 1. 加载数据
-    df = load_excel_data(file_path)
+    snapshot = load_snapshot(file_path)
+    index = get_pool_index(snapshot)
+    df = snapshot.df
+    
+    target_tuple = _parse_pool(target_pool)
+    candidates = parse_pool_list(candidate_pools)
+    if not candidates:
+        raise Exception("请输入至少一个候选资源池")
+    candidate_tuples = [_parse_pool(c) for c in candidates]
+    
+    # 目标资源池的整体资源
+    target_rows = index.pool_rows(target_tuple, idc_list)
+    target_df = df.iloc[target_rows]
+    target_values = _resource_totals(target_df)
+    target_stats = {
+        "psm_count": int(target_df["psm"].nunique()),
+        **_resource_summary(*(target_values[col].sum() for col in target_values)),
+    }
+    
+    # 一次匹配所有候选池：positions为匹配行，candidate为所属候选池下标
+    checkpoint()
+    with span("match_candidates"):
+        positions, candidate = index.match_candidates(target_tuple, candidate_tuples, idc_list)
+    matched_df = df.iloc[positions]
+    n = len(candidates)
+    
+    # 每个候选池的匹配PSM数
+    psm_codes, _ = pd.factorize(matched_df["psm"])
+    pairs = pd.DataFrame({"candidate": candidate, "psm": psm_codes}).drop_duplicates()
+    psm_counts = np.bincount(pairs["candidate"].to_numpy(), minlength=n)
+    
+    # 按目标池/候选池两侧分别汇总资源
+    pool_keys = index.pool_keys_of(positions)
+    is_target = index.pool_codes_of(positions) == index.pool_code(target_tuple)
+    values = _resource_totals(matched_df)
+    sums = {}
+    for side, mask in (("target", is_target), ("candidate", ~is_target)):
+        sums[side] = {
+            col: np.bincount(candidate[mask], weights=values[col][mask], minlength=n)
+            for col in values
+        }
+    
+    # 所有候选池的详细数据和汇总一次生成
+    details = None
+    if include_detail:
+        checkpoint()
+        result_df = matched_df.assign(pool_key=pool_keys, pool_identifier=pool_keys)
+        with span("detail"):
+            details = _build_batch_migration_data(result_df, candidate, is_target, target_pool, candidates)
+    
+    results = {}
+    ranking = []
+    for j, pool in enumerate(candidates):
+        target_resources = _resource_summary(*(sums["target"][col][j] for col in values))
+        candidate_resources = _resource_summary(*(sums["candidate"][col][j] for col in values))
+        if pool == target_pool:
+            # 目标池与候选池相同时，所有行都同时属于两侧
+            candidate_resources = target_resources
+        entry = {
+            "status": "success" if psm_counts[j] else "empty",
+            "matching_psm_count": int(psm_counts[j]),
+            "target_pool_resources": target_resources,
+            "candidate_pool_resources": candidate_resources,
+            "data": None,
+        }
+        if details is not None:
+            entry["data"] = details[j]
+        results[pool] = entry
+        ranking.append({
+            "candidate_pool": pool,
+            "matching_psm_count": entry["matching_psm_count"],
+            "movable_instances": target_resources["total_instances"],
+            "movable_cpu": target_resources["total_cpu"],
+            "movable_memory": target_resources["total_memory"],
+            **{f"candidate_{k}": v for k, v in candidate_resources.items()},
+        })
+    
+    # 排名：匹配PSM数、可腾挪实例数、可腾挪CPU依次降序，相同时保持输入顺序
+    ranking.sort(key=lambda r: (-r["matching_psm_count"], -r["movable_instances"], -r["movable_cpu"]))
+    for rank, row in enumerate(ranking, start=1):
+        row["rank"] = rank
+    
+    has_matches = any(entry["matching_psm_count"] for entry in results.values())
+    return {
+        "status": "success" if has_matches else "empty",
+        "message": None if has_matches else "没有候选资源池与目标资源池存在共同的psm",
+        "data": {
+            "target_pool": target_pool,
+            "candidate_pools": candidates,
+            "target_stats": target_stats,
+            "results": results,
+            "ranking": ranking,
+        }
+    }
+
+
+def _finite_or_none(value: float) -> Optional[float]:
+    """不限容量(inf)转为None，便于JSON输出"""
+    return None if np.isinf(value) else round(float(value), 2)
+
+
+@memoize_query(
+    lambda source_pool, headroom, cpu_target=0, mem_target=0, idc_list=None, time_budget=DEFAULT_TIME_BUDGET: (
+        source_pool, headroom_key(parse_headroom(headroom)), float(cpu_target or 0), float(mem_target or 0),
+        _idc_key(idc_list), float(time_budget)
+    )
+)
+@traced()
+def plan_resource_migration(
+    file_path: str,
+    source_pool: str,
+    headroom: Any,
+    cpu_target: float = 0,
+    mem_target: float = 0,
+    idc_list: Optional[List[str]] = None,
+    time_budget: float = DEFAULT_TIME_BUDGET
+) -> Dict[str, Any]:
+    """
+    资源腾挪规划：从源资源池选出一组集群迁移到目标资源池，释放指定的CPU/内存
+    候选集群是源资源池中、PSM同时部署在目标资源池的default集群，
+    即find_psm_in_both_pools(源资源池, 目标资源池)结果中属于源资源池的行。
+    
+    Args:
+        file_path: 数据文件路径
+        source_pool: 源资源池（需要释放资源的集群）
+        headroom: 目标资源池及其剩余容量，格式见migration_planner.parse_headroom
+        cpu_target: 需要释放的CPU核数
+        mem_target: 需要释放的内存
+        idc_list: 机房列表，为空时不过滤
+        time_budget: 求解的时间预算（秒）
+    
+    Returns:
+        data中包含迁移方案(plan)、达成情况(summary)、各目标资源池的用量(targets)和求解统计(solver)
+    """
+    if not (float(cpu_target or 0) > 0 or float(mem_target or 0) > 0):
+        raise Exception("请指定需要释放的CPU或内存")
+    source_tuple = _parse_pool(source_pool)
+    capacity = parse_headroom(headroom)
+    targets = [pool for pool in capacity if pool != source_pool]
+    if not targets:
+        raise Exception("请指定至少一个目标资源池")
+    target_tuples = [_parse_pool(pool) for pool in targets]
+    
+    snapshot = load_snapshot(file_path)
+    index = get_pool_index(snapshot)
+    df = snapshot.df
+    
+    # 一次匹配所有目标资源池，只保留源资源池中的行作为候选集群
+    with span("match_candidates"):
+        positions, target_of = index.match_candidates(source_tuple, target_tuples, idc_list)
+    in_source = index.pool_codes_of(positions) == index.pool_code(source_tuple)
+    rows, target_of = positions[in_source], target_of[in_source]
+    
+    # 同一集群可迁移到多个目标资源池：按集群分组得到可选目标
+    candidate_rows, inverse = np.unique(rows, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(candidate_rows) + 1))
+    allowed = np.split(target_of[order], bounds[1:-1])
+    
+    candidates_df = df.iloc[candidate_rows]
+    values = _resource_totals(candidates_df)
+    headroom_cpu = np.array([capacity[pool]["cpu"] for pool in targets])
+    headroom_mem = np.array([capacity[pool]["mem"] for pool in targets])
+    
+    with span("solve"):
+        solution = solve_migration_plan(
+            values["cpu_limit"], values["mem_limit"], values["instance_num"].astype(int), allowed,
+            headroom_cpu, headroom_mem, cpu_target, mem_target, time_budget
+        )
+    assignment = solution.pop("assignment")
+    moved = assignment >= 0
+    
+    # 迁移方案：按目标资源池、CPU降序排列
+    plan_columns = ["psm", "cluster_id", "cluster_name", "idc", "physical_cluster", "iaas_cluster"]
+    plan_df = candidates_df.loc[:, [col for col in plan_columns if col in candidates_df.columns]][moved].copy()
+    plan_df.insert(1, "source_pool", source_pool)
+    plan_df.insert(2, "target_pool", np.asarray(targets, dtype=object)[assignment[moved]])
+    plan_df["instance_num"] = values["instance_num"][moved].astype(int)
+    plan_df["cpu_limit"] = values["cpu_limit"][moved]
+    plan_df["mem_limit"] = values["mem_limit"][moved]
+    plan_df = plain_dtypes(plan_df.sort_values(
+        by=["target_pool", "cpu_limit", "psm"], ascending=[True, False, True], kind="mergesort"
+    ))
+    
+    # 各目标资源池的用量
+    moved_to = assignment[moved]
+    target_usage = []
+    for j, pool in enumerate(targets):
+        selected = moved_to == j
+        target_usage.append({
+            "target_pool": pool,
+            "clusters": int(selected.sum()),
+            "cpu_used": round(float(values["cpu_limit"][moved][selected].sum()), 2),
+            "mem_used": round(float(values["mem_limit"][moved][selected].sum()), 2),
+            "cpu_headroom": _finite_or_none(headroom_cpu[j]),
+            "mem_headroom": _finite_or_none(headroom_mem[j]),
+        })
+    
+    achieved_cpu = float(values["cpu_limit"][moved].sum())
+    achieved_mem = float(values["mem_limit"][moved].sum())
+    summary = {
+        "source_pool": source_pool,
+        "cpu_target": float(cpu_target or 0),
+        "mem_target": float(mem_target or 0),
+        "achieved_cpu": round(achieved_cpu, 2),
+        "achieved_mem": round(achieved_mem, 2),
+        "met": solution["met"],
+        "moved_clusters": int(moved.sum()),
+        "moved_psms": int(plan_df["psm"].nunique()),
+        "moved_instances": int(plan_df["instance_num"].sum()),
+        "candidate_clusters": len(candidate_rows),
+        "max_cpu": round(float(values["cpu_limit"].sum()), 2),
+        "max_mem": round(float(values["mem_limit"].sum()), 2),
+    }
+    
+    if len(candidate_rows) == 0:
+        status, message = "empty", "源资源池中没有可迁移到目标资源池的集群"
+    elif not solution["met"]:
+        status, message = "partial", "在目标资源池的容量内无法完全达成释放目标，已给出释放最多的方案"
+    else:
+        status, message = "success", None
+    
+    return {
+        "status": status,
+        "message": message,
+        "data": {
+            "plan": plan_df,
+            "summary": summary,
+            "targets": target_usage,
+            "solver": solution,
+        }
+    }
+
+
+def _eligible_save_cores(
+    file_path: str, idc: str, physical_cluster: str, min_save_cores: int = 0
+) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    选出指定机房和资源池中save_cores >= min_save_cores的集群
     
-    # 2. 按机房过滤
-    df = df[df["idc"] == idc].copy() if idc else df.copy()
+    Returns:
+        (快照中的数据, 符合条件的save_cores（整数，索引为快照中的行索引，保持原顺序）)
+    """
+    # 1. 加载数据（save_cores已在加载快照时转换为数值）
+    df = load_excel_data(file_path)
     
-    # 3. 解析物理集群和IaaS集群
+    # 2. 解析物理集群和IaaS集群
     try:
         physical, iaas = physical_cluster.split("/")
     except ValueError:
@@ -250,67 +731,155 @@ def analyze_recommended_scaling(
         physical = physical_cluster
         iaas = "default"
     
-    # 4. 按物理集群和IaaS集群过滤
-    filtered_df = df[
-        (df["physical_cluster"] == physical) & 
-        (df["iaas_cluster"] == iaas)
-    ].copy()
+    # 3. 按机房、物理集群和IaaS集群组合过滤条件，不复制数据
+    rows = RowFilter(df).equals("physical_cluster", physical).equals("iaas_cluster", iaas)
+    if idc:
+        rows = rows.equals("idc", idc)
     
-    # 5. 过滤有效数据
-    if len(filtered_df) == 0:
+    # 4. 过滤有效数据
+    if len(rows) == 0:
         raise Exception(f"没有找到{idc}机房{physical_cluster}资源池中的数据")
     
-    # 6. 处理save_cores字段
-    if "save_cores" not in filtered_df.columns:
+    # 5. 处理save_cores字段，只取出用到的列
+    if "save_cores" in df.columns:
+        save_cores = parse_save_cores(rows.column("save_cores"))
+    elif all(col in df.columns for col in ["cpu_limit", "cpu_request"]):
         # 如果没有save_cores字段，尝试从其他相关字段计算
-        if all(col in filtered_df.columns for col in ["cpu_limit", "cpu_request"]):
-            filtered_df["save_cores"] = filtered_df["cpu_limit"] - filtered_df["cpu_request"]
-        else:
-            raise Exception("数据中没有save_cores字段，也无法从其他字段计算")
+        save_cores = parse_save_cores(rows.column("cpu_limit") - rows.column("cpu_request"))
+    else:
+        raise Exception("数据中没有save_cores字段，也无法从其他字段计算")
     
-    # 7. 转换save_cores为数值类型
+    # 6. 去掉无法解析的值并取整
     try:
-        # 处理可能的字符串值
-        filtered_df["save_cores"] = filtered_df["save_cores"].astype(str)
-        filtered_df["save_cores"] = filtered_df["save_cores"].str.strip()
-        filtered_df = filtered_df[filtered_df["save_cores"] != ""].copy()
-        filtered_df["save_cores"] = pd.to_numeric(filtered_df["save_cores"], errors="coerce")
-        filtered_df = filtered_df.dropna(subset=["save_cores"]).copy()
-        filtered_df["save_cores"] = filtered_df["save_cores"].astype(int)
+        save_cores = save_cores[save_cores.notna()].astype(int)
     except Exception as e:
         raise Exception(f"处理save_cores字段时出错: {str(e)}")
     
-    # 8. 过滤出建议缩容的集群（save_cores >= min_save_cores）
-    recommended_df = filtered_df[filtered_df["save_cores"] >= min_save_cores].copy()
-    
-    if len(recommended_df) == 0:
-        return []
-    
-    # 9. 按save_cores降序排序
-    recommended_df = recommended_df.sort_values(by="save_cores", ascending=False)
-    
-    # 10. 准备返回数据，确保包含前端模板需要的字段
-    results = []
-    for _, row in recommended_df.iterrows():
-        # 为缺失的字段提供默认值
-        result_row = {
-            "psm": row.get("psm", "未知"),
-            "cluster_id": row.get("cluster_id", row.get("cluster_name", "未知")),
-            "package": row.get("package", ""),
-            "cpu_limit": row.get("cpu_limit", 0),
-            "mem_limit": row.get("mem_limit", 0),
-            "save_cores": row.get("save_cores", 0),
-            # 添加新的利用率字段
-            "cpu_util_max_1days": row.get("cpu_util_max_1days", ""),
-            "cpu_util_max_7days": row.get("cpu_util_max_7days", ""),
-            "mem_util_max_7days": row.get("mem_util_max_7days", ""),
-            "business_line": row.get("dept_level1", "") + "/" + row.get("dept_level2", "").strip("/")
-        }
-        results.append(result_row)
+    # 7. 过滤出建议缩容的集群（save_cores >= min_save_cores）
+    return df, save_cores[save_cores >= min_save_cores]
+
+
+def _top_save_cores(save_cores: pd.Series, top_k: Optional[int] = None) -> pd.Series:
+    """
+    按save_cores降序排列，相同时保持原顺序；指定top_k时只取前top_k个
+    取前top_k个时先用argpartition做部分选择，只对选中的部分排序，结果与完整排序后取前top_k个相同
+    """
+    values = save_cores.to_numpy()
+    n = len(values)
+    if top_k is not None and 0 <= top_k < n:
+        if top_k == 0:
+            return save_cores.iloc[:0]
+        # 第top_k大的值，大于它的全部入选，等于它的按原顺序补足
+        kth = values[np.argpartition(values, n - top_k)[n - top_k]]
+        greater = np.flatnonzero(values > kth)
+        ties = np.flatnonzero(values == kth)[:top_k - len(greater)]
+        selected = np.sort(np.concatenate((greater, ties)))
+    else:
+        selected = np.arange(n)
+    order = selected[np.argsort(-values[selected], kind="stable")]
+    return save_cores.iloc[order]
+
+
+def _recommended_records(recommended_df: pd.DataFrame, save_cores: pd.Series) -> pd.DataFrame:
+    """按列构造推荐缩容的返回数据，缺失的字段使用默认值，确保包含前端模板需要的字段"""
+    def column(name, default):
+        if name in recommended_df.columns:
+            return recommended_df[name].to_numpy(dtype=object)
+        return np.full(len(recommended_df), default, dtype=object)
+    
+    if "cluster_id" in recommended_df.columns:
+        cluster_id = column("cluster_id", "未知")
+    else:
+        cluster_id = column("cluster_name", "未知")
+    dept_level2 = pd.Series(column("dept_level2", ""), dtype=object).str.strip("/").to_numpy()
+    
+    return pd.DataFrame({
+        "psm": column("psm", "未知"),
+        "cluster_id": cluster_id,
+        "package": column("package", ""),
+        "cpu_limit": column("cpu_limit", 0),
+        "mem_limit": column("mem_limit", 0),
+        "save_cores": save_cores.to_numpy(),
+        # 利用率字段
+        "cpu_util_max_1days": column("cpu_util_max_1days", ""),
+        "cpu_util_max_7days": column("cpu_util_max_7days", ""),
+        "mem_util_max_7days": column("mem_util_max_7days", ""),
+        "business_line": column("dept_level1", "") + "/" + dept_level2,
+    })
+
+
+# 流式生成推荐缩容记录时每批构造的记录数
+RECORD_CHUNK_SIZE = 1000
+
+# 构造推荐缩容记录用到的列
+RECOMMENDED_SOURCE_COLUMNS = [
+    "psm", "cluster_id", "cluster_name", "package", "cpu_limit", "mem_limit",
+    "cpu_util_max_1days", "cpu_util_max_7days", "mem_util_max_7days", "dept_level1", "dept_level2",
+]
+
+
+@memoize_query(
+    lambda idc, physical_cluster, min_save_cores=0, top_k=None: (idc, physical_cluster, min_save_cores, top_k)
+)
+@traced()
+def analyze_recommended_scaling(
+    file_path: str,
+    idc: str,
+    physical_cluster: str,
+    min_save_cores: int = 0,
+    top_k: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    功能2: 推荐缩容分析
+    查找指定机房和资源池中可缩容的default集群，按save_cores降序排列
     
-    return results
+    Args:
+        top_k: 只返回save_cores最大的前top_k个集群，为空时返回全部
+    """
+    return _collect(iter_recommended_scaling(file_path, idc, physical_cluster, min_save_cores, top_k))
 
 
+def iter_recommended_scaling(
+    file_path: str,
+    idc: str,
+    physical_cluster: str,
+    min_save_cores: int = 0,
+    top_k: Optional[int] = None,
+    chunk_size: int = RECORD_CHUNK_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    推荐缩容的流式版本，逐条生成与analyze_recommended_scaling相同的记录，
+    记录按批构造，不会一次性在内存中生成全部记录
+    """
+    with span("filter"):
+        df, save_cores = _eligible_save_cores(file_path, idc, physical_cluster, min_save_cores)
+    checkpoint()
+    with span("select_top"):
+        save_cores = _top_save_cores(save_cores, top_k)
+    
+    # 按排序后的顺序一次取出选中的行和构造记录用到的列
+    recommended_df = take(df, df.index.get_indexer(save_cores.index), RECOMMENDED_SOURCE_COLUMNS)
+    for start in range(0, len(save_cores), chunk_size):
+        checkpoint()
+        chunk = save_cores.iloc[start:start + chunk_size]
+        yield from _recommended_records(recommended_df.iloc[start:start + chunk_size], chunk).to_dict("records")
+
+
+@memoize_query(lambda idc, physical_cluster, min_save_cores=0: (idc, physical_cluster, min_save_cores))
+@traced()
+def recommended_scaling_totals(
+    file_path: str,
+    idc: str,
+    physical_cluster: str,
+    min_save_cores: int = 0
+) -> Dict[str, int]:
+    """符合推荐缩容条件的集群总数和可节省的CPU总核数（不受top_k影响）"""
+    _, save_cores = _eligible_save_cores(file_path, idc, physical_cluster, min_save_cores)
+    return {"total_clusters": len(save_cores), "total_cpu": int(save_cores.sum())}
+
+
+@memoize_query(lambda idc, pool: (idc, pool))
+@traced()
 def analyze_migratable_clusters(
     file_path: str,
     idc: str,
@@ -328,6 +897,18 @@ def analyze_migratable_clusters(
     Returns:
         包含PSM信息的字典列表
     """
+    return _collect(iter_migratable_clusters(file_path, idc, pool))
+
+
+def iter_migratable_clusters(
+    file_path: str,
+    idc: str,
+    pool: str
+) -> Iterator[Dict[str, Any]]:
+    """
+    可腾挪集群查询的流式版本，逐条生成与analyze_migratable_clusters相同的记录，
+    供流式接口边计算边输出使用
+    """
     # 1. 解析资源池
     try:
         physical_cluster, iaas_cluster = pool.split("/")
@@ -337,69 +918,70 @@ def analyze_migratable_clusters(
         iaas_cluster = None
     
     # 2. 加载数据
-    df = load_excel_data(file_path)
-    
-    # 3. 按机房过滤
-    df = df[df["idc"] == idc].copy() if idc else df.copy()
-    
-    # 4. 过滤default集群
-    filtered_df = filter_default_clusters(df)
+    snapshot = load_snapshot(file_path)
+    df = snapshot.df
+    index = get_pool_index(snapshot)
+    idcs = [idc] if idc else None
     
-    # 5. 找出包含目标物理集群的PSM
-    target_psms = filtered_df[filtered_df["physical_cluster"] == physical_cluster]["psm"].unique()
+    # 3. 在索引上找出该机房default集群中包含目标物理集群的PSM（保持首次出现的顺序）
+    with span("find_target_psms"):
+        target_rows = index.physical_rows(physical_cluster, idcs)
+        target_psms = df["psm"].iloc[target_rows].dropna().unique()
     
     if len(target_psms) == 0:
-        # 返回空列表，而不是状态字典，以匹配应用程序的期望格式
-        return []
-    
-    # 6. 获取这些PSM在所有资源池的分布
-    result_df = filtered_df[filtered_df["psm"].isin(target_psms)].copy()
+        # 没有结果时不生成任何记录，而不是状态字典，以匹配应用程序的期望格式
+        return
+    
+    # 4. 获取这些PSM在所有资源池的分布，只取出用到的列
+    checkpoint()
+    main_columns = [
+        col for col in
+        ["instance_num", "cpu_limit", "mem_limit", "dept_level1", "dept_level2", "package", "cluster_id"]
+        if col in df.columns
+    ]
+    positions = index.psm_rows(target_psms, idcs)
+    result_df = take(df, positions, ["psm", "physical_cluster", "iaas_cluster"] + main_columns)
+    
+    # 5. 一次性计算所有PSM在其他资源池的分布，资源池标识取自索引中预先编码的资源池
+    in_main = RowFilter(result_df).equals("physical_cluster", physical_cluster).mask
+    other_rows = RowFilter(result_df).where(~in_main)
+    other_keys = pd.DataFrame({
+        "psm": other_rows.column("psm").to_numpy(),
+        "pool_identifier": index.pool_keys_of(positions[~in_main]),
+    })
+    # 去重后按首次出现的顺序收集每个PSM的其他资源池
+    other_pools_by_psm = (
+        other_keys.drop_duplicates()
+        .groupby("psm", sort=False)["pool_identifier"]
+        .agg(list)
+        .to_dict()
+    )
+    other_count_by_psm = other_keys.groupby("psm", sort=False).size().to_dict()
+    
+    # 6. 主资源池（查询的资源池）中每个PSM的第一条记录
+    checkpoint()
+    main_rows = RowFilter(result_df).where(in_main)
+    if iaas_cluster:
+        main_rows = main_rows.equals("iaas_cluster", iaas_cluster)
+    main_first = main_rows.frame(["psm"] + main_columns).drop_duplicates(subset="psm")
+    main_by_psm = dict(zip(
+        main_first["psm"].tolist(), main_first[main_columns].to_dict("records")
+    ))
     
     # 7. 转换为应用程序期望的格式
-    results = []
-    for psm in target_psms:
-        psm_data = result_df[result_df["psm"] == psm]
-        
-        # 查找主资源池（查询的资源池）中的记录
-        main_pool_data = psm_data[psm_data["physical_cluster"] == physical_cluster]
-        
-        # 如果指定了iaas_cluster，进一步过滤
-        if iaas_cluster and not main_pool_data.empty:
-            main_pool_data = main_pool_data[main_pool_data["iaas_cluster"] == iaas_cluster]
-        
-        # 获取其他资源池信息（包含iaas_cluster）
-        other_pools_data = psm_data[psm_data["physical_cluster"] != physical_cluster]
-        other_pools = []
-        for _, row in other_pools_data.iterrows():
-            # 构建完整的资源池标识：physical_cluster/iaas_cluster
-            iaas = row.get("iaas_cluster", "default")
-            pool_identifier = f"{row['physical_cluster']}/{iaas}"
-            if pool_identifier not in other_pools:
-                other_pools.append(pool_identifier)
-        
-        # 确定部署状态
-        deployment_status = "多资源池" if len(other_pools) > 0 else "单资源池"
-        
-        # 构建返回记录
+    for psm in with_checkpoints(target_psms):
+        other_pools = other_pools_by_psm.get(psm, [])
         record = {
             "psm": psm,
-            "deployment_status": deployment_status,
+            "deployment_status": "多资源池" if len(other_pools) > 0 else "单资源池",
             "other_pools": other_pools,
-            "other_pool_cluster_count": len(other_pools_data),
+            "other_pool_cluster_count": other_count_by_psm.get(psm, 0),
             "idc": idc,
             "pool": pool
         }
-        
         # 如果主资源池中有数据，添加实例和资源信息
-        if not main_pool_data.empty:
-            first_record = main_pool_data.iloc[0]
-            for col in ["instance_num", "cpu_limit", "mem_limit", "dept_level1", "dept_level2", "package", "cluster_id"]:
-                if col in first_record.index:
-                    record[col] = first_record[col]
-        
-        results.append(record)
-    
-    return results
+        record.update(main_by_psm.get(psm, {}))
+        yield record
 
 
 def parse_pool_string(pool_str: str) -> Tuple[str, str]:
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 服务端结果集与分页
+分析结果只计算一次并保存在服务端，用游标(cursor)标识：
+1. 后续翻页、换排序只在已保存的结果集上切片，不再重新分析
+2. 同一结果集的每种排序只计算一次
+3. 结果集数量有上限并按过期时间淘汰，避免无限占用内存
+4. 指定共享目录时结果集同时写入目录，多进程服务中其他工作进程也能按游标取回
+"""
+
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from shared_records import SharedRecordStore
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 可腾挪集群结果允许的排序字段，other_pools按资源池个数排序
+MIGRATABLE_SORT_KEYS = [
+    "psm", "instance_num", "cpu_limit", "mem_limit", "other_pools", "other_pool_cluster_count"
+]
+
+
+class ResultSet:
+    """一份保存在服务端的分析结果"""
+
+    def __init__(self, cursor: str, records: List[Dict[str, Any]], meta: Dict[str, Any]):
+        self.cursor = cursor
+        self.records = records
+        self.meta = meta
+        self._sorted: Dict[str, List[Dict[str, Any]]] = {"": records}
+        self._lock = threading.Lock()
+
+    def sorted_records(self, sort: str = "") -> List[Dict[str, Any]]:
+        """
+        返回按sort排序后的结果，sort以'-'开头表示降序，为空表示保持原顺序
+        缺少排序字段的记录总是排在最后
+        """
+        with self._lock:
+            if sort not in self._sorted:
+                field = sort.lstrip("-")
+                descending = sort.startswith("-")
+
+                def value(record):
+                    v = record.get(field)
+                    if field == "other_pools":
+                        v = len(v or [])
+                    return v
+
+                present, missing = [], []
+                for record in self.records:
+                    v = value(record)
+                    (missing if v is None or v != v else present).append(record)
+                present.sort(key=value, reverse=descending)
+                self._sorted[sort] = present + missing
+            return self._sorted[sort]
+
+    def page(self, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE, sort: str = "") -> Dict[str, Any]:
+        """返回某一页的记录以及分页信息"""
+        records = self.sorted_records(sort)
+        total = len(records)
+        total_pages = max(1, math.ceil(total / page_size))
+        page = min(max(1, page), total_pages)
+        start = (page - 1) * page_size
+        return {
+            "items": records[start:start + page_size],
+            "pagination": {
+                "cursor": self.cursor,
+                "page": page,
+                "page_size": page_size,
+                "sort": sort,
+                "total": total,
+                "total_pages": total_pages,
+                "has_prev": page > 1,
+                "has_next": page < total_pages,
+                "start": start + 1 if total else 0,
+                "end": min(start + page_size, total),
+            },
+        }
+
+
+class ResultSetStore:
+    """
+    保存结果集的LRU存储，线程安全
+
+    Args:
+        max_entries: 最多保存的结果集数
+        ttl_seconds: 结果集的过期时间（秒）
+        directory: 共享目录，为空时结果集只保存在当前进程中
+    """
+
+    def __init__(self, max_entries: int = 64, ttl_seconds: int = 1800, directory: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._shared = SharedRecordStore(directory, max_entries, ttl_seconds) if directory else None
+
+    def put(self, records: List[Dict[str, Any]], meta: Optional[Dict[str, Any]] = None) -> ResultSet:
+        """保存一份结果，返回带游标的结果集"""
+        result_set = ResultSet(uuid.uuid4().hex, records, meta or {})
+        if self._shared is not None:
+            self._shared.put(
+                result_set.cursor, {"records": records, "meta": result_set.meta, "created_at": time.time()}
+            )
+        self._remember(result_set)
+        return result_set
+
+    def get(self, cursor: str) -> Optional[ResultSet]:
+        """按游标取回结果集，不存在或已过期时返回None；当前进程中没有时从共享目录读取"""
+        with self._lock:
+            self._evict()
+            entry = self._entries.get(cursor)
+            if entry is not None:
+                self._entries.move_to_end(cursor)
+                return entry[1]
+        if self._shared is None:
+            return None
+        stored = self._shared.get(cursor)
+        if stored is None:
+            return None
+        # 按结果集最初的保存时间计算过期，而不是从本进程读取的时间开始
+        age = max(time.time() - stored["created_at"], 0)
+        return self._remember(ResultSet(cursor, stored["records"], stored["meta"]), time.monotonic() - age)
+
+    def _remember(self, result_set: ResultSet, created: Optional[float] = None) -> ResultSet:
+        """把结果集放入当前进程的缓存，created为time.monotonic()时间，默认为当前时间"""
+        with self._lock:
+            self._entries[result_set.cursor] = (time.monotonic() if created is None else created, result_set)
+            self._evict()
+        return result_set
+
+    def _evict(self) -> None:
+        """淘汰过期和超出数量上限的结果集"""
+        deadline = time.monotonic() - self.ttl_seconds
+        for cursor in [c for c, (created, _) in self._entries.items() if created < deadline]:
+            del self._entries[cursor]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def parse_page_args(args: Dict[str, Any], allowed_sort_keys: List[str]) -> Dict[str, Any]:
+    """从请求参数中解析page、page_size和sort，非法值使用默认值"""
+    try:
+        page = int(args.get("page") or 1)
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        page_size = int(args.get("page_size") or DEFAULT_PAGE_SIZE)
+    except (TypeError, ValueError):
+        page_size = DEFAULT_PAGE_SIZE
+    page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+
+    sort = (args.get("sort") or "").strip()
+    if sort.lstrip("-") not in allowed_sort_keys:
+        sort = ""
+    return {"page": page, "page_size": page_size, "sort": sort}
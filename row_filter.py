@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 惰性行过滤
+快照中的DataFrame只读，分析时不需要为每一步过滤复制整张表：
+1. RowFilter把按机房、default集群、资源池等条件组合为一个布尔掩码，过滤过程中不复制数据
+2. 需要数据时frame()只按最终选中的行、只取用到的列物化一次
+3. column()只取出单列的选中值，只需要统计单列时不物化其他列
+4. take()按行位置（如索引查询的结果）只物化用到的列
+5. 分类类型（字典编码）的列上，等值和集合条件先在类别中查找取值对应的编码，再只比较每行的整数编码
+
+物化得到的DataFrame是独立的新对象，可以直接添加或修改列，不影响快照。
+"""
+
+from typing import Any, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def _copy_on_write() -> bool:
+    """pandas 3起默认写时复制，之前的版本只有显式开启时才是"""
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    try:
+        return pd.get_option("mode.copy_on_write") is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+def _as_mask(condition: Any) -> np.ndarray:
+    """条件转为布尔数组，空值视为不满足"""
+    if isinstance(condition, (pd.Series, pd.Index)):
+        return condition.to_numpy(dtype=bool, na_value=False)
+    return np.asarray(condition, dtype=bool)
+
+
+def _categories(series: pd.Series) -> Optional[pd.Index]:
+    """分类类型的列返回其类别，否则返回None"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories
+    return None
+
+
+def _code_mask(series: pd.Series, matched: np.ndarray) -> np.ndarray:
+    """分类列中编码属于matched（类别下标，-1表示空值）的行"""
+    codes = series.cat.codes.to_numpy()
+    if len(matched) == 1:
+        return codes == matched[0]
+    return np.isin(codes, matched)
+
+
+def equals_mask(series: pd.Series, value: Any) -> np.ndarray:
+    """值等于value的行，空值视为不满足"""
+    categories = _categories(series)
+    if categories is None:
+        return _as_mask(series == value)
+    code = categories.get_indexer([value])[0]
+    if code < 0:
+        return np.zeros(len(series), dtype=bool)
+    return _code_mask(series, np.array([code]))
+
+
+def isin_mask(series: pd.Series, values: Sequence[Any]) -> np.ndarray:
+    """值在values中的行，values中有空值时空值也满足（与Series.isin一致）"""
+    categories = _categories(series)
+    if categories is None:
+        return _as_mask(series.isin(values))
+    codes = categories.get_indexer(pd.Index(values).dropna().unique())
+    matched = codes[codes >= 0]
+    if pd.isna(pd.Index(values)).any():
+        matched = np.append(matched, -1)
+    return _code_mask(series, matched)
+
+
+def text_equals_mask(series: pd.Series, text: str) -> np.ndarray:
+    """值转为字符串后等于text的行（如数值1与"1"都满足），空值视为不满足"""
+    categories = _categories(series)
+    if categories is None:
+        return _as_mask(series.astype(str) == text)
+    matched = np.flatnonzero(_as_mask(categories.astype(str) == text))
+    return _code_mask(series, matched)
+
+
+def take(df: pd.DataFrame, positions: np.ndarray, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    按行位置取出数据，只物化columns中的列
+
+    Args:
+        df: 只读的DataFrame
+        positions: 行位置
+        columns: 需要的列，不存在的列忽略；为空时取全部列
+    """
+    if columns is not None:
+        df = df[[col for col in columns if col in df.columns]]
+    return df.take(positions)
+
+
+class RowFilter:
+    """
+    在只读DataFrame上组合过滤条件的惰性过滤器
+
+    每个条件方法返回新的过滤器，原过滤器不变，可以在公共条件上分别追加不同条件。
+
+    Args:
+        df: 只读的DataFrame
+        mask: 初始的布尔掩码，为空时表示选中全部行
+    """
+
+    def __init__(self, df: pd.DataFrame, mask: Optional[np.ndarray] = None):
+        self.df = df
+        self.mask = mask
+
+    def where(self, condition: Any) -> "RowFilter":
+        """追加一个条件（与df等长的布尔Series或数组），与已有条件取交集"""
+        mask = _as_mask(condition)
+        return RowFilter(self.df, mask if self.mask is None else self.mask & mask)
+
+    def isin(self, column: str, values: Optional[Iterable[Any]]) -> "RowFilter":
+        """column的值在values中，values为空时不过滤"""
+        values = list(values or [])
+        if not values:
+            return self
+        return self.where(isin_mask(self.df[column], values))
+
+    def equals(self, column: str, value: Any) -> "RowFilter":
+        """column的值等于value"""
+        return self.where(equals_mask(self.df[column], value))
+
+    def text_equals(self, column: str, text: str) -> "RowFilter":
+        """column的值转为字符串后等于text"""
+        return self.where(text_equals_mask(self.df[column], text))
+
+    def positions(self) -> np.ndarray:
+        """选中行的位置"""
+        if self.mask is None:
+            return np.arange(len(self.df))
+        return np.flatnonzero(self.mask)
+
+    def __len__(self) -> int:
+        return len(self.df) if self.mask is None else int(np.count_nonzero(self.mask))
+
+    def column(self, name: str) -> pd.Series:
+        """单列的选中值，保留原索引"""
+        series = self.df[name]
+        return series if self.mask is None else series[self.mask]
+
+    def frame(self, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        物化选中的行
+
+        Args:
+            columns: 需要的列，不存在的列忽略；为空时取全部列
+        """
+        if self.mask is None:
+            df = self.df if columns is None else self.df[[col for col in columns if col in self.df.columns]]
+            # 没有过滤条件时，写时复制下返回浅拷贝，数据与快照共享，修改时才复制
+            return df.copy(deep=not _copy_on_write())
+        return take(self.df, self.positions(), columns)
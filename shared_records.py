@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 跨进程共享的记录存储
+多进程服务(prefork_server)的工作进程共用一个监听端口，同一客户端的后续请求通常落在另一个工作进程上。
+结果集游标、报告任务、采样结果这类后续请求还要读取的状态，除了保存在进程内，还写入共享目录：
+1. 每条记录是目录中的一个JSON文件，先写临时文件再原子替换，其他进程不会读到写了一半的记录
+2. 按文件修改时间过期，超出数量上限时淘汰最早的记录
+3. 键只允许字母、数字、'-'和'_'，不会读写目录以外的文件
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Optional
+
+# 合法的记录键
+_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+# 记录文件的扩展名，写入中的临时文件不带这个扩展名
+RECORD_SUFFIX = ".json"
+
+# 超过这个时间（秒）仍未替换的临时文件视为写入进程中途退出留下的，清理时删除
+STALE_TMP_SECONDS = 3600
+
+
+def _to_json(value: Any) -> Any:
+    """json.dumps无法直接序列化的值：NumPy标量转为Python标量，其余转为字符串"""
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+class SharedRecordStore:
+    """
+    以目录中的JSON文件保存记录，多个进程可以同时读写
+
+    Args:
+        directory: 记录目录
+        max_entries: 最多保存的记录数
+        ttl_seconds: 记录的过期时间（秒），为空时不过期
+    """
+
+    def __init__(self, directory: str, max_entries: int = 1000, ttl_seconds: Optional[float] = None):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        """记录文件的路径"""
+        if not _KEY_PATTERN.match(key):
+            raise ValueError(f"非法的记录键: {key!r}")
+        return os.path.join(self.directory, key + RECORD_SUFFIX)
+
+    def put(self, key: str, value: Any) -> None:
+        """写入一条记录（覆盖同名记录），然后淘汰过期和超出数量上限的记录"""
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False, default=_to_json)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._trim()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取一条记录，不存在、已过期或无法解析时返回None"""
+        if not _KEY_PATTERN.match(key):
+            return None
+        path = self.path(key)
+        try:
+            if self.ttl_seconds is not None and time.time() - os.stat(path).st_mtime > self.ttl_seconds:
+                return None
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def delete(self, key: str) -> None:
+        """删除一条记录，不存在时忽略"""
+        try:
+            os.remove(self.path(key))
+        except (OSError, ValueError):
+            pass
+
+    def _trim(self) -> None:
+        """删除过期的记录，超出数量上限时按修改时间删除最早的记录"""
+        with self._lock:
+            now = time.time()
+            records = []
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    try:
+                        mtime = entry.stat().st_mtime
+                    except OSError:
+                        continue
+                    if entry.name.endswith(RECORD_SUFFIX):
+                        records.append((mtime, entry.path))
+                    elif entry.name.endswith(".tmp") and now - mtime > STALE_TMP_SECONDS:
+                        # 写入进程中途退出留下的临时文件
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+            records.sort()
+            expired = 0
+            if self.ttl_seconds is not None:
+                while expired < len(records) and now - records[expired][0] > self.ttl_seconds:
+                    expired += 1
+            excess = max(len(records) - expired - self.max_entries, 0)
+            for _, path in records[:expired + excess]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 库存数据快照缓存
+进程内共享的Excel数据快照缓存，按(文件路径, mtime, size)判断文件是否变化：
+1. 首次加载时解析Excel（或更新的列式旁路文件）并做类型规整，转为紧凑表示（维度列字典编码、整数列int32），
+   之后的请求直接复用同一份DataFrame
+2. 文件被替换或修改后自动重新加载
+3. 重新加载时与上一份快照逐行对比：内容没有变化时继续使用上一份快照（包括已构建的派生结构和查询缓存），
+   有变化时记录变化汇总，支持增量更新的派生结构只重算受影响的部分
+4. 记录命中/未命中/重新加载次数，便于观察缓存效果
+
+注意：缓存中的DataFrame由所有请求共享，调用方只能读取，不能原地修改。
+"""
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from inventory_dtypes import compact_dtypes, memory_bytes
+from inventory_sidecar import find_fresh_sidecar, read_sidecar
+from request_tracing import span
+from snapshot_diff import SnapshotChanges, diff_inventory
+
+
+# 是否内存映射旁路文件，设置为0时整体读入内存
+SIDECAR_MEMORY_MAP = os.environ.get("INVENTORY_SIDECAR_MMAP", "1") != "0"
+
+# 重新加载时是否与上一份快照对比做增量更新，设置为0时总是全量重新加载
+INCREMENTAL_REFRESH = os.environ.get("INVENTORY_INCREMENTAL_REFRESH", "1") != "0"
+
+# 需要规整为数值类型的列
+NUMERIC_COLUMNS = ["instance_num", "cpu_limit", "mem_limit"]
+
+
+def file_signature(file_path: str) -> Tuple[int, int]:
+    """获取文件签名(mtime_ns, size)，用于判断文件是否变化"""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def parse_save_cores(values: pd.Series) -> pd.Series:
+    """save_cores转为数值：去掉首尾空白后解析，空字符串和无法解析的值为NaN"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+    return pd.to_numeric(values.astype(str).str.strip(), errors="coerce")
+
+
+def normalize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """规整数据类型：把数值列中混入的字符串等值统一转换为数值"""
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    # save_cores在加载时解析一次，推荐缩容查询时不再逐次做字符串转换
+    # 旁路文件中已经是数值的列不再重新赋值，保留对内存映射页面的引用
+    if "save_cores" in df.columns and not pd.api.types.is_numeric_dtype(df["save_cores"]):
+        df["save_cores"] = parse_save_cores(df["save_cores"])
+    return df
+
+
+def read_inventory(file_path: str) -> pd.DataFrame:
+    """读取并规整库存数据文件，转为紧凑表示；存在更新的旁路文件时优先读取旁路文件"""
+    sidecar = find_fresh_sidecar(file_path)
+    if sidecar:
+        return compact_dtypes(normalize_dtypes(read_sidecar(sidecar, memory_map=SIDECAR_MEMORY_MAP)))
+    return compact_dtypes(normalize_dtypes(pd.read_excel(file_path)))
+
+
+class InventorySnapshot:
+    """
+    一份已加载的库存数据快照
+
+    Attributes:
+        file_path: 数据文件的绝对路径
+        signature: 加载时的文件签名(mtime_ns, size)
+        df: 规整后的DataFrame（只读）
+        version: 快照版本号，每次加载/重新加载都会递增
+        changes: 与上一份快照相比的变化，首次加载或全量重新加载时为None
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        signature: Tuple[int, int],
+        df: pd.DataFrame,
+        version: int,
+        changes: Optional[SnapshotChanges] = None,
+    ):
+        self.file_path = file_path
+        self.signature = signature
+        self.df = df
+        self.version = version
+        self.changes = changes
+        self._derived: Dict[str, Any] = {}
+        self._refreshers: Dict[str, Callable[[Any, SnapshotChanges, pd.DataFrame], Any]] = {}
+        self._lock = threading.Lock()
+
+    def derive(
+        self,
+        name: str,
+        builder: Callable[[pd.DataFrame], Any],
+        refresh: Optional[Callable[[Any, SnapshotChanges, pd.DataFrame], Any]] = None,
+    ) -> Any:
+        """
+        获取基于本快照构建的派生结构（索引、分组等），首次访问时构建并缓存
+
+        Args:
+            name: 派生结构名称
+            builder: 构建函数，参数为快照的DataFrame
+            refresh: 增量更新函数，参数为上一份快照中的派生结构、变化和新的DataFrame，
+                     返回更新后的派生结构，返回None时在新快照中重新构建
+        """
+        with self._lock:
+            if name not in self._derived:
+                # 带参数的派生结构（如"fleet_scan:10"）按名称前缀统计耗时
+                with span(f"derive.{name.partition(':')[0]}"):
+                    self._derived[name] = builder(self.df)
+            if refresh is not None:
+                self._refreshers[name] = refresh
+            return self._derived[name]
+
+    def carry_over(self, previous: "InventorySnapshot") -> int:
+        """
+        把上一份快照中支持增量更新的派生结构更新后带到本快照
+
+        Returns:
+            带过来的派生结构数
+        """
+        with previous._lock:
+            entries = [
+                (name, value, previous._refreshers[name])
+                for name, value in previous._derived.items()
+                if name in previous._refreshers
+            ]
+        carried = 0
+        for name, value, refresh in entries:
+            updated = refresh(value, self.changes, self.df)
+            if updated is not None:
+                with self._lock:
+                    self._derived.setdefault(name, updated)
+                    self._refreshers[name] = refresh
+                carried += 1
+        return carried
+
+
+class SnapshotCache:
+    """进程内的库存数据快照缓存，线程安全"""
+
+    def __init__(
+        self, loader: Callable[[str], pd.DataFrame] = read_inventory, incremental: bool = INCREMENTAL_REFRESH
+    ):
+        self._loader = loader
+        self._incremental = incremental
+        self._snapshots: Dict[str, InventorySnapshot] = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        # 重新加载中内容没有变化、继续使用上一份快照的次数，以及做了增量更新的次数
+        self.unchanged_reloads = 0
+        self.incremental_reloads = 0
+
+    def get(self, file_path: str) -> InventorySnapshot:
+        """获取文件对应的快照，文件未变化时直接返回缓存"""
+        path = os.path.abspath(file_path)
+        signature = file_signature(path)
+
+        with self._lock:
+            snapshot = self._snapshots.get(path)
+            if snapshot is not None and snapshot.signature == signature:
+                self.hits += 1
+                return snapshot
+
+            with span("read_inventory"):
+                df = self._loader(path)
+            if snapshot is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            changes = self._diff(snapshot, df)
+            if changes is not None and changes.unchanged:
+                # 文件被重新导出但内容没有变化，派生结构和查询缓存都继续有效
+                self.unchanged_reloads += 1
+                snapshot.signature = signature
+                return snapshot
+
+            self._version += 1
+            previous = snapshot
+            snapshot = InventorySnapshot(path, signature, df, self._version, changes)
+            if changes is not None:
+                self.incremental_reloads += 1
+                with span("carry_over"):
+                    snapshot.carry_over(previous)
+            self._snapshots[path] = snapshot
+            return snapshot
+
+    def _diff(self, previous: Optional[InventorySnapshot], df: pd.DataFrame) -> Optional[SnapshotChanges]:
+        """与上一份快照对比，没有上一份快照、未开启增量更新或无法对比时返回None"""
+        if previous is None or not self._incremental:
+            return None
+        try:
+            with span("snapshot_diff"):
+                return diff_inventory(previous.df, df, previous.version)
+        except Exception as e:
+            print(f"增量对比失败，全量重新加载: {e}")
+            return None
+
+    def peek(self, file_path: str) -> Optional[InventorySnapshot]:
+        """返回已缓存的快照（不检查文件变化，不加载）"""
+        with self._lock:
+            return self._snapshots.get(os.path.abspath(file_path))
+
+    def clear(self) -> None:
+        """清空缓存和统计计数"""
+        with self._lock:
+            self._snapshots.clear()
+            self.hits = self.misses = self.reloads = 0
+            self.unchanged_reloads = self.incremental_reloads = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """返回缓存统计信息"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "unchanged_reloads": self.unchanged_reloads,
+                "incremental_reloads": self.incremental_reloads,
+                "snapshots": [
+                    {
+                        "file_path": s.file_path,
+                        "version": s.version,
+                        "rows": len(s.df),
+                        "memory_bytes": memory_bytes(s.df),
+                        "mtime_ns": s.signature[0],
+                        "size": s.signature[1],
+                        "changes": None if s.changes is None else {
+                            "previous_version": s.changes.previous_version,
+                            "inserted": len(s.changes.inserted),
+                            "deleted": len(s.changes.deleted),
+                            "updated": len(s.changes.updated),
+                        },
+                    }
+                    for s in self._snapshots.values()
+                ],
+            }
+
+
+# 进程级共享的默认缓存
+SNAPSHOT_CACHE = SnapshotCache()
+
+
+def get_snapshot(file_path: str) -> InventorySnapshot:
+    """从默认缓存获取快照"""
+    return SNAPSHOT_CACHE.get(file_path)
+
+
+def snapshot_stats() -> Dict[str, Any]:
+    """返回默认缓存的统计信息"""
+    return SNAPSHOT_CACHE.stats()
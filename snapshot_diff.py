@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 库存数据增量对比
+数据文件更新后，按(psm, cluster_id, idc)把新数据与上一份快照逐行对比：
+1. 找出新增、删除和修改的行，新数据与上一份完全相同时可以直接复用上一份快照
+2. 汇总每个(机房, 资源池)新增/删除/修改的行数和instance_num、cpu_limit、mem_limit的变化量
+3. 记录受影响的机房和资源池，派生结构（亲和矩阵、全量扫描等）只需要重算受影响的部分
+
+同一个键出现多次时按出现顺序逐个对应。两份数据的列不同时不做对比，按全量重新加载处理。
+"""
+
+from typing import Any, Dict, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 对比时用来对应新旧行的键
+DIFF_KEY = ["psm", "cluster_id", "idc"]
+
+# 变化汇总中统计变化量的列
+VALUE_COLUMNS = ["instance_num", "cpu_limit", "mem_limit"]
+
+# 变化汇总的分组列
+POOL_COLUMNS = ["idc", "physical_cluster", "iaas_cluster"]
+
+CHANGE_COLUMNS = (
+    ["idc", "pool", "inserted", "deleted", "updated"]
+    + [f"{col}_delta" for col in VALUE_COLUMNS]
+)
+
+
+def _combine(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """把两列非负整数编码合并为一列编码"""
+    return pd.factorize(left * (int(right.max(initial=0)) + 1) + right)[0]
+
+
+def _joint_codes(old: pd.Series, new: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """在新旧两列上统一编码，相同的值编码相同，空值也编码为同一个值"""
+    old_codes, old_uniques = pd.factorize(old)
+    new_codes, new_uniques = pd.factorize(new)
+    mapping = pd.Index(old_uniques).get_indexer(new_uniques)
+    missing = mapping < 0
+    mapping[missing] = len(old_uniques) + np.arange(int(missing.sum()))
+    null_code = len(old_uniques) + int(missing.sum())
+    old_codes = np.where(old_codes < 0, null_code, old_codes)
+    new_codes = np.where(new_codes < 0, null_code, mapping[np.maximum(new_codes, 0)])
+    return old_codes, new_codes
+
+
+def _row_codes(old: pd.DataFrame, new: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    为新旧两份数据的每一行计算整数键，键相同表示是同一行
+    空值视为相同的值，同一个键重复出现时加上出现序号区分
+    """
+    codes = None
+    for col in DIFF_KEY:
+        col_codes = np.concatenate(_joint_codes(old[col], new[col]))
+        codes = col_codes if codes is None else _combine(codes, col_codes)
+    occurrence = np.concatenate([
+        pd.Series(part).groupby(part).cumcount().to_numpy() for part in (codes[:len(old)], codes[len(old):])
+    ])
+    codes = _combine(codes, occurrence)
+    return codes[:len(old)], codes[len(old):]
+
+
+def _same_values(old: pd.Series, new: pd.Series, old_rows: np.ndarray, new_rows: np.ndarray) -> np.ndarray:
+    """逐行比较一列在对应行上的值是否相同，两边都为空视为相同"""
+    if isinstance(old.dtype, pd.CategoricalDtype) or isinstance(new.dtype, pd.CategoricalDtype):
+        # 分类列比较统一后的编码，不逐个比较字符串
+        old_codes, new_codes = _joint_codes(old, new)
+        return old_codes[old_rows] == new_codes[new_rows]
+    a = old.iloc[old_rows].reset_index(drop=True)
+    b = new.iloc[new_rows].reset_index(drop=True)
+    try:
+        equal = (a == b).to_numpy(dtype=bool, na_value=False)
+    except TypeError:
+        # 两边类型不能直接比较时逐个比较原始值
+        equal = np.asarray(a.to_numpy(dtype=object) == b.to_numpy(dtype=object), dtype=bool)
+    return equal | (a.isna().to_numpy() & b.isna().to_numpy())
+
+
+class SnapshotChanges:
+    """
+    两份库存数据之间的变化
+
+    Attributes:
+        previous_version: 对比的上一份快照的版本号
+        old_positions: 新数据每一行在上一份数据中的行位置，新增的行为-1
+        inserted: 新增的行（新数据中的行位置）
+        deleted: 删除的行（上一份数据中的行位置）
+        updated: 修改的行（新数据中的行位置）
+        updated_old: 修改的行在上一份数据中的行位置，与updated一一对应
+    """
+
+    def __init__(
+        self,
+        previous_version: int,
+        old_positions: np.ndarray,
+        deleted: np.ndarray,
+        updated: np.ndarray,
+        summary: pd.DataFrame,
+        touched: Set[Tuple[Any, Any, Any]],
+    ):
+        self.previous_version = previous_version
+        self.old_positions = old_positions
+        self.inserted = np.flatnonzero(old_positions < 0)
+        self.deleted = deleted
+        self.updated = updated
+        self.updated_old = old_positions[updated]
+        self.summary = summary
+        # 受影响的(机房, 物理集群, IaaS集群)，使用数据中的原始值
+        self.touched = touched
+
+    @property
+    def empty(self) -> bool:
+        """内容没有任何变化"""
+        return not (len(self.inserted) or len(self.deleted) or len(self.updated))
+
+    @property
+    def unchanged(self) -> bool:
+        """内容和行顺序都没有变化"""
+        return self.empty and bool(np.array_equal(self.old_positions, np.arange(len(self.old_positions))))
+
+    @property
+    def touched_idcs(self) -> Set[Any]:
+        """受影响的机房"""
+        return {idc for idc, _, _ in self.touched}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """变化统计和按资源池的变化汇总"""
+        return {
+            "previous_version": self.previous_version,
+            "inserted": len(self.inserted),
+            "deleted": len(self.deleted),
+            "updated": len(self.updated),
+            "unchanged": len(self.old_positions) - len(self.inserted) - len(self.updated),
+            "pools": self.summary.to_dict(orient="records"),
+        }
+
+
+def _none_if_na(value: Any) -> Any:
+    """空值统一为None，便于作为集合元素和字典键"""
+    return None if pd.isna(value) else value
+
+
+def _summarize(
+    old: pd.DataFrame,
+    new: pd.DataFrame,
+    old_rows: np.ndarray,
+    new_rows: np.ndarray,
+    kinds: Dict[str, Tuple[pd.DataFrame, np.ndarray]],
+) -> Tuple[pd.DataFrame, Set[Tuple[Any, Any, Any]]]:
+    """
+    汇总每个(机房, 资源池)的变化：旧数据中被删除或修改的行记为减少，新数据中新增或修改的行记为增加
+
+    Args:
+        old_rows / new_rows: 上一份数据中减少的行、新数据中增加的行
+        kinds: 每种变化（inserted/deleted/updated）计入的新数据或旧数据行，用于计数
+    """
+    columns = [col for col in POOL_COLUMNS if col in new.columns and col in old.columns]
+    values = [col for col in VALUE_COLUMNS if col in new.columns and col in old.columns]
+
+    def side(df: pd.DataFrame, rows: np.ndarray, sign: int) -> pd.DataFrame:
+        frame = df.iloc[rows][columns].astype(object).reset_index(drop=True)
+        for col in values:
+            frame[f"{col}_delta"] = sign * pd.to_numeric(df[col].iloc[rows], errors="coerce").fillna(0).to_numpy()
+        return frame
+
+    parts = [side(old, old_rows, -1), side(new, new_rows, 1)]
+    for kind, (df, rows) in kinds.items():
+        counts = df.iloc[rows][columns].astype(object).reset_index(drop=True)
+        counts[kind] = 1
+        parts.append(counts)
+    frame = pd.concat(parts, ignore_index=True)
+    for col in ["inserted", "deleted", "updated"] + [f"{col}_delta" for col in values]:
+        if col not in frame.columns:
+            frame[col] = 0
+    frame = frame.fillna({col: 0 for col in frame.columns if col not in columns})
+
+    summary = frame.groupby(columns, dropna=False, sort=False).sum(numeric_only=True).reset_index()
+    touched = {
+        tuple(_none_if_na(v) for v in row)
+        for row in summary[columns].itertuples(index=False, name=None)
+    }
+
+    summary["idc"] = summary["idc"].map(_none_if_na)
+    summary["pool"] = summary["physical_cluster"].astype(str) + "/" + summary["iaas_cluster"].astype(str)
+    for col in ["inserted", "deleted", "updated"] + (["instance_num_delta"] if "instance_num" in values else []):
+        summary[col] = summary[col].astype(np.int64)
+    summary = summary.reindex(columns=CHANGE_COLUMNS, fill_value=0).sort_values(
+        by=["cpu_limit_delta", "idc", "pool"], ascending=[False, True, True], kind="mergesort", na_position="last"
+    )
+    return summary.reset_index(drop=True), touched
+
+
+def diff_inventory(old: pd.DataFrame, new: pd.DataFrame, previous_version: int = 0) -> Optional[SnapshotChanges]:
+    """
+    对比上一份库存数据和新数据
+
+    Returns:
+        两份数据之间的变化；列不同或缺少对比键时返回None，需要全量重新加载
+    """
+    if list(old.columns) != list(new.columns) or not all(col in new.columns for col in DIFF_KEY):
+        return None
+
+    old_codes, new_codes = _row_codes(old, new)
+    old_positions = pd.Index(old_codes).get_indexer(new_codes)
+    matched_new = np.flatnonzero(old_positions >= 0)
+    matched_old = old_positions[matched_new]
+
+    same = np.ones(len(matched_new), dtype=bool)
+    for col in new.columns:
+        same &= _same_values(old[col], new[col], matched_old, matched_new)
+    updated = matched_new[~same]
+
+    kept = np.zeros(len(old), dtype=bool)
+    kept[matched_old] = True
+    deleted = np.flatnonzero(~kept)
+    inserted = np.flatnonzero(old_positions < 0)
+
+    summary, touched = _summarize(
+        old,
+        new,
+        np.concatenate([deleted, old_positions[updated]]),
+        np.concatenate([inserted, updated]),
+        {"inserted": (new, inserted), "deleted": (old, deleted), "updated": (new, updated)},
+    )
+    return SnapshotChanges(previous_version, old_positions, deleted, updated, summary, touched)
+
+
+def rows_in_pools(df: pd.DataFrame, pools: Set[Tuple[Any, Any, Any]]) -> np.ndarray:
+    """属于给定(机房, 物理集群, IaaS集群)的行的布尔掩码"""
+    keys = pd.MultiIndex.from_arrays([df[col].astype(object) for col in POOL_COLUMNS])
+    return np.asarray(keys.isin(list(pools)), dtype=bool)
+
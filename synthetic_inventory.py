@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 合成库存数据
+真实的all.xlsx不能随仓库分发，这里按真实数据的分布特点生成任意行数的库存数据，供基准测试和本地调试使用：
+1. 每个PSM的集群数、每个资源池的PSM数、每个机房的行数都是长尾分布，少数热门PSM/资源池/机房占大部分行
+2. 每个PSM有一个主机房和一个主、一个次资源池，大部分集群落在其中，资源腾挪分析能找到共同部署的PSM
+3. 约70%的集群为default集群，iaas_cluster以default为主
+4. 资源量（实例数、CPU、内存）和利用率的分布与真实数据接近，save_cores有少量空值
+
+相同的行数和随机种子总是生成相同的数据。
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from inventory_sidecar import sidecar_available, sidecar_path, write_sidecar
+
+# 与all.xlsx相同的列和顺序
+INVENTORY_COLUMNS = [
+    "psm", "cluster_id", "cluster_name", "idc", "physical_cluster", "iaas_cluster",
+    "instance_num", "cpu_limit", "mem_limit", "save_cores", "dept_level1", "dept_level2",
+    "host_type", "package", "cpu_util_max_1days", "cpu_util_max_7days", "mem_util_max_7days",
+]
+
+# 机房及其行数占比
+IDC_WEIGHTS = {"LF": 0.32, "HL": 0.24, "MY": 0.16, "SH": 0.12, "YG": 0.08, "SG": 0.05, "VA": 0.03}
+
+# 每个机房的物理集群数，物理集群名在各机房通用
+PHYSICAL_CLUSTERS = 24
+
+IAAS_WEIGHTS = {"default": 0.8, "gpu": 0.12, "spot": 0.08}
+
+# 非default集群的名称
+NON_DEFAULT_NAMES = ["canary", "gray", "stress", "backup"]
+DEFAULT_CLUSTER_RATIO = 0.7
+
+# 平均每个PSM的集群数
+CLUSTERS_PER_PSM = 8
+
+# PSM集群数和资源池热度的长尾程度，越大越集中在少数PSM/资源池
+PSM_SKEW = 0.9
+POOL_SKEW = 1.1
+
+# Excel单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def _zipf_weights(n: int, exponent: float) -> np.ndarray:
+    """按排名的长尾分布权重：第i名的权重正比于1/i^exponent"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def generate_inventory(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    生成合成库存数据
+
+    Args:
+        rows: 行数（集群数）
+        seed: 随机种子
+
+    Returns:
+        与all.xlsx列相同的DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    n_psm = max(rows // CLUSTERS_PER_PSM, 1)
+
+    # 每个PSM的集群数为长尾分布：按排名加权抽样，热门PSM有上千个集群，大部分只有一两个
+    psm = rng.choice(n_psm, rows, p=_zipf_weights(n_psm, PSM_SKEW))
+
+    # PSM级属性：主机房、主/次资源池、部门和包名
+    idc_names = np.array(list(IDC_WEIGHTS))
+    idc_p = np.array(list(IDC_WEIGHTS.values()))
+    idc_p = idc_p / idc_p.sum()
+    pool_p = _zipf_weights(PHYSICAL_CLUSTERS, POOL_SKEW)
+    home_idc = rng.choice(len(idc_names), n_psm, p=idc_p)
+    primary_pool = rng.choice(PHYSICAL_CLUSTERS, n_psm, p=pool_p)
+    secondary_pool = rng.choice(PHYSICAL_CLUSTERS, n_psm, p=pool_p)
+    dept1 = rng.integers(0, 12, n_psm)
+    dept2 = rng.integers(0, 40, n_psm)
+    has_package = rng.random(n_psm) < 0.5
+
+    # 行级属性：70%在主机房；60%在主资源池、25%在次资源池、其余随机
+    idc = np.where(rng.random(rows) < 0.7, home_idc[psm], rng.choice(len(idc_names), rows, p=idc_p))
+    pool_draw = rng.random(rows)
+    physical = np.where(
+        pool_draw < 0.6,
+        primary_pool[psm],
+        np.where(pool_draw < 0.85, secondary_pool[psm], rng.choice(PHYSICAL_CLUSTERS, rows, p=pool_p)),
+    )
+    iaas = rng.choice(len(IAAS_WEIGHTS), rows, p=list(IAAS_WEIGHTS.values()))
+    is_default = rng.random(rows) < DEFAULT_CLUSTER_RATIO
+    non_default = rng.integers(0, len(NON_DEFAULT_NAMES), rows)
+
+    # 资源量：实例数为对数正态分布，CPU = 实例数 × 单实例核数，内存按1:2~1:8配比
+    instance_num = np.clip(np.ceil(rng.lognormal(1.5, 1.0, rows)), 1, 2000).astype(np.int64)
+    cores = rng.choice([1, 2, 4, 8, 16], rows, p=[0.15, 0.35, 0.3, 0.15, 0.05])
+    cpu_limit = instance_num * cores
+    mem_limit = cpu_limit * rng.choice([2, 4, 8], rows, p=[0.3, 0.5, 0.2])
+
+    # 利用率偏低且7天峰值不低于1天峰值；save_cores按7天峰值估算，约5%为空
+    util_1d = rng.beta(2, 5, rows)
+    util_7d = np.minimum(util_1d + rng.beta(1, 8, rows), 1.0)
+    mem_util = rng.beta(3, 3, rows)
+    save_cores = np.floor(cpu_limit * (0.7 - util_7d))
+    save_cores[rng.random(rows) < 0.05] = np.nan
+
+    psm_names = np.array([f"svc.{i}" for i in range(n_psm)], dtype=object)
+    df = pd.DataFrame({
+        "psm": psm_names[psm],
+        "cluster_id": np.arange(1, rows + 1, dtype=np.int64),
+        "cluster_name": np.where(is_default, "default", np.array(NON_DEFAULT_NAMES, dtype=object)[non_default]),
+        "idc": idc_names.astype(object)[idc],
+        "physical_cluster": np.array([f"P{i}" for i in range(PHYSICAL_CLUSTERS)], dtype=object)[physical],
+        "iaas_cluster": np.array(list(IAAS_WEIGHTS), dtype=object)[iaas],
+        "instance_num": instance_num,
+        "cpu_limit": cpu_limit,
+        "mem_limit": mem_limit,
+        "save_cores": save_cores,
+        "dept_level1": np.array([f"dept{i}" for i in range(12)], dtype=object)[dept1[psm]],
+        "dept_level2": np.array([f"team{i}" for i in range(40)], dtype=object)[dept2[psm]],
+        "host_type": np.where(rng.random(rows) < 0.9, "x86", "arm"),
+        "package": np.where(has_package, np.char.add("pkg.", psm_names.astype(str)), None)[psm],
+        "cpu_util_max_1days": util_1d.round(4),
+        "cpu_util_max_7days": util_7d.round(4),
+        "mem_util_max_7days": mem_util.round(4),
+    })
+    return df[INVENTORY_COLUMNS]
+
+
+def write_inventory(df: pd.DataFrame, xlsx_path: str, excel: bool = False) -> List[str]:
+    """
+    把合成数据写为分析可以直接读取的数据文件
+
+    Args:
+        df: 合成数据
+        xlsx_path: Excel数据文件路径，旁路文件写在同一目录
+        excel: 是否写出完整的Excel；为False时Excel只是一个空的占位文件，分析读取旁路文件。
+               行数超过Excel上限时只能写旁路文件
+
+    Returns:
+        写出的文件路径
+    """
+    if excel and len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"行数超过Excel上限({EXCEL_MAX_ROWS})，只能生成旁路文件")
+    if not excel and not sidecar_available():
+        raise Exception("不写Excel时需要安装pyarrow生成旁路文件: pip install pyarrow")
+
+    os.makedirs(os.path.dirname(os.path.abspath(xlsx_path)), exist_ok=True)
+    if excel:
+        df.to_excel(xlsx_path, index=False)
+    else:
+        # 占位文件先写，旁路文件比它新才会被读取
+        open(xlsx_path, "wb").close()
+    written = [xlsx_path]
+    if sidecar_available():
+        written.append(write_sidecar(df, sidecar_path(xlsx_path)))
+    return written
+
+
+def pick_queries(df: pd.DataFrame) -> Dict[str, str]:
+    """
+    从数据中选出有代表性的查询参数：行数最多的机房，以及该机房default集群中行数最多的两个资源池
+
+    Returns:
+        idc、pool1、pool2（"物理集群/IaaS集群"）
+    """
+    idc = df["idc"].value_counts().index[0]
+    default_df = df[(df["idc"] == idc) & (df["cluster_name"] == "default")]
+    pools = (
+        default_df.groupby(["physical_cluster", "iaas_cluster"], observed=True).size()
+        .sort_values(ascending=False, kind="mergesort").index
+    )
+    first = pools[0]
+    second = pools[1] if len(pools) > 1 else pools[0]
+    return {
+        "idc": str(idc),
+        "pool1": f"{first[0]}/{first[1]}",
+        "pool2": f"{second[0]}/{second[1]}",
+    }
+
+
+def default_path(rows: int, directory: Optional[str] = None) -> str:
+    """合成数据文件的默认路径"""
+    return os.path.join(directory or ".", f"synthetic_{rows}.xlsx")
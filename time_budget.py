@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PSM资源管理系统 - 分析时间预算
+给一次请求中的分析设置时间预算，超时后在检查点处中止，返回已完成的部分结果：
+1. time_budget()为当前上下文设置截止时间，分析函数在循环和各阶段之间调用checkpoint()
+2. 超过截止时间时checkpoint()抛出BudgetExceeded，调用方可以附带已完成的部分结果
+3. 部分结果通过异常返回，不会被分析结果缓存保存
+4. 每个路由的预算可通过环境变量配置，并按路由统计超时次数
+
+没有设置预算时checkpoint()只读取一次上下文变量，不影响分析速度。
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional, TypeVar, Union
+
+T = TypeVar("T")
+
+# 各路由的默认时间预算（秒），可通过ROUTE_TIME_BUDGETS环境变量覆盖，格式: "路由=秒数,路由=秒数"
+DEFAULT_ROUTE_BUDGETS = {
+    "analyze_migration": 30.0,
+    "analyze_multi_migration": 30.0,
+    "analyze_recommend": 20.0,
+    "analyze_migratable": 20.0,
+    "api_migration": 20.0,
+    "api_analyze": 30.0,
+    "api_recommend": 20.0,
+    "api_migratable": 20.0,
+    "api_migratable_stream": 60.0,
+}
+
+# 循环中每处理多少条记录检查一次
+CHECKPOINT_INTERVAL = 256
+
+
+class Deadline:
+    """一次分析的截止时间"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.started = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return self.budget - self.elapsed()
+
+    def expired(self) -> bool:
+        return self.elapsed() >= self.budget
+
+
+class BudgetExceeded(Exception):
+    """
+    分析超过时间预算
+
+    Attributes:
+        budget: 时间预算（秒）
+        elapsed: 中止时已用的时间（秒）
+        partial: 已完成的部分结果，没有时为None
+    """
+
+    def __init__(self, deadline: Deadline, partial: Any = None):
+        self.budget = deadline.budget
+        self.elapsed = round(deadline.elapsed(), 3)
+        self.partial = partial
+        super().__init__(f"分析超过时间预算({self.budget:g}秒)，结果不完整")
+
+
+_CURRENT: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("time_budget", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """当前上下文的截止时间"""
+    return _CURRENT.get()
+
+
+def start_budget(budget: Union[float, Deadline, None]) -> contextvars.Token:
+    """
+    为当前上下文设置时间预算，返回的token交给reset_budget()恢复
+
+    Args:
+        budget: 秒数或已有的截止时间（流式输出时沿用请求开始时的截止时间），为空或非正数表示不限制
+    """
+    if isinstance(budget, Deadline):
+        deadline = budget
+    else:
+        deadline = Deadline(float(budget)) if budget and budget > 0 else None
+    return _CURRENT.set(deadline)
+
+
+def reset_budget(token: contextvars.Token) -> None:
+    """恢复start_budget()之前的时间预算"""
+    _CURRENT.reset(token)
+
+
+@contextmanager
+def time_budget(budget: Union[float, Deadline, None]) -> Iterator[Optional[Deadline]]:
+    """在with块内设置时间预算，参数同start_budget()"""
+    token = start_budget(budget)
+    try:
+        yield _CURRENT.get()
+    finally:
+        reset_budget(token)
+
+
+def checkpoint(partial: Any = None) -> None:
+    """检查点：超过当前时间预算时抛出BudgetExceeded"""
+    deadline = _CURRENT.get()
+    if deadline is not None and deadline.expired():
+        raise BudgetExceeded(deadline, partial)
+
+
+def with_checkpoints(items: Iterable[T], interval: int = CHECKPOINT_INTERVAL) -> Iterator[T]:
+    """遍历items，每interval条检查一次时间预算"""
+    if _CURRENT.get() is None:
+        yield from items
+        return
+    for i, item in enumerate(items):
+        if i % interval == 0:
+            checkpoint()
+        yield item
+
+
+def _parse_route_budgets(value: str) -> Dict[str, float]:
+    """解析"路由=秒数,路由=秒数"格式的配置"""
+    budgets = {}
+    for item in value.split(","):
+        route, _, seconds = item.partition("=")
+        try:
+            budgets[route.strip()] = float(seconds)
+        except ValueError:
+            continue
+    return budgets
+
+
+ROUTE_BUDGETS = {**DEFAULT_ROUTE_BUDGETS, **_parse_route_budgets(os.environ.get("ROUTE_TIME_BUDGETS", ""))}
+
+
+def route_budget(route: Optional[str]) -> Optional[float]:
+    """路由的时间预算（秒），没有配置或配置为0时返回None"""
+    budget = ROUTE_BUDGETS.get(route or "")
+    return budget if budget and budget > 0 else None
+
+
+class TimeoutStats:
+    """按路由统计超时的请求数，线程安全"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def record(self, route: Optional[str]) -> None:
+        with self._lock:
+            key = route or "unknown"
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"total": sum(self._counts.values()), "by_route": dict(self._counts)}
+
+
+# 进程级共享的超时统计
+TIMEOUT_STATS = TimeoutStats()
+
+
+def timeout_stats() -> Dict[str, Any]:
+    """返回超时统计和各路由的时间预算"""
+    return {**TIMEOUT_STATS.stats(), "budgets": dict(ROUTE_BUDGETS)}